@@ -0,0 +1,94 @@
+"""Compare broadcasting a burst of messages one frame at a time
+against sending them in a single SEND_MESSAGES frame.
+
+Each peer is one end of a socket pair, so every frame written to a peer
+costs one send() system call. The other ends are drained between runs.
+
+Usage:
+    python benchmarks/bench_batch.py
+
+"""
+
+import socket
+import timeit
+
+from dumdum.protocol import Client, ClientState, Message, Server, ServerState
+
+PEERS = 200
+BURST = 50
+
+
+def make_peers(count: int) -> list[tuple[Server, socket.socket, socket.socket]]:
+    peers = []
+    for _ in range(count):
+        server = Server()
+        server._state = ServerState.READY
+        a, b = socket.socketpair()
+        a.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 2**20)
+        b.setblocking(False)
+        peers.append((server, a, b))
+    return peers
+
+
+def drain(peers: list[tuple[Server, socket.socket, socket.socket]]) -> None:
+    for _, _, b in peers:
+        try:
+            while b.recv(2**16):
+                pass
+        except BlockingIOError:
+            pass
+
+
+def broadcast_each(peers, messages: list[Message]) -> None:
+    for message in messages:
+        prepared = Server.prepare_message(message)
+        for server, sock, _ in peers:
+            sock.send(server.send_prepared_message(prepared))
+
+
+def broadcast_batch(peers, messages: list[Message]) -> None:
+    prepared = Server.prepare_messages(messages)
+    for server, sock, _ in peers:
+        sock.send(server.send_prepared_message(prepared))
+
+
+def receive(data: bytes) -> None:
+    server = Server()
+    server._state = ServerState.READY
+    server._version = Server.PROTOCOL_VERSION
+    events, _ = server.receive_bytes(data)
+    assert len(events) > 0
+
+
+def main() -> None:
+    peers = make_peers(PEERS)
+    messages = [
+        Message(i, "general", "thegamecracks", f"Line {i} of a pasted message")
+        for i in range(BURST)
+    ]
+    number = 20
+
+    print(f"Broadcasting {BURST} messages to {PEERS} peers:")
+    for func in (broadcast_each, broadcast_batch):
+
+        def run():
+            func(peers, messages)
+            drain(peers)
+
+        elapsed = timeit.timeit(run, number=number)
+        print(f"{func.__name__:>20}: {elapsed / number * 1000:.2f} ms")
+
+    client = Client("thegamecracks")
+    client._state = ClientState.READY
+    contents = [m.content for m in messages]
+    each = b"".join(client.send_message("general", c) for c in contents)
+    batch = client.send_messages("general", contents)
+
+    print(f"Receiving {BURST} messages from a client:")
+    for name, data in (("send_message", each), ("send_messages", batch)):
+        elapsed = timeit.timeit(lambda: receive(data), number=number * 50)
+        print(f"{name:>20}: {elapsed / number / 50 * 1e6:.1f} us, {len(data)} bytes")
+
+
+if __name__ == "__main__":
+    main()
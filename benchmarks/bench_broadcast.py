@@ -0,0 +1,44 @@
+"""Measure the cost of encoding one message for many connected clients.
+
+Usage:
+    python benchmarks/bench_broadcast.py
+
+"""
+
+import timeit
+
+from dumdum.protocol import Message, Server, ServerState
+
+PEERS = 2000
+
+
+def make_servers(count: int) -> list[Server]:
+    servers = [Server() for _ in range(count)]
+    for server in servers:
+        server._state = ServerState.READY
+    return servers
+
+
+def broadcast_per_peer(servers: list[Server], message: Message) -> None:
+    for server in servers:
+        server.send_message(message)
+
+
+def broadcast_prepared(servers: list[Server], message: Message) -> None:
+    prepared = Server.prepare_message(message)
+    for server in servers:
+        server.send_prepared_message(prepared)
+
+
+def main() -> None:
+    servers = make_servers(PEERS)
+    message = Message(1, "general", "thegamecracks", "Hello world! " * 20)
+    number = 50
+
+    for func in (broadcast_per_peer, broadcast_prepared):
+        elapsed = timeit.timeit(lambda: func(servers, message), number=number)
+        print(f"{func.__name__:>20}: {elapsed / number * 1000:.2f} ms / {PEERS} peers")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Compare the memory used by MessageCache when storing Message objects
+versus columnar channel histories.
+
+Messages are created the same way the server creates them, with a freshly
+decoded channel name and the raw content received from the client.
+
+Usage:
+    python benchmarks/bench_columnar.py
+
+"""
+
+import gc
+import time
+import tracemalloc
+
+from dumdum.protocol import Message
+from dumdum.server.state import MessageCache
+
+MESSAGES = 200_000
+NICKS = [f"user-{i}" for i in range(50)]
+
+
+def create_message(i: int) -> Message:
+    raw_content = f"Hello world, this is message #{i}!".encode()
+    return Message(
+        i,
+        str(b"general", "utf-8"),
+        NICKS[i % len(NICKS)],
+        str(raw_content, "utf-8"),
+        raw_content=raw_content,
+    )
+
+
+def measure(columnar: bool) -> None:
+    gc.collect()
+    tracemalloc.start()
+
+    cache = MessageCache(max_messages=None, columnar=columnar)
+    for i in range(MESSAGES):
+        cache.add_message(create_message(i))
+
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for _ in range(100):
+        cache.get_messages("general")
+    elapsed = time.perf_counter() - start
+
+    name = "columnar" if columnar else "objects"
+    print(
+        f"{name}: {current / MESSAGES:.0f} bytes / message, "
+        f"get_messages {elapsed / 100 * 1e6:.0f} µs / page"
+    )
+
+
+def main() -> None:
+    measure(columnar=False)
+    measure(columnar=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Measure the bytes per message saved by the compact encoding of protocol version 5.
+
+Version 4 and version 5 connections send the same traffic:
+
+- pages of LIST_MESSAGES responses from the server
+- SEND_MESSAGE requests from the client, after it has listed channels
+- LIST_MESSAGES requests from the client, with and without bounds
+
+Each connection is measured uncompressed and with zlib compression.
+Overhead is the number of bytes spent per message on anything other
+than its content.
+
+Usage:
+    python benchmarks/bench_compact.py
+
+"""
+
+import random
+import time
+
+from dumdum.protocol import (
+    Channel,
+    Client,
+    CompressionType,
+    Message,
+    Server,
+    SnowflakeGenerator,
+)
+
+PAGES = 20
+PAGE_SIZE = 100
+POSTS = 2000
+REQUESTS = 1000
+
+CHANNELS = [Channel(name) for name in ("announcements", "general", "off-topic")]
+WORDS = (
+    "the a to and of is it you that in for on have with this be not are "
+    "just but so what can like do about was if we at all get one out up "
+    "lol yeah no think know good now time would make how people there"
+).split()
+
+
+def make_messages(count: int, rng: random.Random) -> list[Message]:
+    # Messages arrive in bursts, a few seconds apart on average
+    now = 1_700_000_000_000
+    generator = SnowflakeGenerator(1, clock=lambda: now)
+    nicks = [f"user{i}" for i in range(20)]
+
+    messages = []
+    for _ in range(count):
+        now += int(rng.expovariate(1 / 3000))
+        messages.append(
+            Message(
+                generator.generate(),
+                "general",
+                rng.choice(nicks),
+                " ".join(rng.choices(WORDS, k=rng.randint(3, 20))),
+            )
+        )
+    return messages
+
+
+def connect(version: int, compression: CompressionType) -> tuple[Client, Server]:
+    client = Client("thegamecracks", buffer_size=None, compression=compression)
+    client.PROTOCOL_VERSION = version  # type: ignore
+    server = Server(buffer_size=None)
+
+    server.receive_bytes(client.hello())
+    client.receive_bytes(server.hello(using_ssl=False))
+    server.receive_bytes(client.authenticate())
+    client.receive_bytes(server.authenticate(success=True))
+
+    server.receive_bytes(client.list_channels())
+    client.receive_bytes(server.list_channels(CHANNELS))
+    return client, server
+
+
+def measure_pages(client: Client, server: Server, pages) -> tuple[int, float]:
+    sent = 0
+    start = time.process_time()
+    for page in pages:
+        data = server.list_messages(page)
+        sent += len(data)
+        client.receive_bytes(data)
+    return sent, time.process_time() - start
+
+
+def measure_posts(client: Client, server: Server, messages) -> int:
+    sent = 0
+    for message in messages:
+        data = client.send_message(message.channel_name, message.content)
+        sent += len(data)
+        server.receive_bytes(data)
+    return sent
+
+
+def measure_requests(client: Client, server: Server, messages) -> int:
+    sent = 0
+    for i, message in enumerate(messages[:REQUESTS]):
+        if i % 2 == 0:
+            data = client.list_messages(message.channel_name)
+        else:
+            data = client.list_messages(message.channel_name, after=message.id)
+        sent += len(data)
+        server.receive_bytes(data)
+    return sent
+
+
+def main() -> None:
+    rng = random.Random(0)
+    messages = make_messages(PAGES * PAGE_SIZE, rng)
+    pages = [messages[i : i + PAGE_SIZE] for i in range(0, len(messages), PAGE_SIZE)]
+    content_size = sum(len(m.content.encode()) for m in messages) / len(messages)
+
+    print(
+        f"{PAGES} pages of {PAGE_SIZE} messages, {POSTS} posts, "
+        f"{REQUESTS} list requests, {content_size:.1f} content bytes per message"
+    )
+    print(
+        f"{'version':>8} {'zlib':>5} {'page B/msg':>11} {'overhead':>9} "
+        f"{'post B/msg':>11} {'overhead':>9} {'request B':>10} {'page time':>10}"
+    )
+    for compression in (CompressionType.NONE, CompressionType.ZLIB):
+        for version in (4, 5):
+            client, server = connect(version, compression)
+            page_bytes, page_time = measure_pages(client, server, pages)
+            post_bytes = measure_posts(client, server, messages[:POSTS])
+            request_bytes = measure_requests(client, server, messages)
+
+            page_size = page_bytes / len(messages)
+            post_size = post_bytes / POSTS
+            label = "on" if compression == CompressionType.ZLIB else "off"
+            print(
+                f"{version:>8} {label:>5} {page_size:>11.1f} "
+                f"{page_size - content_size:>9.1f} {post_size:>11.1f} "
+                f"{post_size - content_size:>9.1f} {request_bytes / REQUESTS:>10.1f} "
+                f"{page_time * 1000:>7.1f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
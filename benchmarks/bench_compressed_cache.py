@@ -0,0 +1,74 @@
+"""Measure the memory used by MessageCache when older messages are
+compressed into blocks, along with the cost of paging through them.
+
+Usage:
+    python benchmarks/bench_compressed_cache.py
+
+"""
+
+import gc
+import time
+import tracemalloc
+
+from dumdum.protocol import Message
+from dumdum.server.state import MessageCache
+
+MESSAGES = 200_000
+PAGES = 1000
+NICKS = [f"user-{i}" for i in range(50)]
+
+
+def create_message(i: int) -> Message:
+    raw_content = f"Hello world, this is message #{i}!".encode()
+    return Message(
+        i,
+        str(b"general", "utf-8"),
+        NICKS[i % len(NICKS)],
+        str(raw_content, "utf-8"),
+        raw_content=raw_content,
+    )
+
+
+def measure(name: str, **options) -> None:
+    gc.collect()
+    tracemalloc.start()
+
+    cache = MessageCache(max_messages=None, **options)
+    for i in range(MESSAGES):
+        cache.add_message(create_message(i))
+
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Page backwards through the most recent history, like a client scrolling
+    start = time.perf_counter()
+    # ("after" is the inclusive upper bound of the requested IDs)
+    after = None
+    for _ in range(PAGES):
+        messages = cache.get_messages("general", after=after)
+        after = messages[0].id - 1
+    elapsed = time.perf_counter() - start
+
+    line = (
+        f"{name}: {current / MESSAGES:.0f} bytes / message, "
+        f"get_messages {elapsed / PAGES * 1e6:.0f} µs / page"
+    )
+    if "block_size" in options:
+        stats = cache.get_compression_stats()
+        line += (
+            f", ratio {stats.compression_ratio:.1f}x, "
+            f"hit rate {stats.cache_hit_rate:.0%}"
+        )
+    print(line)
+
+
+def main() -> None:
+    measure("objects")
+    measure("compressed (64)", block_size=64)
+    measure("compressed (256)", block_size=256)
+    measure("columnar + compressed (256)", columnar=True, block_size=256)
+
+
+if __name__ == "__main__":
+    main()
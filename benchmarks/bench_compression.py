@@ -0,0 +1,94 @@
+"""Measure the bandwidth saved and CPU time spent by compressing a connection.
+
+A server sends pages of LIST_MESSAGES followed by a stream of single
+message broadcasts, uncompressed and then compressed at several thresholds.
+
+Usage:
+    python benchmarks/bench_compression.py
+
+"""
+
+import random
+import time
+
+from dumdum.protocol import Client, CompressionType, Message, Server
+
+PAGES = 20
+PAGE_SIZE = 100
+BROADCASTS = 2000
+
+WORDS = (
+    "the a to and of is it you that in for on have with this be not are "
+    "just but so what can like do about was if we at all get one out up "
+    "lol yeah no think know good now time would make how people there"
+).split()
+
+
+def make_messages(count: int, rng: random.Random) -> list[Message]:
+    nicks = [f"user{i}" for i in range(20)]
+    return [
+        Message(
+            (1 << 40) + i * 4096,
+            "general",
+            rng.choice(nicks),
+            " ".join(rng.choices(WORDS, k=rng.randint(3, 20))),
+        )
+        for i in range(count)
+    ]
+
+
+def connect(threshold: int | None) -> tuple[Client, Server]:
+    compression = CompressionType.NONE if threshold is None else CompressionType.ZLIB
+    client = Client("thegamecracks", buffer_size=None, compression=compression)
+    server = Server(buffer_size=None, compression_threshold=threshold or 0)
+
+    server.receive_bytes(client.hello())
+    client.receive_bytes(server.hello(using_ssl=False))
+    server.receive_bytes(client.authenticate())
+    client.receive_bytes(server.authenticate(success=True))
+    return client, server
+
+
+def run(threshold: int | None, pages, broadcasts) -> tuple[int, float, float]:
+    client, server = connect(threshold)
+    sent = 0
+    start = time.process_time()
+    for page in pages:
+        data = server.list_messages(page)
+        sent += len(data)
+        client.receive_bytes(data)
+    for message in broadcasts:
+        data = server.send_message(message)
+        sent += len(data)
+        client.receive_bytes(data)
+    elapsed = time.process_time() - start
+
+    stats = server.compression_stats
+    compress_time = stats.compress_time if stats is not None else 0.0
+    return sent, elapsed, compress_time
+
+
+def main() -> None:
+    rng = random.Random(0)
+    messages = make_messages(PAGES * PAGE_SIZE, rng)
+    pages = [messages[i : i + PAGE_SIZE] for i in range(0, len(messages), PAGE_SIZE)]
+    broadcasts = make_messages(BROADCASTS, rng)
+
+    print(f"{PAGES} pages of {PAGE_SIZE} messages, then {BROADCASTS} broadcasts")
+    print(
+        f"{'threshold':>10} {'bytes sent':>12} {'ratio':>7} {'total':>10} {'zlib':>10}"
+    )
+    baseline = None
+    for threshold in (None, 1024, 256, 0):
+        sent, elapsed, compress_time = run(threshold, pages, broadcasts)
+        if baseline is None:
+            baseline = sent
+        label = "off" if threshold is None else str(threshold)
+        print(
+            f"{label:>10} {sent:>12,d} {baseline / sent:>6.2f}x "
+            f"{elapsed * 1000:>7.1f} ms {compress_time * 1000:>7.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
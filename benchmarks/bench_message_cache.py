@@ -0,0 +1,117 @@
+"""Measure MessageCache inserts, range queries, lookups, and removals
+with 1e6 messages per channel, along with inserts under a byte budget
+shared by several channels.
+
+For comparison, range queries are also run against the previous approach
+of copying the channel's deque into a list before bisecting it.
+
+Usage:
+    python benchmarks/bench_message_cache.py
+
+"""
+
+import bisect
+import collections
+import random
+import time
+import timeit
+
+from dumdum.protocol import Message
+from dumdum.server.state import CacheEvictionPolicy, MessageCache
+
+MESSAGES = 1_000_000
+
+
+def legacy_get_messages(
+    messages: collections.deque[Message],
+    *,
+    before: int | None = None,
+    after: int | None = None,
+    limit: int = 100,
+) -> list[Message]:
+    result = list(messages)
+    if before is not None:
+        i = bisect.bisect_left(result, before, key=lambda m: m.id)
+        result = result[i:]
+    if after is not None:
+        i = bisect.bisect_right(result, after, key=lambda m: m.id)
+        result = result[:i]
+    return result[-limit:]
+
+
+def main() -> None:
+    messages = [
+        Message(i, "general", "thegamecracks", "Hello world!") for i in range(MESSAGES)
+    ]
+    cache = MessageCache(max_messages=MESSAGES // 2)
+
+    start = time.perf_counter()
+    for message in messages:
+        cache.add_message(message)
+    elapsed = time.perf_counter() - start
+    print(f"add_message: {elapsed / MESSAGES * 1e9:.0f} ns / message (with eviction)")
+
+    channel_messages = [
+        Message(i, f"channel-{i % 16}", "thegamecracks", "Hello world!")
+        for i in range(MESSAGES)
+    ]
+    max_bytes = sum(len(bytes(m)) for m in channel_messages) // 2
+    for policy in CacheEvictionPolicy:
+        cache = MessageCache(
+            max_messages=None,
+            max_bytes=max_bytes,
+            eviction_policy=policy,
+        )
+        start = time.perf_counter()
+        for message in channel_messages:
+            cache.add_message(message)
+        elapsed = time.perf_counter() - start
+        print(
+            f"add_message ({policy.value}, 16 channels): "
+            f"{elapsed / MESSAGES * 1e9:.0f} ns / message, "
+            f"{cache.size} bytes, {cache.evicted} evicted"
+        )
+
+    cache = MessageCache(max_messages=MESSAGES)
+    for message in messages:
+        cache.add_message(message)
+    legacy = collections.deque(messages, maxlen=MESSAGES)
+
+    queries = {
+        "latest page": {},
+        "after middle": {"after": MESSAGES // 2},
+        "before/after": {"before": MESSAGES // 4, "after": MESSAGES // 2},
+    }
+    number = 20
+    for name, kwargs in queries.items():
+        elapsed = timeit.timeit(
+            lambda: cache.get_messages("general", **kwargs),
+            number=number,
+        )
+        legacy_elapsed = timeit.timeit(
+            lambda: legacy_get_messages(legacy, **kwargs),
+            number=number,
+        )
+        print(
+            f"get_messages ({name}): {elapsed / number * 1e6:.1f} µs "
+            f"(legacy: {legacy_elapsed / number * 1e6:.1f} µs)"
+        )
+
+    ids = random.sample(range(MESSAGES), 100_000)
+    elapsed = timeit.timeit(
+        lambda: [cache.get_message("general", id) for id in ids],
+        number=1,
+    )
+    print(f"get_message: {elapsed / len(ids) * 1e9:.0f} ns / message")
+
+    start = time.perf_counter()
+    cache.remove_messages("general", ids)
+    elapsed = time.perf_counter() - start
+    print(f"remove_messages: {elapsed / len(ids) * 1e9:.0f} ns / message")
+
+    elapsed = timeit.timeit(lambda: cache.get_messages("general"), number=number)
+    print(f"get_messages (after removal): {elapsed / number * 1e6:.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Compare the cost of appending messages to the write-ahead log
+against inserting them into SQLite one transaction at a time.
+
+Usage:
+    python benchmarks/bench_message_log.py
+
+"""
+
+import tempfile
+import time
+from pathlib import Path
+
+from dumdum.protocol import Message
+from dumdum.server.store import ServerStore
+from dumdum.server.wal import FsyncPolicy, MessageLog
+
+MESSAGES = 20_000
+
+
+def main() -> None:
+    messages = [
+        Message(i, "general", "thegamecracks", "Hello world!") for i in range(MESSAGES)
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for policy in (FsyncPolicy.OS, FsyncPolicy.INTERVAL):
+            directory = Path(tmp) / policy.value
+            with MessageLog.open(directory, fsync_policy=policy) as wal:
+                start = time.perf_counter()
+                for message in messages:
+                    wal.append_message(message)
+                elapsed = time.perf_counter() - start
+            print(f"wal ({policy.value}): {elapsed / MESSAGES * 1e6:.1f} µs / message")
+
+        path = str(Path(tmp) / "server.db")
+        with ServerStore.connect(path) as store:
+            start = time.perf_counter()
+            for message in messages[:1000]:
+                with store.transaction():
+                    store.add_messages([message])
+            elapsed = time.perf_counter() - start
+        print(f"sqlite (per-row transaction): {elapsed / 1000 * 1e6:.1f} µs / message")
+
+
+if __name__ == "__main__":
+    main()
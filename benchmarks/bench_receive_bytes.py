@@ -0,0 +1,142 @@
+"""Measure the cost of parsing many SEND_MESSAGE frames from one chunk.
+
+The per-frame cost of Server.receive_bytes() should stay flat as the
+number of frames per chunk grows, for both unframed version 2 clients and
+framed clients of the latest version.
+
+For comparison, the same version 2 frames are also parsed the way servers
+did before the offset-based receive buffer, with a reader that copies every
+field out of a bytearray and deletes each message from the front of the
+buffer once it is parsed. That parser is copied here as it was. CPython
+deletes from the front of a bytearray by advancing its start, and only
+copies the rest once it shrinks below half its allocation, so the baseline
+also scales linearly rather than quadratically.
+
+Usage:
+    python benchmarks/bench_receive_bytes.py
+
+"""
+
+import contextlib
+import timeit
+from typing import Iterator
+
+from dumdum.protocol import (
+    Client,
+    MalformedDataError,
+    Server,
+    ServerEvent,
+    ServerEventMessageReceived,
+)
+from dumdum.protocol.constants import MAX_CHANNEL_NAME_LENGTH, MAX_MESSAGE_LENGTH
+from dumdum.protocol.enums import ClientMessageType
+
+FRAME_COUNTS = (100, 1000, 10000, 100000, 400000)
+
+
+class BaselineReader:
+    def __init__(self, buffer: bytearray | bytes) -> None:
+        self.buffer = buffer
+        self._index = 0
+
+    def read(self, n: int) -> bytes:
+        n = min(n, len(self.buffer))
+        start, self._index = self._index, self._index + n
+        data = self.buffer[start : self._index]
+        return bytes(data) if isinstance(data, bytearray) else data
+
+    def readexactly(self, n: int) -> bytes:
+        data = self.read(n)
+        if len(data) != n:
+            raise IndexError(
+                f"Insufficent data to read (expected {n}, got {len(data)})"
+            )
+        return data
+
+    def read_varchar(self, *, max_length: int) -> str:
+        byte_count = (max_length.bit_length() + 7) // 8
+        length = int.from_bytes(self.readexactly(byte_count), byteorder="big")
+        return self.readexactly(length).decode()
+
+
+@contextlib.contextmanager
+def baseline_bytearray_reader(buffer: bytearray) -> Iterator[BaselineReader]:
+    reader = BaselineReader(buffer)
+    yield reader
+    buffer[: reader._index] = b""
+
+
+def parse_with_baseline(chunk: bytes) -> None:
+    buffer = bytearray(chunk)
+    events: list[ServerEvent] = []
+    try:
+        while True:
+            with baseline_bytearray_reader(buffer) as reader:
+                n = reader.readexactly(1)[0]
+                try:
+                    t = ClientMessageType(n)
+                except ValueError:
+                    raise MalformedDataError(f"Unknown message type {n}") from None
+                if t != ClientMessageType.SEND_MESSAGE:
+                    raise MalformedDataError(f"Unexpected message type {t}")
+
+                channel_name = reader.read_varchar(max_length=MAX_CHANNEL_NAME_LENGTH)
+                content = reader.read_varchar(max_length=MAX_MESSAGE_LENGTH)
+                events.append(ServerEventMessageReceived(channel_name, content))
+    except IndexError:
+        pass
+    assert len(events) > 0
+
+
+def connect(version: int) -> tuple[Client, Server]:
+    client = Client("thegamecracks")
+    client.PROTOCOL_VERSION = version  # type: ignore
+    server = Server(buffer_size=None)
+
+    server.receive_bytes(client.hello())
+    client.receive_bytes(server.hello(using_ssl=False))
+    server.receive_bytes(client.authenticate())
+    client.receive_bytes(server.authenticate(success=True))
+    return client, server
+
+
+def make_chunk(version: int, frames: int) -> bytes:
+    client, _ = connect(version)
+    data = client.send_message("general", "Hello world!")
+    return data * frames
+
+
+def parse_with_server(version: int, chunk: bytes) -> None:
+    _, server = connect(version)
+    events, _ = server.receive_bytes(chunk)
+    assert len(events) > 0
+
+
+def main() -> None:
+    latest = Server.PROTOCOL_VERSION
+    print(
+        f"{'frames':>8} {'baseline v2':>14} {'v2':>10} {f'v{latest}':>10}"
+        "  (per frame)"
+    )
+    for frames in FRAME_COUNTS:
+        number = max(1, 200000 // frames)
+        results = []
+
+        chunk = make_chunk(2, frames)
+        elapsed = timeit.timeit(lambda: parse_with_baseline(chunk), number=number)
+        results.append(elapsed / number / frames * 1e9)
+
+        for version in (2, latest):
+            chunk = make_chunk(version, frames)
+            elapsed = timeit.timeit(
+                lambda: parse_with_server(version, chunk),
+                number=number,
+            )
+            results.append(elapsed / number / frames * 1e9)
+
+        baseline, v2, current = results
+        print(f"{frames:>8} {baseline:>11.0f} ns {v2:>7.0f} ns {current:>7.0f} ns")
+
+
+if __name__ == "__main__":
+    main()
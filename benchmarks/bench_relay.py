@@ -0,0 +1,40 @@
+"""Measure how long the server takes to encode messages for SEND_MESSAGE
+and LIST_MESSAGES when the content is re-encoded versus relayed as the
+raw bytes it was received as.
+
+Usage:
+    python benchmarks/bench_relay.py
+
+"""
+
+import timeit
+
+from dumdum.protocol import Message, Server, ServerState
+
+CONTENT = "Hello world! " * 40 + "🐢"
+
+
+def main() -> None:
+    server = Server()
+    server._state = ServerState.READY
+
+    encoded = [Message(i, "general", "thegamecracks", CONTENT) for i in range(1, 101)]
+    relayed = [
+        Message(i, "general", "thegamecracks", CONTENT, raw_content=CONTENT.encode())
+        for i in range(1, 101)
+    ]
+
+    number = 2000
+    for name, messages in (("re-encoded", encoded), ("relayed", relayed)):
+        elapsed = timeit.timeit(
+            lambda: server.send_message(messages[0]),
+            number=number * 10,
+        )
+        print(f"send_message ({name}): {elapsed / number / 10 * 1e6:.2f} µs")
+
+        elapsed = timeit.timeit(lambda: server.list_messages(messages), number=number)
+        print(f"list_messages x100 ({name}): {elapsed / number * 1e6:.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
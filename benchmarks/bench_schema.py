@@ -0,0 +1,173 @@
+"""Compare schema-generated codecs against the hand-written ones they replaced.
+
+Each case encodes a message and decodes it again. The hand-written
+codecs are copied here as they were before messages were declared
+with schemas.
+
+Usage:
+    python benchmarks/bench_schema.py
+
+"""
+
+import timeit
+from typing import Callable
+
+from dumdum.protocol import (
+    ClientMessageListMessages,
+    ClientMessagePost,
+    ClientMessageSync,
+    Message,
+    byte_reader,
+    varchar,
+)
+from dumdum.protocol.constants import (
+    MAX_CHANNEL_NAME_LENGTH,
+    MAX_MESSAGE_LENGTH,
+    MAX_NICK_LENGTH,
+)
+from dumdum.protocol.enums import ClientMessageType
+
+MESSAGE = Message(1234567890, "general", "thegamecracks", "Hello world! " * 4)
+WATERMARKS = {f"channel-{i}": i for i in range(20)}
+
+
+def legacy_message(message: Message) -> Message:
+    data = b"".join(
+        (
+            message.id.to_bytes(8, byteorder="big"),
+            varchar.dumps(message.channel_name, max_length=MAX_CHANNEL_NAME_LENGTH),
+            varchar.dumps(message.nick, max_length=MAX_NICK_LENGTH),
+            varchar.dumps(message.content, max_length=MAX_MESSAGE_LENGTH),
+        )
+    )
+    with byte_reader(data) as reader:
+        id = reader.read_bigint()
+        channel_name = reader.read_varchar(max_length=MAX_CHANNEL_NAME_LENGTH)
+        nick = reader.read_varchar(max_length=MAX_NICK_LENGTH)
+        raw_content = bytes(reader.read_varchar_view(max_length=MAX_MESSAGE_LENGTH))
+        return Message(id, channel_name, nick, str(raw_content, "utf-8"))
+
+
+def schema_message(message: Message) -> Message:
+    with byte_reader(bytes(message)) as reader:
+        return Message.from_reader(reader)
+
+
+def legacy_post(channel_name: str, content: str) -> tuple:
+    data = bytes(
+        [
+            ClientMessageType.SEND_MESSAGE.value,
+            *varchar.dumps(channel_name, max_length=MAX_CHANNEL_NAME_LENGTH),
+            *varchar.dumps(content, max_length=MAX_MESSAGE_LENGTH),
+        ]
+    )
+    with byte_reader(data) as reader:
+        reader.readexactly(1)
+        channel_name = reader.read_varchar(max_length=MAX_CHANNEL_NAME_LENGTH)
+        raw_content = bytes(reader.read_varchar_view(max_length=MAX_MESSAGE_LENGTH))
+        return channel_name, str(raw_content, "utf-8")
+
+
+def schema_post(channel_name: str, content: str) -> tuple:
+    data = bytes(ClientMessagePost(channel_name, content))
+    with byte_reader(data) as reader:
+        reader.readexactly(1)
+        channel_name, raw_content = ClientMessagePost.SCHEMA.decode(reader)
+        return channel_name, str(raw_content, "utf-8")
+
+
+def legacy_list_messages(channel_name: str, before: int, after: int) -> tuple:
+    data = bytes(
+        [
+            ClientMessageType.LIST_MESSAGES.value,
+            *varchar.dumps(channel_name, max_length=MAX_CHANNEL_NAME_LENGTH),
+            *before.to_bytes(8, byteorder="big"),
+            *after.to_bytes(8, byteorder="big"),
+        ]
+    )
+    with byte_reader(data) as reader:
+        reader.readexactly(1)
+        channel_name = reader.read_varchar(max_length=MAX_CHANNEL_NAME_LENGTH)
+        return channel_name, reader.read_bigint(), reader.read_bigint()
+
+
+def schema_list_messages(channel_name: str, before: int, after: int) -> tuple:
+    data = bytes(ClientMessageListMessages(channel_name, before, after))
+    with byte_reader(data) as reader:
+        reader.readexactly(1)
+        return ClientMessageListMessages.SCHEMA.decode(reader)
+
+
+def legacy_sync(watermarks: dict[str, int]) -> dict[str, int]:
+    data = b"".join(
+        (
+            bytes([ClientMessageType.SYNC.value, True]),
+            len(watermarks).to_bytes(2, byteorder="big"),
+            *(
+                varchar.dumps(name, max_length=MAX_CHANNEL_NAME_LENGTH)
+                + id.to_bytes(8, byteorder="big")
+                for name, id in watermarks.items()
+            ),
+        )
+    )
+    with byte_reader(data) as reader:
+        reader.readexactly(2)
+        count = int.from_bytes(reader.readexactly(2), byteorder="big")
+        result = {}
+        for _ in range(count):
+            channel_name = reader.read_varchar(max_length=MAX_CHANNEL_NAME_LENGTH)
+            result[channel_name] = reader.read_bigint()
+        return result
+
+
+def schema_sync(watermarks: dict[str, int]) -> dict[str, int]:
+    data = bytes(ClientMessageSync(watermarks, True))
+    with byte_reader(data) as reader:
+        reader.readexactly(1)
+        _, result = ClientMessageSync.SCHEMA.decode(reader)
+        return dict(result)
+
+
+CASES: list[tuple[str, Callable[[], object], Callable[[], object]]] = [
+    (
+        "Message",
+        lambda: legacy_message(MESSAGE),
+        lambda: schema_message(MESSAGE),
+    ),
+    (
+        "SEND_MESSAGE",
+        lambda: legacy_post("general", MESSAGE.content),
+        lambda: schema_post("general", MESSAGE.content),
+    ),
+    (
+        "LIST_MESSAGES",
+        lambda: legacy_list_messages("general", 1, 2**40),
+        lambda: schema_list_messages("general", 1, 2**40),
+    ),
+    (
+        "SYNC (20 channels)",
+        lambda: legacy_sync(WATERMARKS),
+        lambda: schema_sync(WATERMARKS),
+    ),
+]
+
+
+def measure(function: Callable[[], object]) -> float:
+    number = 20000
+    return min(timeit.repeat(function, number=number, repeat=5)) / number * 1e9
+
+
+def main() -> None:
+    print(f"{'message':<20} {'hand-written':>14} {'schema':>10} {'speedup':>8}")
+    for name, legacy, schema in CASES:
+        assert legacy() == schema(), name
+        legacy_ns = measure(legacy)
+        schema_ns = measure(schema)
+        print(
+            f"{name:<20} {legacy_ns:>11.0f} ns {schema_ns:>7.0f} ns "
+            f"{legacy_ns / schema_ns:>7.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
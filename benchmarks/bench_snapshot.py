@@ -0,0 +1,62 @@
+"""Measure how long it takes to restore a message cache from a snapshot
+as the number of cached messages grows.
+
+Opening a snapshot only reads its index, so it should take roughly the same
+time regardless of history size. Channels are decoded on first access.
+
+Usage:
+    python benchmarks/bench_snapshot.py
+
+"""
+
+import gc
+import tempfile
+import time
+from pathlib import Path
+
+from dumdum.protocol import Message
+from dumdum.server.snapshot import Snapshot
+from dumdum.server.state import MessageCache
+
+CHANNELS = 16
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "cache.snapshot"
+
+        for total in (10_000, 100_000, 1_000_000):
+            cache = MessageCache(max_messages=None)
+            for i in range(total):
+                channel_name = f"channel-{i % CHANNELS}"
+                cache.add_message(
+                    Message(i, channel_name, "thegamecracks", "Hello world!")
+                )
+
+            start = time.perf_counter()
+            cache.write_snapshot(path)
+            write_elapsed = time.perf_counter() - start
+
+            # Free the written cache before timing, so its teardown isn't counted
+            del cache
+            gc.collect()
+
+            cache = MessageCache(max_messages=None)
+            start = time.perf_counter()
+            cache.load_snapshot(Snapshot.open(path))
+            open_elapsed = time.perf_counter() - start
+
+            start = time.perf_counter()
+            cache.get_messages("channel-0")
+            load_elapsed = time.perf_counter() - start
+            cache.close()
+
+            print(
+                f"{total:>9,d} messages: write {write_elapsed * 1e3:.0f} ms, "
+                f"open {open_elapsed * 1e6:.0f} µs, "
+                f"first channel access {load_elapsed * 1e3:.1f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
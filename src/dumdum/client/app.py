@@ -199,7 +199,7 @@ class TkApp(Tk):
 
             self.switch_frame(ChatFrame(self))
             self.switch_menu(ChatMenu(self))
-            self.submit(self.client.list_channels())
+            self.submit(self.client.sync(join=True))
 
         if isinstance(self.frame, Dispatchable):
             self.frame.handle_client_event(event)
@@ -1,7 +1,7 @@
 import asyncio
 import contextlib
 import ssl
-from typing import Any, AsyncIterator, Callable, Iterator, Self
+from typing import Any, AsyncIterator, Callable, Iterator, Mapping, Self, Sequence
 
 from dumdum.protocol import (
     Client,
@@ -9,6 +9,7 @@ from dumdum.protocol import (
     ClientEventAuthentication,
     ClientEventHello,
     ClientEventIncompatibleVersion,
+    CompressionType,
 )
 
 from .errors import (
@@ -39,13 +40,19 @@ class AsyncClient:
         event_callback: Callable[[ClientEvent], Any],
         drain_timeout: float = 30,
         close_timeout: float = 5,
+        stream_message_lists: bool = False,
+        compression: CompressionType = CompressionType.NONE,
     ) -> None:
         self.nick = nick
         self.event_callback = event_callback
         self.drain_timeout = drain_timeout
         self.close_timeout = close_timeout
 
-        self._protocol = Client(nick)
+        self._protocol = Client(
+            nick,
+            stream_message_lists=stream_message_lists,
+            compression=compression,
+        )
         self._reader = None
         self._writer = None
         self._read_task = None
@@ -102,6 +109,10 @@ class AsyncClient:
         data = self._protocol.send_message(channel_name, content)
         await self._send_and_drain(data)
 
+    async def send_messages(self, channel_name: str, contents: Sequence[str]) -> None:
+        data = self._protocol.send_messages(channel_name, contents)
+        await self._send_and_drain(data)
+
     async def list_channels(self) -> None:
         data = self._protocol.list_channels()
         await self._send_and_drain(data)
@@ -112,8 +123,31 @@ class AsyncClient:
         *,
         before: int | None = None,
         after: int | None = None,
+        limit: int | None = None,
     ) -> None:
-        data = self._protocol.list_messages(channel_name, before=before, after=after)
+        data = self._protocol.list_messages(
+            channel_name,
+            before=before,
+            after=after,
+            limit=limit,
+        )
+        await self._send_and_drain(data)
+
+    async def sync(
+        self,
+        watermarks: Mapping[str, int] | None = None,
+        *,
+        join: bool = False,
+    ) -> None:
+        data = self._protocol.sync(watermarks, join=join)
+        await self._send_and_drain(data)
+
+    async def join_channel(self, channel_name: str) -> None:
+        data = self._protocol.join_channel(channel_name)
+        await self._send_and_drain(data)
+
+    async def part_channel(self, channel_name: str) -> None:
+        data = self._protocol.part_channel(channel_name)
         await self._send_and_drain(data)
 
     @contextlib.contextmanager
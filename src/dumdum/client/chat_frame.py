@@ -13,6 +13,8 @@ from dumdum.protocol import (
     ClientEventChannelsListed,
     ClientEventMessageReceived,
     ClientEventMessagesListed,
+    ClientEventMessagesReceived,
+    ClientEventSynced,
     Message,
 )
 
@@ -50,12 +52,24 @@ class ChatFrame(Frame):
             self.channel_list.refresh()
 
             for channel in event.channels:
+                coro = self.app.client.join_channel(channel.name)
+                self.app.submit(coro)
                 coro = self.app.client.list_messages(channel.name)
                 self.app.submit(coro)
 
+        elif isinstance(event, ClientEventSynced):
+            self.channels.clear()
+            self.channels.extend(event.channels)
+            self.channel_list.refresh()
+
+            for message in event.messages:
+                self.add_message(message)
+
         elif isinstance(event, ClientEventMessageReceived):
             self.add_message(event.message)
-        elif isinstance(event, ClientEventMessagesListed):
+        elif isinstance(
+            event, (ClientEventMessagesListed, ClientEventMessagesReceived)
+        ):
             for message in event.messages:
                 self.add_message(message)
 
@@ -1,7 +1,7 @@
 import contextlib
 import sqlite3
 from abc import ABC, abstractmethod
-from typing import Any, ContextManager, Iterator, Protocol, Self, Sequence
+from typing import Any, ContextManager, Iterable, Iterator, Protocol, Self, Sequence
 
 Row = Sequence[Any]
 
@@ -16,6 +16,10 @@ class Connection(ABC):
     def execute(self, query: str, /, *parameters: Any) -> Cursor:
         """Execute query and return a cursor."""
 
+    @abstractmethod
+    def executemany(self, query: str, parameters: Iterable[Row], /) -> None:
+        """Execute query once for each set of parameters."""
+
     @abstractmethod
     def executescript(self, query: str, /) -> None:
         """Execute one or more SQL statements."""
@@ -65,6 +69,9 @@ class SQLiteConnection(Connection):
 
         return self._conn.execute(query, _params)
 
+    def executemany(self, query: str, parameters: Iterable[Row]) -> None:
+        self._conn.executemany(query, parameters)
+
     def executescript(self, query: str) -> None:
         self._conn.executescript(query)
 
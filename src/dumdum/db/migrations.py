@@ -8,7 +8,7 @@ from .connection import SQLiteConnection
 
 log = logging.getLogger(__name__)
 
-MigrationPath = Literal["client"]
+MigrationPath = Literal["client", "server"]
 
 
 def run_migrations(conn: SQLiteConnection, path: MigrationPath):
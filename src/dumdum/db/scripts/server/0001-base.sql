@@ -0,0 +1,7 @@
+CREATE TABLE message (
+    id INTEGER PRIMARY KEY,
+    channel_name TEXT NOT NULL,
+    nick TEXT NOT NULL,
+    content TEXT NOT NULL
+);
+CREATE INDEX ix_message_channel_name_id ON message (channel_name, id);
@@ -5,13 +5,22 @@ from .client import (
     ClientEventChannelsListed,
     ClientEventHello,
     ClientEventIncompatibleVersion,
+    ClientEventMessageListCompleted,
     ClientEventMessageReceived,
+    ClientEventMessageStreamed,
     ClientEventMessagesListed,
+    ClientEventMessagesReceived,
+    ClientEventSynced,
+    ClientEventThrottled,
     ClientMessageAuthenticate,
     ClientMessageHello,
+    ClientMessageJoinChannel,
     ClientMessageListChannels,
     ClientMessageListMessages,
+    ClientMessagePartChannel,
     ClientMessagePost,
+    ClientMessagePostMany,
+    ClientMessageSync,
     ClientState,
 )
 from .server import (
@@ -20,19 +29,27 @@ from .server import (
     ServerEventAuthentication,
     ServerEventHello,
     ServerEventIncompatibleVersion,
+    ServerEventJoinChannel,
     ServerEventListChannels,
     ServerEventListMessages,
     ServerEventMessageReceived,
+    ServerEventMessagesReceived,
+    ServerEventPartChannel,
+    ServerEventSync,
     ServerMessageAcknowledgeAuthentication,
     ServerMessageHello,
     ServerMessageListChannels,
     ServerMessageListMessages,
     ServerMessagePost,
+    ServerMessagePostMany,
     ServerMessageSendIncompatibleVersion,
+    ServerMessageSync,
+    ServerMessageThrottled,
     ServerState,
 )
-from .buffer import extend_limited_buffer
+from .buffer import ReceiveBuffer, extend_limited_buffer
 from .channel import Channel
+from .compression import CompressionType, FrameCompressionStats
 from .constants import MAX_MESSAGE_LENGTH, MAX_NICK_LENGTH
 from .enums import ClientMessageType, ServerMessageType
 from .errors import (
@@ -42,7 +59,8 @@ from .errors import (
     MalformedDataError,
     ProtocolError,
 )
+from .frame import PreparedMessage
 from .interfaces import Protocol
 from .message import Message
 from .reader import Reader, bytearray_reader, byte_reader
-from .snowflake import create_snowflake
+from .snowflake import SnowflakeGenerator, create_snowflake
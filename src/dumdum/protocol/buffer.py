@@ -1,4 +1,8 @@
+import contextlib
+from typing import Iterator
+
 from .errors import BufferOverflowError
+from .reader import Reader
 
 
 def extend_limited_buffer(
@@ -16,3 +20,79 @@ def extend_limited_buffer(
         raise BufferOverflowError(limit, len_buffer, len_data)
 
     buffer.extend(data)
+
+
+class ReceiveBuffer:
+    """A buffer of received bytes which is consumed by offset.
+
+    Rather than deleting each message from the front of the buffer as soon
+    as it is read, the buffer remembers how many bytes have been consumed
+    and only discards them when more data is added. This means a chunk
+    containing many messages costs one compaction instead of one per message.
+
+    """
+
+    def __init__(self) -> None:
+        self._data = bytearray()
+        self._offset = 0
+
+    def __len__(self) -> int:
+        return len(self._data) - self._offset
+
+    def extend(self, data: bytes | bytearray, *, limit: int | None) -> None:
+        """Compact the buffer and append data to it.
+
+        :raises BufferOverflowError:
+            The unconsumed data would exceed the given limit.
+
+        """
+        self.compact()
+        extend_limited_buffer(self._data, data, limit=limit)
+
+    def compact(self) -> None:
+        """Discard all bytes that have been consumed."""
+        if self._offset > 0:
+            del self._data[: self._offset]
+            self._offset = 0
+
+    def peek_byte(self) -> int:
+        """Return the next unconsumed byte without consuming it.
+
+        :raises IndexError: The buffer is empty.
+
+        """
+        if len(self) < 1:
+            raise IndexError("Cannot peek into empty buffer")
+        return self._data[self._offset]
+
+    def peek(self, n: int) -> bytes | None:
+        """Return the next n unconsumed bytes without consuming them.
+
+        If fewer than n bytes are available, None is returned.
+
+        """
+        if len(self) < n:
+            return None
+
+        start = self._offset
+        return bytes(self._data[start : start + n])
+
+    @contextlib.contextmanager
+    def reader(self, n: int = -1) -> Iterator[Reader]:
+        """Return a reader over the next n unconsumed bytes, or all of them
+        if n is negative.
+
+        Bytes read are only consumed if the context manager exits
+        without an exception.
+
+        """
+        start = self._offset
+        end = len(self._data) if n < 0 else start + n
+        reader = Reader(memoryview(self._data)[start:end])
+
+        try:
+            yield reader
+        finally:
+            reader.close()
+
+        self._offset += reader.offset
@@ -1,19 +1,21 @@
 from dataclasses import dataclass, field
-from typing import Self
+from typing import ClassVar, Self
 
-from . import varchar
 from .constants import MAX_CHANNEL_NAME_LENGTH
 from .reader import Reader
+from .schema import Schema, Varchar
 
 
 @dataclass
 class Channel:
+    SCHEMA: ClassVar[Schema] = Schema(None, Varchar(MAX_CHANNEL_NAME_LENGTH))
+
     name: str = field(hash=True)
 
     def __bytes__(self) -> bytes:
-        return varchar.dumps(self.name, max_length=MAX_CHANNEL_NAME_LENGTH)
+        return self.SCHEMA.encode(self.name)
 
     @classmethod
     def from_reader(cls, reader: Reader) -> Self:
-        name = reader.read_varchar(max_length=MAX_CHANNEL_NAME_LENGTH)
+        (name,) = cls.SCHEMA.decode(reader)
         return cls(name=name)
@@ -4,14 +4,23 @@ from .events import (
     ClientEventChannelsListed,
     ClientEventHello,
     ClientEventIncompatibleVersion,
+    ClientEventMessageListCompleted,
     ClientEventMessageReceived,
+    ClientEventMessageStreamed,
     ClientEventMessagesListed,
+    ClientEventMessagesReceived,
+    ClientEventSynced,
+    ClientEventThrottled,
 )
 from .messages import (
     ClientMessageAuthenticate,
     ClientMessageHello,
+    ClientMessageJoinChannel,
     ClientMessageListChannels,
     ClientMessageListMessages,
+    ClientMessagePartChannel,
     ClientMessagePost,
+    ClientMessagePostMany,
+    ClientMessageSync,
 )
 from .protocol import Client, ClientState
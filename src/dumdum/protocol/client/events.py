@@ -2,6 +2,7 @@ from dataclasses import dataclass
 from typing import Sequence
 
 from dumdum.protocol.channel import Channel
+from dumdum.protocol.compression import CompressionType
 from dumdum.protocol.message import Message
 
 
@@ -15,6 +16,8 @@ class ClientEventHello(ClientEvent):
     """The server responded to our hello."""
 
     using_ssl: bool
+    compression: CompressionType = CompressionType.NONE
+    """The compression accepted by the server."""
 
 
 @dataclass
@@ -39,6 +42,13 @@ class ClientEventMessageReceived(ClientEvent):
     message: Message
 
 
+@dataclass
+class ClientEventMessagesReceived(ClientEvent):
+    """The server broadcasted several messages to the client at once."""
+
+    messages: Sequence[Message]
+
+
 @dataclass
 class ClientEventChannelsListed(ClientEvent):
     """The server responded to our request for a channel list."""
@@ -51,3 +61,45 @@ class ClientEventMessagesListed(ClientEvent):
     """The server responded to our request for a message list."""
 
     messages: Sequence[Message]
+
+
+@dataclass
+class ClientEventThrottled(ClientEvent):
+    """The server rejected our message for exceeding a rate limit."""
+
+    channel_name: str
+    retry_after: float
+    """The number of seconds to wait before sending another message."""
+
+
+@dataclass
+class ClientEventMessageStreamed(ClientEvent):
+    """The server sent one message of a message list.
+
+    Only produced when message lists are streamed.
+
+    """
+
+    message: Message
+
+
+@dataclass
+class ClientEventMessageListCompleted(ClientEvent):
+    """The server finished sending a message list.
+
+    Only produced when message lists are streamed.
+
+    """
+
+    count: int
+    """The number of messages in the list."""
+
+
+@dataclass
+class ClientEventSynced(ClientEvent):
+    """The server responded to our request to sync."""
+
+    channels: Sequence[Channel]
+    messages: Sequence[Message]
+    """The latest messages of each channel, grouped by channel
+    in the same order as the channel list."""
@@ -1,75 +1,225 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import ClassVar, Mapping, Sequence
 
-from dumdum.protocol import varchar
+from dumdum.protocol.compression import CompressionType
 from dumdum.protocol.constants import (
+    MAX_BATCH_MESSAGES,
     MAX_CHANNEL_NAME_LENGTH,
     MAX_MESSAGE_LENGTH,
     MAX_NICK_LENGTH,
+    MAX_SYNC_WATERMARKS,
 )
 from dumdum.protocol.enums import ClientMessageType
+from dumdum.protocol.schema import (
+    BOOL,
+    U8,
+    U16,
+    U64,
+    VARINT,
+    Repeated,
+    Schema,
+    Varchar,
+)
+
+_COMPACT_CHANNEL_FIELDS = (VARINT, Varchar(MAX_CHANNEL_NAME_LENGTH, varint=True))
+"""How compact messages refer to a channel, starting with protocol version 5.
+
+The varint is one more than the index of the channel in the last channel
+list received, followed by an empty channel name. If the varint is zero,
+the channel name is given instead.
+
+"""
+
+
+def _dump_channel(channel_name: str, channel_index: int | None) -> tuple[int, str]:
+    if channel_index is None:
+        return 0, channel_name
+    return channel_index + 1, ""
 
 
 @dataclass
 class ClientMessageHello:
+    SCHEMA: ClassVar[Schema] = Schema(ClientMessageType.HELLO.value, U8)
+    COMPRESSION_SCHEMA: ClassVar[Schema] = Schema(None, U8)
+    """The requested compression, which follows the version
+    starting with protocol version 4."""
+
     version: int
+    compression: CompressionType | None = None
 
     def __bytes__(self) -> bytes:
-        return bytes(
-            [
-                ClientMessageType.HELLO.value,
-                self.version,
-            ]
-        )
+        data = self.SCHEMA.encode(self.version)
+        if self.compression is not None:
+            data += self.COMPRESSION_SCHEMA.encode(self.compression.value)
+        return data
 
 
 @dataclass
 class ClientMessageAuthenticate:
+    SCHEMA: ClassVar[Schema] = Schema(
+        ClientMessageType.AUTHENTICATE.value,
+        Varchar(MAX_NICK_LENGTH),
+    )
+
     nick: str
 
     def __bytes__(self) -> bytes:
-        return bytes(
-            [
-                ClientMessageType.AUTHENTICATE.value,
-                *varchar.dumps(self.nick, max_length=MAX_NICK_LENGTH),
-            ]
-        )
+        return self.SCHEMA.encode(self.nick)
 
 
 @dataclass
 class ClientMessagePost:
+    SCHEMA: ClassVar[Schema] = Schema(
+        ClientMessageType.SEND_MESSAGE.value,
+        Varchar(MAX_CHANNEL_NAME_LENGTH),
+        Varchar(MAX_MESSAGE_LENGTH, raw=True),
+    )
+    COMPACT_SCHEMA: ClassVar[Schema] = Schema(
+        ClientMessageType.SEND_MESSAGE.value,
+        *_COMPACT_CHANNEL_FIELDS,
+        Varchar(MAX_MESSAGE_LENGTH, raw=True, varint=True),
+    )
+
     channel_name: str
     content: str
+    compact: bool = field(default=False, kw_only=True)
+    channel_index: int | None = field(default=None, kw_only=True)
 
     def __bytes__(self) -> bytes:
-        return bytes(
-            [
-                ClientMessageType.SEND_MESSAGE.value,
-                *varchar.dumps(self.channel_name, max_length=MAX_CHANNEL_NAME_LENGTH),
-                *varchar.dumps(self.content, max_length=MAX_MESSAGE_LENGTH),
-            ]
-        )
+        if self.compact:
+            return self.COMPACT_SCHEMA.encode(
+                *_dump_channel(self.channel_name, self.channel_index),
+                self.content.encode(),
+            )
+        return self.SCHEMA.encode(self.channel_name, self.content.encode())
+
+
+@dataclass
+class ClientMessagePostMany:
+    SCHEMA: ClassVar[Schema] = Schema(
+        ClientMessageType.SEND_MESSAGES.value,
+        Varchar(MAX_CHANNEL_NAME_LENGTH),
+        Repeated((Varchar(MAX_MESSAGE_LENGTH, raw=True),), count=U16),
+    )
+    COMPACT_SCHEMA: ClassVar[Schema] = Schema(
+        ClientMessageType.SEND_MESSAGES.value,
+        *_COMPACT_CHANNEL_FIELDS,
+        Repeated((Varchar(MAX_MESSAGE_LENGTH, raw=True, varint=True),), count=VARINT),
+    )
+
+    channel_name: str
+    contents: Sequence[str]
+    compact: bool = field(default=False, kw_only=True)
+    channel_index: int | None = field(default=None, kw_only=True)
+
+    def __bytes__(self) -> bytes:
+        if len(self.contents) > MAX_BATCH_MESSAGES:
+            raise ValueError(
+                f"Cannot send more than {MAX_BATCH_MESSAGES} messages at once, "
+                f"got {len(self.contents)}"
+            )
+
+        contents = [(content.encode(),) for content in self.contents]
+        if self.compact:
+            return self.COMPACT_SCHEMA.encode(
+                *_dump_channel(self.channel_name, self.channel_index),
+                contents,
+            )
+        return self.SCHEMA.encode(self.channel_name, contents)
 
 
 @dataclass
 class ClientMessageListChannels:
+    SCHEMA: ClassVar[Schema] = Schema(ClientMessageType.LIST_CHANNELS.value)
+
     def __bytes__(self) -> bytes:
-        return bytes([ClientMessageType.LIST_CHANNELS.value])
+        return self.SCHEMA.encode()
 
 
 @dataclass
 class ClientMessageListMessages:
+    SCHEMA: ClassVar[Schema] = Schema(
+        ClientMessageType.LIST_MESSAGES.value,
+        Varchar(MAX_CHANNEL_NAME_LENGTH),
+        U64,
+        U64,
+    )
+    LIMIT_SCHEMA: ClassVar[Schema] = Schema(None, U16)
+    """The optional limit following the rest of the message."""
+    COMPACT_SCHEMA: ClassVar[Schema] = Schema(
+        ClientMessageType.LIST_MESSAGES.value,
+        *_COMPACT_CHANNEL_FIELDS,
+        VARINT,
+        VARINT,
+        VARINT,
+    )
+    """The encoding starting with protocol version 5, where the before,
+    after, and limit fields are zero when not given."""
+
     channel_name: str
     before: int | None
     after: int | None
+    limit: int | None = None
+    compact: bool = field(default=False, kw_only=True)
+    channel_index: int | None = field(default=None, kw_only=True)
 
     def __bytes__(self) -> bytes:
-        before = self.before or 0
-        after = self.after or 0
-        return bytes(
-            [
-                ClientMessageType.LIST_MESSAGES.value,
-                *varchar.dumps(self.channel_name, max_length=MAX_CHANNEL_NAME_LENGTH),
-                *before.to_bytes(8, byteorder="big"),
-                *after.to_bytes(8, byteorder="big"),
-            ]
-        )
+        if self.compact:
+            return self.COMPACT_SCHEMA.encode(
+                *_dump_channel(self.channel_name, self.channel_index),
+                self.before or 0,
+                self.after or 0,
+                self.limit or 0,
+            )
+
+        data = self.SCHEMA.encode(self.channel_name, self.before or 0, self.after or 0)
+        if self.limit is not None:
+            data += self.LIMIT_SCHEMA.encode(self.limit)
+        return data
+
+
+@dataclass
+class ClientMessageJoinChannel:
+    SCHEMA: ClassVar[Schema] = Schema(
+        ClientMessageType.JOIN_CHANNEL.value,
+        Varchar(MAX_CHANNEL_NAME_LENGTH),
+    )
+
+    channel_name: str
+
+    def __bytes__(self) -> bytes:
+        return self.SCHEMA.encode(self.channel_name)
+
+
+@dataclass
+class ClientMessagePartChannel:
+    SCHEMA: ClassVar[Schema] = Schema(
+        ClientMessageType.PART_CHANNEL.value,
+        Varchar(MAX_CHANNEL_NAME_LENGTH),
+    )
+
+    channel_name: str
+
+    def __bytes__(self) -> bytes:
+        return self.SCHEMA.encode(self.channel_name)
+
+
+@dataclass
+class ClientMessageSync:
+    SCHEMA: ClassVar[Schema] = Schema(
+        ClientMessageType.SYNC.value,
+        BOOL,
+        Repeated((Varchar(MAX_CHANNEL_NAME_LENGTH), U64), count=U16),
+    )
+
+    watermarks: Mapping[str, int]
+    join: bool
+
+    def __bytes__(self) -> bytes:
+        if len(self.watermarks) > MAX_SYNC_WATERMARKS:
+            raise ValueError(
+                f"Cannot sync more than {MAX_SYNC_WATERMARKS} watermarks, "
+                f"got {len(self.watermarks)}"
+            )
+
+        return self.SCHEMA.encode(self.join, self.watermarks.items())
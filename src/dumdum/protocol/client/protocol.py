@@ -1,16 +1,45 @@
 from enum import Enum, auto
+from typing import Callable, Mapping, Sequence
 
-from dumdum.protocol.buffer import extend_limited_buffer
+from dumdum.protocol.buffer import ReceiveBuffer
 from dumdum.protocol.channel import Channel
+from dumdum.protocol.compression import (
+    COMPRESSED_FLAG,
+    CompressionType,
+    FrameCompressionStats,
+    FrameCompressor,
+)
 from dumdum.protocol.constants import (
-    MAX_LIST_CHANNEL_LENGTH_BYTES,
+    COMPACT_PROTOCOL_VERSION,
+    COMPRESSED_PROTOCOL_VERSION,
+    DEFAULT_BUFFER_SIZE,
+    FRAME_LENGTH_BYTES,
+    FRAMED_PROTOCOL_VERSION,
+    MAX_BATCH_MESSAGES,
     MAX_LIST_MESSAGE_LENGTH_BYTES,
+    MAX_LIST_MESSAGE_LIMIT,
 )
 from dumdum.protocol.enums import ServerMessageType
 from dumdum.protocol.errors import InvalidStateError, MalformedDataError
+from dumdum.protocol.frame import (
+    FRAME_HEADER,
+    check_frame,
+    dumps_frame,
+    peek_frame_size,
+)
 from dumdum.protocol.interfaces import Protocol
 from dumdum.protocol.message import Message
-from dumdum.protocol.reader import Reader, byte_reader, bytearray_reader
+from dumdum.protocol.page import PageReader, load_page
+from dumdum.protocol.reader import Reader, byte_reader
+from dumdum.protocol.server.messages import (
+    ServerMessageAcknowledgeAuthentication,
+    ServerMessageHello,
+    ServerMessageListChannels,
+    ServerMessagePostMany,
+    ServerMessageSendIncompatibleVersion,
+    ServerMessageSync,
+    ServerMessageThrottled,
+)
 
 from .events import (
     ClientEvent,
@@ -18,19 +47,33 @@ from .events import (
     ClientEventChannelsListed,
     ClientEventHello,
     ClientEventIncompatibleVersion,
+    ClientEventMessageListCompleted,
     ClientEventMessageReceived,
+    ClientEventMessageStreamed,
     ClientEventMessagesListed,
+    ClientEventMessagesReceived,
+    ClientEventSynced,
+    ClientEventThrottled,
 )
 from .messages import (
     ClientMessageAuthenticate,
     ClientMessageHello,
+    ClientMessageJoinChannel,
     ClientMessageListChannels,
     ClientMessageListMessages,
+    ClientMessagePartChannel,
     ClientMessagePost,
+    ClientMessagePostMany,
+    ClientMessageSync,
 )
 
 ParsedData = tuple[list[ClientEvent], bytes]
 
+_FRAMED_MESSAGE_TYPES = frozenset(t.value for t in ServerMessageType) - {
+    ServerMessageType.HELLO.value,
+    ServerMessageType.INCOMPATIBLE_VERSION.value,
+}
+
 
 class ClientState(Enum):
     AWAITING_CLIENT_HELLO = auto()
@@ -40,37 +83,145 @@ class ClientState(Enum):
 
 
 class Client(Protocol):
-    """The client connected to a server."""
+    """The client connected to a server.
+
+    By default, each message list is received in full before being parsed
+    into a single :class:`ClientEventMessagesListed` event, so the buffer
+    size must be large enough to hold the entire list. With
+    ``stream_message_lists=True``, a :class:`ClientEventMessageStreamed` event
+    is produced as soon as each message arrives, followed by a
+    :class:`ClientEventMessageListCompleted` event at the end of the list.
+    The buffer then only needs to hold one message at a time.
+    Compressed message lists are always received and decompressed in full,
+    but produce the same events once they arrive.
+
+    Version 4 servers can be asked to compress the connection with
+    ``compression``. If accepted, frames sent with a payload of at least
+    ``compression_threshold`` bytes are also compressed.
 
-    PROTOCOL_VERSION = 2
+    Once a channel list has been received, from either :meth:`list_channels()`
+    or :meth:`sync()`, messages to version 5 servers refer to channels
+    by their index in that list instead of by name.
 
-    def __init__(self, nick: str, *, buffer_size: int | None = 2**20) -> None:
+    """
+
+    PROTOCOL_VERSION = 5
+
+    _list_remaining: int | None
+    _list_page: PageReader | None
+    _compressor: FrameCompressor | None
+
+    def __init__(
+        self,
+        nick: str,
+        *,
+        buffer_size: int | None = DEFAULT_BUFFER_SIZE,
+        stream_message_lists: bool = False,
+        compression: CompressionType = CompressionType.NONE,
+        compression_threshold: int = 256,
+    ) -> None:
         self.nick = nick
         self.buffer_size = buffer_size
+        self.stream_message_lists = stream_message_lists
+        self.compression = compression
+        self.compression_threshold = compression_threshold
 
-        self._buffer = bytearray()
+        self._buffer = ReceiveBuffer()
         self._state = ClientState.AWAITING_CLIENT_HELLO
+        self._compressor = None
+
+        # The number of bytes left in the message list being streamed, if any
+        self._list_remaining = None
+        self._list_count = 0
+        self._list_page = None
+
+        # The index of each channel in the last channel list received, which
+        # can't be used while the server may have sent a newer list
+        self._channel_indices: dict[str, int] = {}
+        self._pending_channel_lists = 0
+
+        # The channels of a sync response and the messages received so far,
+        # while the message lists following it are still being received
+        self._sync_channels: list[Channel] | None = None
+        self._sync_messages: list[Message] = []
+        self._sync_remaining = 0
+
+    @property
+    def compression_stats(self) -> FrameCompressionStats | None:
+        """Statistics about compressed frames, or None if the connection
+        is not compressed.
+        """
+        if self._compressor is None:
+            return None
+        return self._compressor.stats
 
     def receive_bytes(self, data: bytes) -> ParsedData:
-        extend_limited_buffer(self._buffer, data, limit=self.buffer_size)
+        self._buffer.extend(data, limit=self.buffer_size)
         return self._maybe_parse_buffer()
 
     def hello(self) -> bytes:
         self._assert_state(ClientState.AWAITING_CLIENT_HELLO)
+
+        message = ClientMessageHello(self.PROTOCOL_VERSION)
+        if self.PROTOCOL_VERSION >= COMPRESSED_PROTOCOL_VERSION:
+            message.compression = self.compression
+        elif self.compression != CompressionType.NONE:
+            raise ValueError("compression requires protocol version 4 or newer")
+
         self._state = ClientState.AWAITING_SERVER_HELLO
-        return bytes(ClientMessageHello(self.PROTOCOL_VERSION))
+        return bytes(message)
 
     def authenticate(self) -> bytes:
         self._assert_state(ClientState.AWAITING_AUTHENTICATION)
-        return bytes(ClientMessageAuthenticate(self.nick))
+        return self._frame(bytes(ClientMessageAuthenticate(self.nick)))
 
     def send_message(self, channel_name: str, content: str) -> bytes:
         self._assert_state(ClientState.READY)
-        return bytes(ClientMessagePost(channel_name, content))
+        message = ClientMessagePost(
+            channel_name,
+            content,
+            compact=self._is_compact(),
+            channel_index=self._get_channel_index(channel_name),
+        )
+        return self._frame(bytes(message))
+
+    def send_messages(self, channel_name: str, contents: Sequence[str]) -> bytes:
+        """Send several messages to the same channel in a single frame.
+
+        Requires protocol version 3 or newer.
+
+        :raises ValueError:
+            The frame would be larger than the default buffer size of servers.
+
+        """
+        self._assert_state(ClientState.READY)
+
+        if not 1 <= len(contents) <= MAX_BATCH_MESSAGES:
+            raise ValueError(
+                f"Must send between 1 and {MAX_BATCH_MESSAGES} messages, "
+                f"not {len(contents)}"
+            )
+        if self.PROTOCOL_VERSION < FRAMED_PROTOCOL_VERSION:
+            raise ValueError("Sending many messages requires a framed protocol version")
+
+        message = ClientMessagePostMany(
+            channel_name,
+            contents,
+            compact=self._is_compact(),
+            channel_index=self._get_channel_index(channel_name),
+        )
+        data = bytes(message)
+        if FRAME_HEADER.size + len(data) > DEFAULT_BUFFER_SIZE:
+            raise ValueError(
+                f"Messages exceed the maximum frame size of {DEFAULT_BUFFER_SIZE} "
+                f"bytes, split them into smaller batches"
+            )
+        return self._frame(data)
 
     def list_channels(self) -> bytes:
         self._assert_state(ClientState.READY)
-        return bytes(ClientMessageListChannels())
+        self._pending_channel_lists += 1
+        return self._frame(bytes(ClientMessageListChannels()))
 
     def list_messages(
         self,
@@ -78,28 +229,148 @@ class Client(Protocol):
         *,
         before: int | None = None,
         after: int | None = None,
+        limit: int | None = None,
     ) -> bytes:
+        """Request a page of messages from the given channel.
+
+        :param limit:
+            The maximum number of messages to return, or None to let
+            the server decide. Servers may return fewer messages than
+            requested. Requires protocol version 3 or newer.
+
+        """
         self._assert_state(ClientState.READY)
 
         if before is not None and before < 1:
             raise ValueError(f"before must be 1 or greater, not {before}")
         if after is not None and after < 1:
             raise ValueError(f"after must be 1 or greater, not {after}")
+        if limit is not None and not 1 <= limit <= MAX_LIST_MESSAGE_LIMIT:
+            raise ValueError(
+                f"limit must be between 1 and {MAX_LIST_MESSAGE_LIMIT}, not {limit}"
+            )
+        if limit is not None and self.PROTOCOL_VERSION < FRAMED_PROTOCOL_VERSION:
+            raise ValueError("limit requires a framed protocol version")
+
+        message = ClientMessageListMessages(
+            channel_name,
+            before,
+            after,
+            limit,
+            compact=self._is_compact(),
+            channel_index=self._get_channel_index(channel_name),
+        )
+        return self._frame(bytes(message))
+
+    def join_channel(self, channel_name: str) -> bytes:
+        """Subscribe to messages sent in the given channel."""
+        self._assert_state(ClientState.READY)
+        return self._frame(bytes(ClientMessageJoinChannel(channel_name)))
+
+    def part_channel(self, channel_name: str) -> bytes:
+        """Unsubscribe from messages sent in the given channel."""
+        self._assert_state(ClientState.READY)
+        return self._frame(bytes(ClientMessagePartChannel(channel_name)))
+
+    def sync(
+        self,
+        watermarks: Mapping[str, int] | None = None,
+        *,
+        join: bool = False,
+    ) -> bytes:
+        """Request the channel list and the latest messages of every channel
+        in a single round trip.
+
+        :param watermarks:
+            The ID of the latest message already seen in each channel.
+            Only messages newer than these will be sent.
+        :param join: Whether to subscribe to every channel.
 
-        return bytes(ClientMessageListMessages(channel_name, before, after))
+        """
+        self._assert_state(ClientState.READY)
+        self._pending_channel_lists += 1
+        message = ClientMessageSync(watermarks or {}, join)
+        return self._frame(bytes(message))
 
     def _assert_state(self, *states: ClientState) -> None:
         if self._state not in states:
             raise InvalidStateError(self._state, states)
 
+    def _is_framed(self, message_type: int) -> bool:
+        if self.PROTOCOL_VERSION < FRAMED_PROTOCOL_VERSION:
+            return False
+        return message_type in _FRAMED_MESSAGE_TYPES
+
+    def _is_streamed(self, message_type: int) -> bool:
+        if not self.stream_message_lists:
+            return False
+        return (
+            message_type == ServerMessageType.LIST_MESSAGES.value
+            and self._is_framed(message_type)
+        )
+
+    def _is_compact(self) -> bool:
+        return self.PROTOCOL_VERSION >= COMPACT_PROTOCOL_VERSION
+
+    def _get_channel_index(self, channel_name: str) -> int | None:
+        if not self._is_compact() or self._pending_channel_lists > 0:
+            return None
+        return self._channel_indices.get(channel_name)
+
+    def _set_channel_indices(self, channels: Sequence[Channel]) -> None:
+        self._channel_indices = {c.name: i for i, c in enumerate(channels)}
+        self._pending_channel_lists = max(0, self._pending_channel_lists - 1)
+
+    def _is_compressed(self, message_type: int) -> bool:
+        return self._compressor is not None and message_type & COMPRESSED_FLAG > 0
+
+    def _decompress_frame(self, size: int) -> bytes:
+        assert self._compressor is not None
+        with self._buffer.reader(size) as reader:
+            frame = reader.readexactly_view(size)
+            return self._compressor.decompress_frame(frame, limit=self.buffer_size)
+
+    def _frame(self, data: bytes) -> bytes:
+        if self.PROTOCOL_VERSION < FRAMED_PROTOCOL_VERSION:
+            return data
+        elif self._compressor is not None:
+            return self._compressor.compress_frame(dumps_frame(data))
+        return dumps_frame(data)
+
     def _maybe_parse_buffer(self) -> ParsedData:
         full_events: list[ClientEvent] = []
         full_outgoing = bytearray()
 
         try:
-            while True:
-                with bytearray_reader(self._buffer) as reader:
-                    events, outgoing = self._read_message(reader)
+            while len(self._buffer) > 0 or self._list_remaining == 0:
+                if self._list_remaining is not None:
+                    parsed = self._stream_message_list()
+                    if parsed is None:
+                        break  # Wait for the rest of the message
+                    events, outgoing = parsed
+                elif self._is_compressed(self._buffer.peek_byte()):
+                    size = peek_frame_size(self._buffer, limit=self.buffer_size)
+                    if size is None:
+                        break  # Wait for the rest of the frame
+
+                    frame = self._decompress_frame(size)
+                    with byte_reader(frame) as reader, check_frame(reader):
+                        events, outgoing = self._read_message(reader)
+                elif self._is_streamed(self._buffer.peek_byte()):
+                    parsed = self._start_message_list()
+                    if parsed is None:
+                        break  # Wait for the rest of the header
+                    events, outgoing = parsed
+                elif self._is_framed(self._buffer.peek_byte()):
+                    size = peek_frame_size(self._buffer, limit=self.buffer_size)
+                    if size is None:
+                        break  # Wait for the rest of the frame
+
+                    with self._buffer.reader(size) as reader, check_frame(reader):
+                        events, outgoing = self._read_message(reader)
+                else:
+                    with self._buffer.reader() as reader:
+                        events, outgoing = self._read_message(reader)
 
                 full_events.extend(events)
                 full_outgoing.extend(outgoing)
@@ -113,38 +384,41 @@ class Client(Protocol):
 
     def _read_message(self, reader: Reader) -> ParsedData:
         n = reader.readexactly(1)[0]
-        try:
-            t = ServerMessageType(n)
-        except ValueError:
-            raise MalformedDataError(f"Unknown message type {n}") from None
-
-        if t == ServerMessageType.HELLO:
-            return self._parse_hello(reader)
-        elif t == ServerMessageType.INCOMPATIBLE_VERSION:
-            return self._parse_incompatible_version(reader)
-        elif t == ServerMessageType.ACKNOWLEDGE_AUTHENTICATION:
-            return self._accept_authentication(reader)
-        elif t == ServerMessageType.SEND_MESSAGE:
-            return self._parse_message(reader)
-        elif t == ServerMessageType.LIST_CHANNELS:
-            return self._parse_channel_list(reader)
-        elif t == ServerMessageType.LIST_MESSAGES:
-            return self._parse_message_list(reader)
-
-        raise RuntimeError(f"No handler for {t}")  # pragma: no cover
+        handler = self._MESSAGE_HANDLERS.get(n)
+        if handler is None:
+            raise MalformedDataError(f"Unknown message type {n}")
+
+        if self._is_framed(n):
+            reader.readexactly_view(FRAME_LENGTH_BYTES)  # Validated by caller
+
+        return handler(self, reader)
 
     def _parse_hello(self, reader: Reader) -> ParsedData:
         self._assert_state(ClientState.AWAITING_SERVER_HELLO)
 
-        using_ssl = int.from_bytes(reader.readexactly(1), byteorder="big") > 0
-        event = ClientEventHello(using_ssl)
+        (using_ssl,) = ServerMessageHello.SCHEMA.decode(reader)
+
+        compression = CompressionType.NONE
+        if self.PROTOCOL_VERSION >= COMPRESSED_PROTOCOL_VERSION:
+            (n,) = ServerMessageHello.COMPRESSION_SCHEMA.decode(reader)
+            if n not in (CompressionType.NONE.value, self.compression.value):
+                raise MalformedDataError(f"Server accepted unrequested compression {n}")
+            compression = CompressionType(n)
+
+        if compression != CompressionType.NONE:
+            self._compressor = FrameCompressor(
+                compression,
+                threshold=self.compression_threshold,
+            )
+
+        event = ClientEventHello(using_ssl, compression)
 
         self._state = ClientState.AWAITING_AUTHENTICATION
         return [event], b""
 
     def _parse_incompatible_version(self, reader: Reader) -> ParsedData:
         self._assert_state(ClientState.AWAITING_SERVER_HELLO)
-        version = reader.readexactly(1)[0]
+        (version,) = ServerMessageSendIncompatibleVersion.SCHEMA.decode(reader)
         event = ClientEventIncompatibleVersion(version, self.PROTOCOL_VERSION)
         self._state = ClientState.AWAITING_CLIENT_HELLO
         return [event], b""
@@ -152,7 +426,7 @@ class Client(Protocol):
     def _accept_authentication(self, reader: Reader) -> ParsedData:
         self._assert_state(ClientState.AWAITING_AUTHENTICATION)
 
-        success = reader.readexactly(1)[0] > 0
+        (success,) = ServerMessageAcknowledgeAuthentication.SCHEMA.decode(reader)
         if success:
             self._state = ClientState.READY
 
@@ -165,13 +439,72 @@ class Client(Protocol):
         event = ClientEventMessageReceived(message)
         return [event], b""
 
+    def _parse_messages(self, reader: Reader) -> ParsedData:
+        self._assert_state(ClientState.READY)
+        (count,) = ServerMessagePostMany.SCHEMA.decode(reader)
+        messages = [Message.from_reader(reader) for _ in range(count)]
+        event = ClientEventMessagesReceived(messages)
+        return [event], b""
+
     def _parse_channel_list(self, reader: Reader) -> ParsedData:
         self._assert_state(ClientState.READY)
-        length = int.from_bytes(
-            reader.readexactly(MAX_LIST_CHANNEL_LENGTH_BYTES),
-            byteorder="big",
-        )
-        channel_bytes = reader.readexactly(length)
+        (length,) = ServerMessageListChannels.SCHEMA.decode(reader)
+        channels = self._read_channels(reader, length)
+        self._set_channel_indices(channels)
+        event = ClientEventChannelsListed(channels)
+        return [event], b""
+
+    def _parse_message_list(self, reader: Reader) -> ParsedData:
+        self._assert_state(ClientState.READY)
+        if self._is_compact():
+            messages = self._read_page(reader)
+        else:
+            messages = self._read_messages(reader, MAX_LIST_MESSAGE_LENGTH_BYTES)
+
+        if self._sync_remaining > 0:
+            self._sync_messages.extend(messages)
+            self._sync_remaining -= 1
+            return self._complete_sync(), b""
+        elif self._is_streamed(ServerMessageType.LIST_MESSAGES.value):
+            # Only compressed lists can't be streamed as they arrive
+            events: list[ClientEvent] = [
+                ClientEventMessageStreamed(m) for m in messages
+            ]
+            events.append(ClientEventMessageListCompleted(len(messages)))
+            return events, b""
+
+        event = ClientEventMessagesListed(messages)
+        return [event], b""
+
+    def _parse_throttled(self, reader: Reader) -> ParsedData:
+        self._assert_state(ClientState.READY)
+        channel_name, retry_after = ServerMessageThrottled.SCHEMA.decode(reader)
+        event = ClientEventThrottled(channel_name, retry_after / 1000)
+        return [event], b""
+
+    def _parse_sync(self, reader: Reader) -> ParsedData:
+        self._assert_state(ClientState.READY)
+        (length,) = ServerMessageSync.SCHEMA.decode(reader)
+        channels = self._read_channels(reader, length)
+        self._set_channel_indices(channels)
+        # The messages of each channel follow as separate message lists
+        self._sync_channels = channels
+        self._sync_messages = []
+        self._sync_remaining = len(channels)
+        return self._complete_sync(), b""
+
+    def _complete_sync(self) -> list[ClientEvent]:
+        if self._sync_channels is None or self._sync_remaining > 0:
+            return []
+
+        event = ClientEventSynced(self._sync_channels, self._sync_messages)
+        self._sync_channels = None
+        self._sync_messages = []
+        return [event]
+
+    @staticmethod
+    def _read_channels(reader: Reader, length: int) -> list[Channel]:
+        channel_bytes = reader.readexactly_view(length)
 
         channels: list[Channel] = []
         with byte_reader(channel_bytes) as channel_reader:
@@ -181,16 +514,12 @@ class Client(Protocol):
             except IndexError:
                 pass
 
-        event = ClientEventChannelsListed(channels)
-        return [event], b""
+        return channels
 
-    def _parse_message_list(self, reader: Reader) -> ParsedData:
-        self._assert_state(ClientState.READY)
-        length = int.from_bytes(
-            reader.readexactly(MAX_LIST_MESSAGE_LENGTH_BYTES),
-            byteorder="big",
-        )
-        message_bytes = reader.readexactly(length)
+    @staticmethod
+    def _read_messages(reader: Reader, length_bytes: int) -> list[Message]:
+        length = int.from_bytes(reader.readexactly(length_bytes), byteorder="big")
+        message_bytes = reader.readexactly_view(length)
 
         messages: list[Message] = []
         with byte_reader(message_bytes) as message_reader:
@@ -200,5 +529,94 @@ class Client(Protocol):
             except IndexError:
                 pass
 
-        event = ClientEventMessagesListed(messages)
+        return messages
+
+    @staticmethod
+    def _read_page(reader: Reader) -> list[Message]:
+        length = int.from_bytes(
+            reader.readexactly(MAX_LIST_MESSAGE_LENGTH_BYTES),
+            byteorder="big",
+        )
+        page_bytes = reader.readexactly_view(length)
+
+        with byte_reader(page_bytes) as page_reader:
+            messages = load_page(page_reader)
+            if page_reader.remaining > 0:
+                raise MalformedDataError("Page has more data than its messages")
+
+        return messages
+
+    def _start_message_list(self) -> ParsedData | None:
+        header_size = FRAME_HEADER.size + MAX_LIST_MESSAGE_LENGTH_BYTES
+        header = self._buffer.peek(header_size)
+        if header is None:
+            return None
+
+        self._assert_state(ClientState.READY)
+        _, frame_length = FRAME_HEADER.unpack_from(header)
+        length = int.from_bytes(header[FRAME_HEADER.size :], byteorder="big")
+        if frame_length != MAX_LIST_MESSAGE_LENGTH_BYTES + length:
+            raise MalformedDataError("Message list length does not match its frame")
+
+        with self._buffer.reader(header_size) as reader:
+            reader.readexactly_view(header_size)
+
+        self._list_remaining = length
+        self._list_count = 0
+        self._list_page = None
+        return [], b""
+
+    def _stream_message_list(self) -> ParsedData | None:
+        assert self._list_remaining is not None
+        if self._list_remaining == 0:
+            self._list_remaining = None
+            if self._sync_remaining > 0:
+                self._sync_remaining -= 1
+                return self._complete_sync(), b""
+
+            event = ClientEventMessageListCompleted(self._list_count)
+            return [event], b""
+
+        available = min(len(self._buffer), self._list_remaining)
+        try:
+            with self._buffer.reader(available) as reader:
+                if not self._is_compact():
+                    message = Message.from_reader(reader)
+                elif self._list_page is None:
+                    # Compact lists start with the header of their page
+                    self._list_page = PageReader.from_reader(reader)
+                    message = None
+                else:
+                    message = self._list_page.read_message(reader)
+                size = reader.offset
+        except IndexError:
+            if available == self._list_remaining:
+                raise MalformedDataError(
+                    "Message exceeds the length of its list"
+                ) from None
+            return None
+
+        self._list_remaining -= size
+        if message is None:
+            return [], b""
+
+        if self._sync_remaining > 0:
+            # Messages of a sync response are delivered together
+            self._sync_messages.append(message)
+            return [], b""
+
+        self._list_count += 1
+        event = ClientEventMessageStreamed(message)
         return [event], b""
+
+    _MESSAGE_HANDLERS: dict[int, Callable[["Client", Reader], ParsedData]] = {
+        ServerMessageType.HELLO.value: _parse_hello,
+        ServerMessageType.INCOMPATIBLE_VERSION.value: _parse_incompatible_version,
+        ServerMessageType.ACKNOWLEDGE_AUTHENTICATION.value: _accept_authentication,
+        ServerMessageType.SEND_MESSAGE.value: _parse_message,
+        ServerMessageType.LIST_CHANNELS.value: _parse_channel_list,
+        ServerMessageType.LIST_MESSAGES.value: _parse_message_list,
+        ServerMessageType.SYNC.value: _parse_sync,
+        ServerMessageType.THROTTLED.value: _parse_throttled,
+        ServerMessageType.SEND_MESSAGES.value: _parse_messages,
+    }
@@ -0,0 +1,154 @@
+"""
+Starting with protocol version 4, clients can request compression in HELLO,
+and the server's HELLO says which compression was accepted. Afterwards,
+each side may compress any frame it sends by setting the high bit of its
+message type and replacing its payload with the compressed payload:
+
+    1-byte message type | 0x80 | 4-byte compressed length | compressed payload
+
+Every compressed frame sent over a connection belongs to a single zlib
+stream, with each frame ending on a sync flush. Later frames can therefore
+refer back to earlier ones, which lets short chat messages compress well.
+Frames smaller than the sender's threshold can be sent uncompressed, and
+do not affect the stream.
+"""
+
+import time
+import zlib
+from dataclasses import dataclass
+from enum import Enum
+
+from .errors import MalformedDataError
+from .frame import FRAME_HEADER
+
+COMPRESSED_FLAG = 0x80
+
+
+class CompressionType(Enum):
+    NONE = 0
+    ZLIB = 1
+
+
+@dataclass
+class FrameCompressionStats:
+    """Statistics about the frames compressed and decompressed
+    over one connection.
+    """
+
+    frames_compressed: int = 0
+    """The number of frames sent compressed."""
+    bytes_before_compression: int = 0
+    """The total payload size of sent frames before compression."""
+    bytes_after_compression: int = 0
+    """The total payload size of sent frames after compression."""
+    compress_time: float = 0.0
+    """The CPU time spent compressing frames, in seconds."""
+    frames_decompressed: int = 0
+    """The number of compressed frames received."""
+    bytes_before_decompression: int = 0
+    """The total payload size of received frames before decompression."""
+    bytes_after_decompression: int = 0
+    """The total payload size of received frames after decompression."""
+    decompress_time: float = 0.0
+    """The CPU time spent decompressing frames, in seconds."""
+
+    @property
+    def compression_ratio(self) -> float:
+        """The size of sent payloads before compression divided by
+        their size after compression.
+        """
+        if self.bytes_after_compression == 0:
+            return 1.0
+        return self.bytes_before_compression / self.bytes_after_compression
+
+    @property
+    def decompression_ratio(self) -> float:
+        """The size of received payloads after decompression divided by
+        their size before decompression.
+        """
+        if self.bytes_before_decompression == 0:
+            return 1.0
+        return self.bytes_after_decompression / self.bytes_before_decompression
+
+
+class FrameCompressor:
+    """Compresses and decompresses the frames of one connection.
+
+    Frames with a payload smaller than ``threshold`` bytes are sent
+    uncompressed.
+
+    """
+
+    def __init__(
+        self,
+        type: CompressionType,
+        *,
+        threshold: int = 0,
+        level: int = zlib.Z_DEFAULT_COMPRESSION,
+    ) -> None:
+        if type != CompressionType.ZLIB:
+            raise ValueError(f"Unsupported compression type: {type}")
+        if threshold < 0:
+            raise ValueError(f"threshold must be 0 or greater, not {threshold}")
+
+        self.type = type
+        self.threshold = threshold
+        self.stats = FrameCompressionStats()
+
+        self._compressor = zlib.compressobj(level)
+        self._decompressor = zlib.decompressobj()
+
+    def compress_frame(self, frame: bytes) -> bytes:
+        """Compress a framed message if it meets the threshold."""
+        size = len(frame) - FRAME_HEADER.size
+        if size < self.threshold:
+            return frame
+
+        start = time.thread_time()
+        payload = memoryview(frame)[FRAME_HEADER.size :]
+        data = self._compressor.compress(payload)
+        data += self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        elapsed = time.thread_time() - start
+
+        stats = self.stats
+        stats.frames_compressed += 1
+        stats.bytes_before_compression += size
+        stats.bytes_after_compression += len(data)
+        stats.compress_time += elapsed
+
+        header = FRAME_HEADER.pack(frame[0] | COMPRESSED_FLAG, len(data))
+        return header + data
+
+    def decompress_frame(self, frame: memoryview, *, limit: int | None) -> bytes:
+        """Decompress a compressed frame, returning the original frame.
+
+        :raises MalformedDataError:
+            The frame could not be decompressed, or its original frame
+            would be larger than the given limit.
+
+        """
+        message_type = frame[0] & ~COMPRESSED_FLAG
+        compressed = frame[FRAME_HEADER.size :]
+        max_length = 0
+        if limit is not None:
+            max_length = max(1, limit - FRAME_HEADER.size)
+
+        start = time.thread_time()
+        try:
+            payload = self._decompressor.decompress(compressed, max_length)
+        except zlib.error as e:
+            raise MalformedDataError(f"Could not decompress frame: {e}") from e
+        elapsed = time.thread_time() - start
+
+        if self._decompressor.unconsumed_tail:
+            raise MalformedDataError(
+                f"Decompressed frame exceeds the buffer limit of {limit} bytes"
+            )
+
+        stats = self.stats
+        stats.frames_decompressed += 1
+        stats.bytes_before_decompression += len(compressed)
+        stats.bytes_after_decompression += len(payload)
+        stats.decompress_time += elapsed
+
+        return FRAME_HEADER.pack(message_type, len(payload)) + payload
@@ -1,5 +1,14 @@
+COMPACT_PROTOCOL_VERSION = 5
+COMPRESSED_PROTOCOL_VERSION = 4
+DEFAULT_BUFFER_SIZE = 2**20
+FRAMED_PROTOCOL_VERSION = 3
+FRAME_LENGTH_BYTES = 4
+MAX_BATCH_MESSAGES = 2**16 - 1
 MAX_CHANNEL_NAME_LENGTH = 32
 MAX_LIST_CHANNEL_LENGTH_BYTES = 2
 MAX_LIST_MESSAGE_LENGTH_BYTES = 3
+MAX_LIST_MESSAGE_LIMIT = 2**16 - 1
 MAX_MESSAGE_LENGTH = 1024
 MAX_NICK_LENGTH = 32
+MAX_SYNC_WATERMARKS = 2**16 - 1
+MAX_RETRY_AFTER_MS = 2**32 - 1
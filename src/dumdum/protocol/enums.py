@@ -7,6 +7,10 @@ class ClientMessageType(Enum):
     SEND_MESSAGE = 3
     LIST_CHANNELS = 4
     LIST_MESSAGES = 5
+    JOIN_CHANNEL = 6
+    PART_CHANNEL = 7
+    SYNC = 8
+    SEND_MESSAGES = 9
 
 
 class ServerMessageType(Enum):
@@ -16,3 +20,6 @@ class ServerMessageType(Enum):
     SEND_MESSAGE = 3
     LIST_CHANNELS = 4
     LIST_MESSAGES = 5
+    THROTTLED = 6
+    SYNC = 7
+    SEND_MESSAGES = 8
@@ -0,0 +1,127 @@
+"""
+Starting with protocol version 3, every message except HELLO and
+INCOMPATIBLE_VERSION is framed with the length of its payload:
+
+    1-byte message type | 4-byte payload length | payload
+
+This lets the receiver wait for the entire frame to arrive before
+parsing it, rather than re-parsing a partial message on every read.
+HELLO and INCOMPATIBLE_VERSION remain unframed so that clients and
+servers can negotiate a version before agreeing on framing.
+"""
+
+import contextlib
+import struct
+from typing import Iterator, Sequence
+
+from .buffer import ReceiveBuffer
+from .constants import FRAME_LENGTH_BYTES
+from .errors import BufferOverflowError, MalformedDataError
+from .reader import Reader
+
+FRAME_HEADER = struct.Struct(">BI")
+assert FRAME_HEADER.size == 1 + FRAME_LENGTH_BYTES
+
+
+def dumps_frame(message: bytes) -> bytes:
+    """Insert a length header after the type of an unframed message."""
+    header = FRAME_HEADER.pack(message[0], len(message) - 1)
+    return b"".join((header, memoryview(message)[1:]))
+
+
+def peek_frame_size(buffer: ReceiveBuffer, *, limit: int | None) -> int | None:
+    """Return the total size of the frame at the start of the buffer.
+
+    If the frame has not fully arrived, None is returned.
+
+    :raises BufferOverflowError:
+        The frame is larger than the given limit and can never be received.
+
+    """
+    header = buffer.peek(FRAME_HEADER.size)
+    if header is None:
+        return None
+
+    _, length = FRAME_HEADER.unpack(header)
+    size = FRAME_HEADER.size + length
+    if limit is not None and size > limit:
+        raise BufferOverflowError(limit, len(buffer), size - len(buffer))
+    elif size > len(buffer):
+        return None
+
+    return size
+
+
+@contextlib.contextmanager
+def check_frame(reader: Reader) -> Iterator[None]:
+    """Ensure that a complete frame is read exactly within this context.
+
+    :raises MalformedDataError:
+        The message read was longer or shorter than its frame.
+
+    """
+    try:
+        yield
+    except IndexError as e:
+        raise MalformedDataError("Message exceeds the length of its frame") from e
+
+    if reader.remaining > 0:
+        raise MalformedDataError(f"Frame has {reader.remaining} unread byte(s)")
+
+
+class PreparedMessage:
+    """An unframed message that was encoded once to be sent to many peers.
+
+    The framed encoding is created on first access and then cached,
+    so both encodings can be shared between any number of connections.
+
+    If the message cannot be understood by peers that predate framing,
+    ``legacy_data`` holds an equivalent encoding to send to them instead.
+    If the message has a compact encoding for peers using protocol
+    version 5, ``compact_data`` holds it.
+
+    If the message lists channels, ``channel_names`` holds their names
+    in order so each connection can assign them indices.
+
+    """
+
+    __slots__ = (
+        "data",
+        "legacy_data",
+        "compact_data",
+        "channel_names",
+        "_framed",
+        "_compact_framed",
+    )
+
+    def __init__(
+        self,
+        data: bytes,
+        *,
+        legacy_data: bytes | None = None,
+        compact_data: bytes | None = None,
+        channel_names: Sequence[str] | None = None,
+    ) -> None:
+        self.data = data
+        self.legacy_data = legacy_data
+        self.compact_data = compact_data
+        self.channel_names = channel_names
+        self._framed: bytes | None = None
+        self._compact_framed: bytes | None = None
+
+    @property
+    def framed(self) -> bytes:
+        if self._framed is None:
+            self._framed = dumps_frame(self.data)
+        return self._framed
+
+    @property
+    def compact_framed(self) -> bytes:
+        """The framed compact encoding, or the framed encoding
+        if the message has no compact encoding.
+        """
+        if self.compact_data is None:
+            return self.framed
+        if self._compact_framed is None:
+            self._compact_framed = dumps_frame(self.compact_data)
+        return self._compact_framed
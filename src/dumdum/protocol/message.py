@@ -1,32 +1,50 @@
-from dataclasses import dataclass
-from typing import Self
+from dataclasses import dataclass, field
+from typing import ClassVar, Self
 
-from . import varchar
 from .constants import MAX_CHANNEL_NAME_LENGTH, MAX_MESSAGE_LENGTH, MAX_NICK_LENGTH
 from .reader import Reader
+from .schema import U64, Schema, Varchar
 
 
 @dataclass
 class Message:
+    SCHEMA: ClassVar[Schema] = Schema(
+        None,
+        U64,
+        Varchar(MAX_CHANNEL_NAME_LENGTH),
+        Varchar(MAX_NICK_LENGTH),
+        Varchar(MAX_MESSAGE_LENGTH, raw=True),
+    )
+
     id: int
     channel_name: str
     nick: str
     content: str
+    raw_content: bytes | None = field(
+        default=None, compare=False, repr=False, kw_only=True
+    )
+    """The UTF-8 encoding of the content, if already known.
+
+    When provided, the content is written as-is instead of being
+    encoded again. It must be updated whenever the content changes.
+
+    """
 
     def __bytes__(self) -> bytes:
-        return bytes(
-            [
-                *self.id.to_bytes(8, byteorder="big"),
-                *varchar.dumps(self.channel_name, max_length=MAX_CHANNEL_NAME_LENGTH),
-                *varchar.dumps(self.nick, max_length=MAX_NICK_LENGTH),
-                *varchar.dumps(self.content, max_length=MAX_MESSAGE_LENGTH),
-            ]
-        )
+        content = self.raw_content
+        if content is None:
+            content = self.content.encode()
+
+        return self.SCHEMA.encode(self.id, self.channel_name, self.nick, content)
 
     @classmethod
     def from_reader(cls, reader: Reader) -> Self:
-        id = reader.read_bigint()
-        channel_name = reader.read_varchar(max_length=MAX_CHANNEL_NAME_LENGTH)
-        nick = reader.read_varchar(max_length=MAX_NICK_LENGTH)
-        content = reader.read_varchar(max_length=MAX_MESSAGE_LENGTH)
-        return cls(id=id, channel_name=channel_name, nick=nick, content=content)
+        id, channel_name, nick, raw_content = cls.SCHEMA.decode(reader)
+        # Decoded messages don't keep their raw content, which would
+        # double the memory of every message a client holds on to
+        return cls(
+            id=id,
+            channel_name=channel_name,
+            nick=nick,
+            content=str(raw_content, "utf-8"),
+        )
@@ -0,0 +1,122 @@
+"""
+Starting with protocol version 5, LIST_MESSAGES responses encode their page
+of messages compactly. Every message in a page belongs to the same channel,
+so the channel name and the nicks of the page are only sent once:
+
+    varchar channel name | varint nick count | varchar nicks...
+    varint message count | messages...
+
+Each message then follows as:
+
+    varint ID delta | varint nick index | varchar content
+
+Every varchar here is prefixed with a varint length. Each ID is sent as
+the difference from the previous message's ID, or from zero for the first
+message, so messages sent within the same second only spend a few bytes
+on their IDs. The nick index refers to the nicks listed in the header.
+"""
+
+from typing import Self, Sequence
+
+from .constants import MAX_CHANNEL_NAME_LENGTH, MAX_MESSAGE_LENGTH, MAX_NICK_LENGTH
+from .errors import MalformedDataError
+from .message import Message
+from .reader import Reader
+from .schema import VARINT, Repeated, Schema, Varchar
+
+_HEADER_FIELDS = (
+    Varchar(MAX_CHANNEL_NAME_LENGTH, varint=True),
+    Repeated((Varchar(MAX_NICK_LENGTH, varint=True),), count=VARINT),
+)
+_ENTRY_FIELDS = (VARINT, VARINT, Varchar(MAX_MESSAGE_LENGTH, raw=True, varint=True))
+
+PAGE_SCHEMA = Schema(None, *_HEADER_FIELDS, Repeated(_ENTRY_FIELDS, count=VARINT))
+HEADER_SCHEMA = Schema(None, *_HEADER_FIELDS, VARINT)
+"""The header of a page, ending with the number of messages."""
+ENTRY_SCHEMA = Schema(None, *_ENTRY_FIELDS)
+"""A single message of a page."""
+
+
+def dumps_page(messages: Sequence[Message]) -> bytes:
+    """Encode a page of messages from a single channel.
+
+    :raises ValueError:
+        The messages belong to different channels,
+        or are not in ascending order of ID.
+
+    """
+    channel_name = messages[0].channel_name if len(messages) > 0 else ""
+    nicks: dict[str, int] = {}
+    entries: list[tuple[int, int, bytes]] = []
+    last_id = 0
+
+    for message in messages:
+        if message.channel_name != channel_name:
+            raise ValueError("Cannot encode messages from different channels in a page")
+        elif message.id < last_id:
+            raise ValueError("Messages in a page must be in ascending order of ID")
+
+        nick_index = nicks.setdefault(message.nick, len(nicks))
+        content = message.raw_content
+        if content is None:
+            content = message.content.encode()
+
+        entries.append((message.id - last_id, nick_index, content))
+        last_id = message.id
+
+    return PAGE_SCHEMA.encode(channel_name, [(nick,) for nick in nicks], entries)
+
+
+def load_page(reader: Reader) -> list[Message]:
+    """Read an entire page of messages.
+
+    :raises IndexError: The reader does not have enough data.
+    :raises MalformedDataError: A message refers to an unknown nick.
+
+    """
+    channel_name, nicks, entries = PAGE_SCHEMA.decode(reader)
+    page = PageReader(channel_name, [nick for (nick,) in nicks], len(entries))
+    return [page.make_message(*entry) for entry in entries]
+
+
+class PageReader:
+    """Decodes the messages of a page one at a time."""
+
+    def __init__(self, channel_name: str, nicks: Sequence[str], count: int) -> None:
+        self.channel_name = channel_name
+        self.nicks = nicks
+        self.remaining = count
+        """The number of messages left to read."""
+        self._last_id = 0
+
+    @classmethod
+    def from_reader(cls, reader: Reader) -> Self:
+        """Read the header of a page."""
+        channel_name, nicks, count = HEADER_SCHEMA.decode(reader)
+        return cls(channel_name, [nick for (nick,) in nicks], count)
+
+    def read_message(self, reader: Reader) -> Message:
+        """Read the next message of the page.
+
+        :raises IndexError: The reader does not have enough data.
+        :raises MalformedDataError:
+            Every message has already been read,
+            or the message refers to an unknown nick.
+
+        """
+        if self.remaining < 1:
+            raise MalformedDataError("Page has more data than its messages")
+        return self.make_message(*ENTRY_SCHEMA.decode(reader))
+
+    def make_message(self, delta: int, nick_index: int, raw_content: bytes) -> Message:
+        if nick_index >= len(self.nicks):
+            raise MalformedDataError(f"Unknown nick index {nick_index} in page")
+
+        self._last_id += delta
+        self.remaining -= 1
+        return Message(
+            id=self._last_id,
+            channel_name=self.channel_name,
+            nick=self.nicks[nick_index],
+            content=str(raw_content, "utf-8"),
+        )
@@ -1,34 +1,57 @@
 import contextlib
 from typing import Iterator
 
-from dumdum.protocol import varchar
+from dumdum.protocol import varchar, varint
+
+from .errors import InvalidLengthError
 
 
 class Reader:
-    def __init__(self, buffer: bytearray | bytes) -> None:
-        self.buffer = buffer
+    """Reads through a bytes-like object like a stream.
+
+    The buffer is accessed through a memoryview so reading does not
+    copy any data until :meth:`read()` or :meth:`readexactly()` is called.
+    Call :meth:`close()` to release the view once reading is done.
+
+    """
+
+    def __init__(self, buffer: bytes | bytearray | memoryview) -> None:
+        self.buffer = memoryview(buffer)
         self._index = 0
         self._closed = False
 
+    @property
+    def offset(self) -> int:
+        """The number of bytes read so far."""
+        return self._index
+
+    @property
+    def remaining(self) -> int:
+        """The number of bytes left to read."""
+        return len(self.buffer) - self._index
+
     def read(self, n: int = -1) -> bytes:
+        return bytes(self.read_view(n))
+
+    def read_view(self, n: int = -1) -> memoryview:
         if self._closed:
             raise RuntimeError("Cannot read from closed reader")
 
-        if n < 0:
-            n = len(self.buffer)
-        else:
-            n = min(n, len(self.buffer))
+        remaining = self.remaining
+        if n < 0 or n > remaining:
+            n = remaining
 
         start, self._index = self._index, self._index + n
-
-        data = self.buffer[start : self._index]
-        return bytes(data) if isinstance(data, bytearray) else data
+        return self.buffer[start : self._index]
 
     def readexactly(self, n: int) -> bytes:
+        return bytes(self.readexactly_view(n))
+
+    def readexactly_view(self, n: int) -> memoryview:
         if n < 0:
             raise ValueError(f"n must be 0 or greater, not {n}")
 
-        data = self.read(n)
+        data = self.read_view(n)
         if len(data) != n:
             raise IndexError(
                 f"Insufficent data to read (expected {n}, got {len(data)})"
@@ -37,14 +60,31 @@ class Reader:
         return data
 
     def read_bigint(self) -> int:
-        data = self.readexactly(8)
+        data = self.readexactly_view(8)
         return int.from_bytes(data, byteorder="big")
 
+    def read_varint(self) -> int:
+        if self._closed:
+            raise RuntimeError("Cannot read from closed reader")
+
+        n, self._index = varint.load_from(self.buffer, self._index)
+        return n
+
     def read_varchar(self, *, max_length: int) -> str:
-        return varchar.load(self, max_length=max_length)
+        return str(self.read_varchar_view(max_length=max_length), "utf-8")
+
+    def read_varchar_view(self, *, max_length: int) -> memoryview:
+        """Read the encoded bytes of a varchar without decoding them."""
+        byte_count = varchar.get_length_byte_count(max_length)
+        length = int.from_bytes(self.readexactly_view(byte_count), byteorder="big")
+        if length > max_length:
+            raise InvalidLengthError(length, max_length)
+
+        return self.readexactly_view(length)
 
     def close(self) -> None:
         self._closed = True
+        self.buffer.release()
 
 
 @contextlib.contextmanager
@@ -60,7 +100,7 @@ def bytearray_reader(buffer: bytearray) -> Iterator[Reader]:
 
 
 @contextlib.contextmanager
-def byte_reader(buffer: bytes) -> Iterator[Reader]:
+def byte_reader(buffer: bytes | memoryview) -> Iterator[Reader]:
     reader = Reader(buffer)
 
     try:
@@ -0,0 +1,304 @@
+"""Declarative schemas for encoding and decoding protocol messages.
+
+A schema lists the fields of a message in the order they are sent:
+
+    POST = Schema(
+        ClientMessageType.SEND_MESSAGE.value,
+        Varchar(MAX_CHANNEL_NAME_LENGTH),
+        Varchar(MAX_MESSAGE_LENGTH),
+    )
+    data = POST.encode("general", "Hello world!")
+    channel_name, content = POST.decode(reader)
+
+Each schema generates its own encoder and decoder when created. Every run
+of fixed-size fields, including the length prefixes of varchars, is packed
+and unpacked with a single :class:`struct.Struct`, so encoding a message
+costs one ``pack()`` call per run instead of one call per field.
+
+Varints and varchars with varint lengths end a run, since their size
+depends on their value. Small varints are encoded and decoded inline.
+
+The message type is written by :meth:`Schema.encode()`, but is expected
+to have already been read before :meth:`Schema.decode()` is called.
+
+Messages carrying a list of channels or messages prefixed with its length
+in bytes, such as LIST_CHANNELS and SYNC, only describe that prefix with a
+schema. The entries are encoded separately so the server can reuse their
+encoding, and are decoded one at a time until the list is exhausted.
+
+LIST_MESSAGES is not described by a schema at all. Its length prefix is
+3 bytes, which no :mod:`struct` format can pack, and clients decode its
+entries incrementally as the frame arrives rather than all at once.
+Compact lists are encoded as a page by :mod:`dumdum.protocol.page`.
+
+"""
+
+import struct
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from . import varint
+from .errors import InvalidLengthError
+from .reader import Reader
+from .varchar import get_length_byte_count
+
+_LENGTH_FORMATS = {1: "B", 2: "H", 4: "I"}
+
+
+class Field:
+    """The base class for fields in a schema."""
+
+
+@dataclass(frozen=True)
+class Integer(Field):
+    """An unsigned big-endian integer described by a :mod:`struct` format."""
+
+    format: str
+
+
+U8 = Integer("B")
+U16 = Integer("H")
+U32 = Integer("I")
+U64 = Integer("Q")
+BOOL = Integer("?")
+
+
+@dataclass(frozen=True)
+class Varint(Field):
+    """An unsigned integer of up to 64 bits encoded as a varint.
+
+    See :mod:`dumdum.protocol.varint` for the encoding.
+
+    """
+
+
+VARINT = Varint()
+
+
+@dataclass(frozen=True)
+class Varchar(Field):
+    """A UTF-8 string prefixed with its length.
+
+    If ``raw`` is true, the field is encoded from and decoded to bytes
+    that are already UTF-8 encoded. If ``varint`` is true, the length
+    is prefixed as a varint instead of a fixed-size integer.
+
+    """
+
+    max_length: int
+    raw: bool = False
+    varint: bool = False
+
+    @property
+    def length_format(self) -> str:
+        byte_count = get_length_byte_count(self.max_length)
+        try:
+            return _LENGTH_FORMATS[byte_count]
+        except KeyError:
+            raise ValueError(
+                f"Unsupported varchar length of {byte_count} bytes"
+            ) from None
+
+
+@dataclass(frozen=True)
+class Repeated(Field):
+    """A sequence of tuples prefixed with the number of tuples."""
+
+    fields: tuple[Field, ...]
+    count: Integer | Varint = U16
+
+
+class Schema:
+    """The fields of a message, compiled into an encoder and decoder."""
+
+    encode: Callable[..., bytes]
+    """Encode the message type followed by the given field values."""
+    decode: Callable[[Reader], tuple[Any, ...]]
+    """Read every field after the message type, returning their values.
+
+    :raises IndexError: The reader does not have enough data.
+    :raises InvalidLengthError: A varchar exceeds its maximum length.
+
+    """
+
+    def __init__(self, message_type: int | None, *fields: Field) -> None:
+        self.message_type = message_type
+        self.fields = fields
+        self.encode = _compile_encoder(message_type, fields)
+        self.decode = _compile_decoder(fields)
+
+    def __repr__(self) -> str:
+        fields = ", ".join(repr(f) for f in self.fields)
+        return f"Schema({self.message_type!r}, {fields})"
+
+
+class _Compiler:
+    def __init__(self) -> None:
+        self.namespace: dict[str, Any] = {"InvalidLengthError": InvalidLengthError}
+        self.lines: list[str] = []
+        self.format = ""
+        self.args: list[str] = []
+
+    def add_global(self, name: str, value: Any) -> str:
+        name = f"_{name}{len(self.namespace)}"
+        self.namespace[name] = value
+        return name
+
+    def build(self, name: str, params: list[str]) -> Callable:
+        body = "\n".join(f"    {line}" for line in self.lines)
+        source = f"def {name}({', '.join(params)}):\n{body or '    pass'}\n"
+        exec(source, self.namespace)
+        function = self.namespace[name]
+        function.__source__ = source
+        return function
+
+
+def _compile_encoder(message_type: int | None, fields: tuple[Field, ...]) -> Callable:
+    c = _Compiler()
+    params = [f"v{i}" for i in range(len(fields))]
+    parts: list[str] = []
+
+    def flush() -> None:
+        if c.format:
+            s = c.add_global("s", struct.Struct(">" + c.format))
+            parts.append(f"{s}.pack({', '.join(c.args)})")
+            c.format, c.args = "", []
+
+    def dump_varint(value: str) -> None:
+        flush()
+        dumps = c.add_global("dumps", varint.dumps)
+        parts.append(f"{dumps}({value})")
+
+    if message_type is not None:
+        c.format += "B"
+        c.args.append(str(message_type))
+
+    for i, field in enumerate(fields):
+        v = f"v{i}"
+        if isinstance(field, Integer):
+            c.format += field.format
+            c.args.append(v)
+        elif isinstance(field, Varint):
+            dump_varint(v)
+        elif isinstance(field, Varchar):
+            b = f"b{i}"
+            c.lines.append(f"{b} = {v}" if field.raw else f"{b} = {v}.encode()")
+            c.lines.append(f"if len({b}) > {field.max_length}:")
+            c.lines.append(
+                f"    raise InvalidLengthError(len({b}), {field.max_length})"
+            )
+            if field.varint:
+                dump_varint(f"len({b})")
+            else:
+                c.format += field.length_format
+                c.args.append(f"len({b})")
+                flush()
+            parts.append(b)
+        elif isinstance(field, Repeated):
+            encoder = c.add_global("e", _compile_encoder(None, field.fields))
+            c.lines.append(f"{v} = list({v})")
+            if isinstance(field.count, Varint):
+                dump_varint(f"len({v})")
+            else:
+                c.format += field.count.format
+                c.args.append(f"len({v})")
+                flush()
+            parts.append(f'b"".join([{encoder}(*t) for t in {v}])')
+        else:
+            raise TypeError(f"Unsupported field {field!r}")
+
+    flush()
+    if len(parts) == 1:
+        c.lines.append(f"return {parts[0]}")
+    else:
+        c.lines.append(f"return b\"\".join(({', '.join(parts)},))")
+    return c.build("encode", params)
+
+
+def _compile_decoder(fields: tuple[Field, ...]) -> Callable:
+    # Fields are unpacked directly from the reader's buffer, and the reader
+    # is only advanced once the entire message has been decoded
+    c = _Compiler()
+    c.namespace["_decode_from"] = _compile_decoder_body(fields)
+    c.lines = [
+        "buf = reader.buffer",
+        "values, i = _decode_from(buf, reader.offset, len(buf))",
+        "reader.readexactly_view(i - reader.offset)",
+        "return values",
+    ]
+    return c.build("decode", ["reader"])
+
+
+def _compile_decoder_body(fields: tuple[Field, ...]) -> Callable:
+    c = _Compiler()
+    values: list[str] = []
+
+    def check(size: str) -> None:
+        c.lines.append(f"if i + {size} > end:")
+        c.lines.append("    raise IndexError('Insufficient data to decode message')")
+
+    def flush() -> None:
+        if c.format:
+            s = c.add_global("s", struct.Struct(">" + c.format))
+            size = struct.calcsize(">" + c.format)
+            targets = "".join(f"{a}, " for a in c.args)
+            check(str(size))
+            c.lines.append(f"{targets}= {s}.unpack_from(buf, i)")
+            c.lines.append(f"i += {size}")
+            c.format, c.args = "", []
+
+    def load_varint(target: str) -> None:
+        # Values below 128 are a single byte, so skip the function call
+        flush()
+        load = c.add_global("load", varint.load_from)
+        check("1")
+        c.lines.append(f"{target} = buf[i]")
+        c.lines.append(f"if {target} < 0x80:")
+        c.lines.append("    i += 1")
+        c.lines.append("else:")
+        c.lines.append(f"    {target}, i = {load}(buf, i)")
+
+    for i, field in enumerate(fields):
+        v = f"v{i}"
+        values.append(v)
+        if isinstance(field, Integer):
+            c.format += field.format
+            c.args.append(v)
+        elif isinstance(field, Varint):
+            load_varint(v)
+        elif isinstance(field, Varchar):
+            n = f"n{i}"
+            if field.varint:
+                load_varint(n)
+            else:
+                c.format += field.length_format
+                c.args.append(n)
+                flush()
+            c.lines.append(f"if {n} > {field.max_length}:")
+            c.lines.append(f"    raise InvalidLengthError({n}, {field.max_length})")
+            check(n)
+            view = f"buf[i : i + {n}]"
+            if field.raw:
+                c.lines.append(f"{v} = bytes({view})")
+            else:
+                c.lines.append(f'{v} = str({view}, "utf-8")')
+            c.lines.append(f"i += {n}")
+        elif isinstance(field, Repeated):
+            decoder = c.add_global("d", _compile_decoder_body(field.fields))
+            n = f"n{i}"
+            if isinstance(field.count, Varint):
+                load_varint(n)
+            else:
+                c.format += field.count.format
+                c.args.append(n)
+                flush()
+            c.lines.append(f"{v} = []")
+            c.lines.append(f"for _ in range({n}):")
+            c.lines.append(f"    item, i = {decoder}(buf, i, end)")
+            c.lines.append(f"    {v}.append(item)")
+        else:
+            raise TypeError(f"Unsupported field {field!r}")
+
+    flush()
+    c.lines.append(f"return ({''.join(f'{v}, ' for v in values)}), i")
+    return c.build("decode_from", ["buf", "i", "end"])
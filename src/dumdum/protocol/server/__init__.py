@@ -3,9 +3,13 @@ from .events import (
     ServerEventAuthentication,
     ServerEventHello,
     ServerEventIncompatibleVersion,
+    ServerEventJoinChannel,
     ServerEventListChannels,
     ServerEventListMessages,
     ServerEventMessageReceived,
+    ServerEventMessagesReceived,
+    ServerEventPartChannel,
+    ServerEventSync,
 )
 from .messages import (
     ServerMessageAcknowledgeAuthentication,
@@ -13,6 +17,9 @@ from .messages import (
     ServerMessageListChannels,
     ServerMessageListMessages,
     ServerMessagePost,
+    ServerMessagePostMany,
     ServerMessageSendIncompatibleVersion,
+    ServerMessageSync,
+    ServerMessageThrottled,
 )
 from .protocol import Server, ServerState
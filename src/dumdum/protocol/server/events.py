@@ -1,4 +1,7 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Mapping, Sequence
+
+from dumdum.protocol.compression import CompressionType
 
 
 @dataclass
@@ -10,6 +13,9 @@ class ServerEvent:
 class ServerEventHello(ServerEvent):
     """The client says hello."""
 
+    compression: CompressionType = CompressionType.NONE
+    """The compression requested by the client."""
+
 
 @dataclass
 class ServerEventIncompatibleVersion(ServerEvent):
@@ -31,6 +37,22 @@ class ServerEventMessageReceived(ServerEvent):
 
     channel_name: str
     content: str
+    raw_content: bytes | None = field(
+        default=None, compare=False, repr=False, kw_only=True
+    )
+    """The content as it was received, already validated as UTF-8."""
+
+
+@dataclass
+class ServerEventMessagesReceived(ServerEvent):
+    """The client sent several messages to the same channel at once."""
+
+    channel_name: str
+    contents: Sequence[str]
+    raw_contents: Sequence[bytes] | None = field(
+        default=None, compare=False, repr=False, kw_only=True
+    )
+    """The contents as they were received, already validated as UTF-8."""
 
 
 @dataclass
@@ -45,3 +67,31 @@ class ServerEventListMessages(ServerEvent):
     channel_name: str
     before: int | None
     after: int | None
+    limit: int | None = None
+    """The maximum number of messages requested, or None if unspecified."""
+
+
+@dataclass
+class ServerEventJoinChannel(ServerEvent):
+    """The client subscribed to a channel."""
+
+    channel_name: str
+
+
+@dataclass
+class ServerEventPartChannel(ServerEvent):
+    """The client unsubscribed from a channel."""
+
+    channel_name: str
+
+
+@dataclass
+class ServerEventSync(ServerEvent):
+    """The client requested the channel list and the latest messages
+    of every channel."""
+
+    watermarks: Mapping[str, int]
+    """The ID of the latest message the client has seen in each channel.
+    Only messages newer than these are requested."""
+    join: bool
+    """Whether the client should be subscribed to every channel."""
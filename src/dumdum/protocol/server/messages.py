@@ -1,95 +1,174 @@
+import math
 from dataclasses import dataclass
-from typing import Sequence
+from typing import ClassVar, Sequence
 
 from dumdum.protocol.channel import Channel
+from dumdum.protocol.compression import CompressionType
 from dumdum.protocol.constants import (
-    MAX_LIST_CHANNEL_LENGTH_BYTES,
+    MAX_BATCH_MESSAGES,
+    MAX_CHANNEL_NAME_LENGTH,
     MAX_LIST_MESSAGE_LENGTH_BYTES,
+    MAX_RETRY_AFTER_MS,
 )
 from dumdum.protocol.enums import ServerMessageType
 from dumdum.protocol.message import Message
+from dumdum.protocol.page import dumps_page
+from dumdum.protocol.schema import BOOL, U8, U16, U32, Schema, Varchar
 
 
 @dataclass
 class ServerMessageHello:
+    SCHEMA: ClassVar[Schema] = Schema(ServerMessageType.HELLO.value, BOOL)
+    COMPRESSION_SCHEMA: ClassVar[Schema] = Schema(None, U8)
+    """The accepted compression, which follows whether SSL is used
+    starting with protocol version 4."""
+
     using_ssl: bool
+    compression: CompressionType | None = None
 
     def __bytes__(self) -> bytes:
-        return bytes([ServerMessageType.HELLO.value, self.using_ssl])
+        data = self.SCHEMA.encode(self.using_ssl)
+        if self.compression is not None:
+            data += self.COMPRESSION_SCHEMA.encode(self.compression.value)
+        return data
 
 
 @dataclass
 class ServerMessageSendIncompatibleVersion:
+    SCHEMA: ClassVar[Schema] = Schema(ServerMessageType.INCOMPATIBLE_VERSION.value, U8)
+
     required: int
 
     def __bytes__(self) -> bytes:
-        return bytes(
-            [
-                ServerMessageType.INCOMPATIBLE_VERSION.value,
-                self.required,
-            ]
-        )
+        return self.SCHEMA.encode(self.required)
 
 
 @dataclass
 class ServerMessageAcknowledgeAuthentication:
+    SCHEMA: ClassVar[Schema] = Schema(
+        ServerMessageType.ACKNOWLEDGE_AUTHENTICATION.value,
+        BOOL,
+    )
+
     success: bool
 
     def __bytes__(self) -> bytes:
-        return bytes(
-            [
-                ServerMessageType.ACKNOWLEDGE_AUTHENTICATION.value,
-                self.success,
-            ]
-        )
+        return self.SCHEMA.encode(self.success)
 
 
 @dataclass
 class ServerMessagePost:
+    SCHEMA: ClassVar[Schema] = Schema(
+        ServerMessageType.SEND_MESSAGE.value,
+        *Message.SCHEMA.fields,
+    )
+
     message: Message
 
     def __bytes__(self) -> bytes:
-        return bytes(
-            [
-                ServerMessageType.SEND_MESSAGE.value,
-                *bytes(self.message),
-            ]
-        )
+        m = self.message
+        content = m.raw_content
+        if content is None:
+            content = m.content.encode()
+
+        return self.SCHEMA.encode(m.id, m.channel_name, m.nick, content)
+
+
+@dataclass
+class ServerMessagePostMany:
+    SCHEMA: ClassVar[Schema] = Schema(ServerMessageType.SEND_MESSAGES.value, U16)
+    """The number of messages, which follow one after another."""
+
+    messages: Sequence[Message]
+
+    def __bytes__(self) -> bytes:
+        return self.join([bytes(m) for m in self.messages])
+
+    @classmethod
+    def join(cls, messages: Sequence[bytes]) -> bytes:
+        """Encode the message from messages that are already encoded."""
+        if len(messages) > MAX_BATCH_MESSAGES:
+            raise ValueError(
+                f"Cannot send more than {MAX_BATCH_MESSAGES} messages at once, "
+                f"got {len(messages)}"
+            )
+
+        return b"".join((cls.SCHEMA.encode(len(messages)), *messages))
 
 
 @dataclass
 class ServerMessageListChannels:
+    SCHEMA: ClassVar[Schema] = Schema(ServerMessageType.LIST_CHANNELS.value, U16)
+    """The total length of the channels in bytes,
+    which follow one after another."""
+
     channels: Sequence[Channel]
 
     def __bytes__(self) -> bytes:
         channel_bytes = b"".join(bytes(c) for c in self.channels)
-        channel_length = len(channel_bytes).to_bytes(
-            MAX_LIST_CHANNEL_LENGTH_BYTES,
-            byteorder="big",
-        )
-        return bytes(
-            [
-                ServerMessageType.LIST_CHANNELS.value,
-                *channel_length,
-                *channel_bytes,
-            ]
-        )
+        return self.SCHEMA.encode(len(channel_bytes)) + channel_bytes
 
 
 @dataclass
 class ServerMessageListMessages:
+    """A list of messages prefixed with its length in bytes.
+
+    Unlike other messages, this is not described by a schema.
+    See :mod:`dumdum.protocol.schema` for why.
+
+    """
+
     messages: Sequence[Message]
+    compact: bool = False
+    """Whether to encode the messages as a page, starting with
+    protocol version 5. See :mod:`dumdum.protocol.page`."""
 
     def __bytes__(self) -> bytes:
-        message_bytes = b"".join(bytes(c) for c in self.messages)
+        if self.compact:
+            message_bytes = dumps_page(self.messages)
+        else:
+            message_bytes = b"".join(bytes(c) for c in self.messages)
         message_length = len(message_bytes).to_bytes(
             MAX_LIST_MESSAGE_LENGTH_BYTES,
             byteorder="big",
         )
-        return bytes(
-            [
-                ServerMessageType.LIST_MESSAGES.value,
-                *message_length,
-                *message_bytes,
-            ]
+        return b"".join(
+            (
+                bytes([ServerMessageType.LIST_MESSAGES.value]),
+                message_length,
+                message_bytes,
+            )
         )
+
+
+@dataclass
+class ServerMessageThrottled:
+    SCHEMA: ClassVar[Schema] = Schema(
+        ServerMessageType.THROTTLED.value,
+        Varchar(MAX_CHANNEL_NAME_LENGTH),
+        U32,
+    )
+
+    channel_name: str
+    retry_after: float
+
+    def __bytes__(self) -> bytes:
+        retry_after = min(math.ceil(self.retry_after * 1000), MAX_RETRY_AFTER_MS)
+        return self.SCHEMA.encode(self.channel_name, retry_after)
+
+
+@dataclass
+class ServerMessageSync:
+    """The channel list of a sync response, followed by one
+    :class:`ServerMessageListMessages` for each channel in the same order.
+    """
+
+    SCHEMA: ClassVar[Schema] = Schema(ServerMessageType.SYNC.value, U16)
+    """The total length of the channels in bytes,
+    which follow one after another."""
+
+    channels: Sequence[Channel]
+
+    def __bytes__(self) -> bytes:
+        channel_bytes = b"".join(bytes(c) for c in self.channels)
+        return self.SCHEMA.encode(len(channel_bytes)) + channel_bytes
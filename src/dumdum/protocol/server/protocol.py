@@ -1,27 +1,56 @@
 from enum import Enum, auto
-from typing import Sequence
+from typing import Callable, Sequence
 
-from dumdum.protocol.buffer import extend_limited_buffer
+from dumdum.protocol.buffer import ReceiveBuffer
 from dumdum.protocol.channel import Channel
+from dumdum.protocol.compression import (
+    COMPRESSED_FLAG,
+    CompressionType,
+    FrameCompressionStats,
+    FrameCompressor,
+)
 from dumdum.protocol.constants import (
-    MAX_CHANNEL_NAME_LENGTH,
-    MAX_MESSAGE_LENGTH,
-    MAX_NICK_LENGTH,
+    COMPACT_PROTOCOL_VERSION,
+    COMPRESSED_PROTOCOL_VERSION,
+    DEFAULT_BUFFER_SIZE,
+    FRAME_LENGTH_BYTES,
+    FRAMED_PROTOCOL_VERSION,
 )
-from dumdum.protocol.enums import ClientMessageType
+from dumdum.protocol.enums import ClientMessageType, ServerMessageType
 from dumdum.protocol.errors import InvalidStateError, MalformedDataError
+from dumdum.protocol.frame import (
+    FRAME_HEADER,
+    PreparedMessage,
+    check_frame,
+    dumps_frame,
+    peek_frame_size,
+)
 from dumdum.protocol.interfaces import Protocol
+from dumdum.protocol.client.messages import (
+    ClientMessageAuthenticate,
+    ClientMessageHello,
+    ClientMessageJoinChannel,
+    ClientMessageListMessages,
+    ClientMessagePartChannel,
+    ClientMessagePost,
+    ClientMessagePostMany,
+    ClientMessageSync,
+)
 from dumdum.protocol.message import Message
-from dumdum.protocol.reader import Reader, bytearray_reader
+from dumdum.protocol.reader import Reader, byte_reader
 
 from .events import (
     ServerEvent,
     ServerEventAuthentication,
     ServerEventHello,
     ServerEventIncompatibleVersion,
+    ServerEventJoinChannel,
     ServerEventListChannels,
     ServerEventListMessages,
     ServerEventMessageReceived,
+    ServerEventMessagesReceived,
+    ServerEventPartChannel,
+    ServerEventSync,
 )
 from .messages import (
     ServerMessageAcknowledgeAuthentication,
@@ -29,11 +58,21 @@ from .messages import (
     ServerMessageListChannels,
     ServerMessageListMessages,
     ServerMessagePost,
+    ServerMessagePostMany,
     ServerMessageSendIncompatibleVersion,
+    ServerMessageSync,
+    ServerMessageThrottled,
 )
 
 ParsedData = tuple[list[ServerEvent], bytes]
 
+_FRAMED_MESSAGE_TYPES = frozenset(t.value for t in ClientMessageType) - {
+    ClientMessageType.HELLO.value,
+}
+_UNFRAMED_RESPONSE_TYPES = frozenset(
+    (ServerMessageType.HELLO.value, ServerMessageType.INCOMPATIBLE_VERSION.value)
+)
+
 
 class ServerState(Enum):
     AWAITING_CLIENT_HELLO = auto()
@@ -43,24 +82,86 @@ class ServerState(Enum):
 
 
 class Server(Protocol):
-    """The server for a single client."""
-
-    PROTOCOL_VERSION = 2
-
-    def __init__(self, *, buffer_size: int | None = 2**20) -> None:
+    """The server for a single client.
+
+    If ``compression`` is true, the compression requested by version 4
+    clients is accepted, and frames sent with a payload of at least
+    ``compression_threshold`` bytes are compressed.
+
+    If ``defer_compression`` is true, frames are returned uncompressed
+    and must be passed to :meth:`compress_frames()` in the order they are
+    written to the client. This lets frames be discarded before they
+    are written without corrupting the compressed stream.
+
+    Version 5 clients can refer to channels by their index in the last
+    channel list sent to them, either with LIST_CHANNELS or SYNC.
+
+    """
+
+    PROTOCOL_VERSION = 5
+    SUPPORTED_PROTOCOL_VERSIONS = (2, 3, 4, 5)
+
+    _version: int | None
+    _requested_compression: CompressionType
+    _compressor: FrameCompressor | None
+    _channel_names: Sequence[str]
+
+    def __init__(
+        self,
+        *,
+        buffer_size: int | None = DEFAULT_BUFFER_SIZE,
+        compression: bool = True,
+        compression_threshold: int = 256,
+        defer_compression: bool = False,
+    ) -> None:
         self.buffer_size = buffer_size
+        self.compression = compression
+        self.compression_threshold = compression_threshold
+        self.defer_compression = defer_compression
 
-        self._buffer = bytearray()
+        self._buffer = ReceiveBuffer()
         self._state = ServerState.AWAITING_CLIENT_HELLO
+        self._version = None
+        self._requested_compression = CompressionType.NONE
+        self._compressor = None
+        self._channel_names = ()
+
+    @property
+    def version(self) -> int | None:
+        """The protocol version used by the client, or None if unknown."""
+        return self._version
+
+    @property
+    def compression_stats(self) -> FrameCompressionStats | None:
+        """Statistics about compressed frames, or None if the connection
+        is not compressed.
+        """
+        if self._compressor is None:
+            return None
+        return self._compressor.stats
 
     def receive_bytes(self, data: bytes) -> ParsedData:
-        extend_limited_buffer(self._buffer, data, limit=self.buffer_size)
+        self._buffer.extend(data, limit=self.buffer_size)
         return self._maybe_parse_buffer()
 
     def hello(self, *, using_ssl: bool) -> bytes:
         self._assert_state(ServerState.AWAITING_SERVER_HELLO)
         self._state = ServerState.AWAITING_AUTHENTICATION
-        return bytes(ServerMessageHello(using_ssl))
+
+        version = self._version or self.PROTOCOL_VERSION
+        if version < COMPRESSED_PROTOCOL_VERSION:
+            return bytes(ServerMessageHello(using_ssl))
+
+        compression = CompressionType.NONE
+        if self.compression:
+            compression = self._requested_compression
+        if compression != CompressionType.NONE:
+            self._compressor = FrameCompressor(
+                compression,
+                threshold=self.compression_threshold,
+            )
+
+        return bytes(ServerMessageHello(using_ssl, compression))
 
     def authenticate(self, *, success: bool) -> bytes:
         self._assert_state(ServerState.AWAITING_AUTHENTICATION)
@@ -68,30 +169,237 @@ class Server(Protocol):
         if success:
             self._state = ServerState.READY
 
-        return bytes(ServerMessageAcknowledgeAuthentication(success))
+        return self._frame(bytes(ServerMessageAcknowledgeAuthentication(success)))
 
     def send_message(self, message: Message) -> bytes:
+        return self.send_prepared_message(self.prepare_message(message))
+
+    @staticmethod
+    def prepare_message(message: Message) -> PreparedMessage:
+        """Encode a message once so it can be sent to many clients.
+
+        See :meth:`send_prepared_message()` for sending the result.
+
+        """
+        return PreparedMessage(bytes(ServerMessagePost(message)))
+
+    def send_messages(self, messages: Sequence[Message]) -> bytes:
+        """Send several messages in a single frame.
+
+        Version 2 clients receive each message as a separate SEND_MESSAGE.
+
+        """
+        return self.send_prepared_message(self.prepare_messages(messages))
+
+    @staticmethod
+    def prepare_messages(messages: Sequence[Message]) -> PreparedMessage:
+        """Encode several messages once so they can be sent to many clients.
+
+        See :meth:`send_prepared_message()` for sending the result.
+
+        """
+        encoded = [bytes(m) for m in messages]
+        legacy_type = bytes([ServerMessageType.SEND_MESSAGE.value])
+        return PreparedMessage(
+            ServerMessagePostMany.join(encoded),
+            legacy_data=b"".join(legacy_type + e for e in encoded),
+        )
+
+    @staticmethod
+    def prepare_channel_list(channels: Sequence[Channel]) -> PreparedMessage:
+        """Encode a list of channels once so it can be sent to many clients.
+
+        See :meth:`send_prepared_message()` for sending the result.
+
+        """
+        return PreparedMessage(
+            bytes(ServerMessageListChannels(channels)),
+            channel_names=tuple(c.name for c in channels),
+        )
+
+    @staticmethod
+    def prepare_message_list(messages: Sequence[Message]) -> PreparedMessage:
+        """Encode a list of messages once so it can be sent to many clients.
+
+        The messages must belong to the same channel and be in ascending
+        order of ID. See :meth:`send_prepared_message()` for sending the result.
+
+        """
+        return PreparedMessage(
+            bytes(ServerMessageListMessages(messages)),
+            compact_data=bytes(ServerMessageListMessages(messages, compact=True)),
+        )
+
+    def send_prepared_message(self, prepared: PreparedMessage) -> bytes:
+        """Return the encoding of a message from :meth:`prepare_message()`,
+        :meth:`prepare_messages()`, :meth:`prepare_channel_list()`,
+        or :meth:`prepare_message_list()`.
+
+        The returned bytes are shared with every other server
+        the prepared message is sent through.
+
+        """
         self._assert_state(ServerState.READY)
-        return bytes(ServerMessagePost(message))
+        if prepared.channel_names is not None:
+            self._channel_names = prepared.channel_names
+
+        version = self._version or self.PROTOCOL_VERSION
+        if version < FRAMED_PROTOCOL_VERSION:
+            if prepared.legacy_data is not None:
+                return prepared.legacy_data
+            return prepared.data
+
+        if version < COMPACT_PROTOCOL_VERSION:
+            framed = prepared.framed
+        else:
+            framed = prepared.compact_framed
+
+        if self._compressor is not None and not self.defer_compression:
+            return self._compressor.compress_frame(framed)
+        return framed
+
+    def compress_frames(self, data: bytes) -> bytes:
+        """Compress the frames returned by any other method
+        when compression is deferred.
+
+        The data must be the entire result of a single call, and each
+        result must be compressed in the order it is written. Results
+        that are not framed or compressed are returned unchanged.
+
+        """
+        if self._compressor is None or len(data) == 0:
+            return data
+        elif data[0] in _UNFRAMED_RESPONSE_TYPES:
+            return data
+
+        frames: list[bytes] = []
+        offset = 0
+        while offset < len(data):
+            _, length = FRAME_HEADER.unpack_from(data, offset)
+            end = offset + FRAME_HEADER.size + length
+            frames.append(self._compressor.compress_frame(data[offset:end]))
+            offset = end
+        return b"".join(frames)
 
     def list_channels(self, channels: Sequence[Channel]) -> bytes:
-        return bytes(ServerMessageListChannels(channels))
+        self._channel_names = tuple(c.name for c in channels)
+        return self._frame(bytes(ServerMessageListChannels(channels)))
 
     def list_messages(self, messages: Sequence[Message]) -> bytes:
-        return bytes(ServerMessageListMessages(messages))
+        """Respond to a message list request.
+
+        The messages must belong to the same channel and be in ascending
+        order of ID.
+
+        """
+        message = ServerMessageListMessages(messages, compact=self._is_compact())
+        return self._frame(bytes(message))
+
+    def sync(
+        self,
+        channels: Sequence[Channel],
+        pages: Sequence[PreparedMessage],
+    ) -> bytes:
+        """Respond to a sync request with the channel list, followed by
+        the latest messages of each channel as separate message lists.
+
+        :param pages:
+            The messages of each channel in the same order as the channels,
+            from :meth:`prepare_message_list()`.
+        :raises ValueError: The number of pages does not match the channels.
+
+        """
+        self._assert_state(ServerState.READY)
+        if len(pages) != len(channels):
+            raise ValueError(
+                f"Expected a page for each of {len(channels)} channels, "
+                f"got {len(pages)}"
+            )
+
+        self._channel_names = tuple(c.name for c in channels)
+        header = self._frame(bytes(ServerMessageSync(channels)))
+        return b"".join((header, *(self.send_prepared_message(p) for p in pages)))
+
+    def throttle(self, channel_name: str, *, retry_after: float) -> bytes:
+        """Tell the client that its message to a channel was rejected
+        for exceeding a rate limit.
+
+        Version 2 clients cannot receive this message, so their rejected
+        messages are dropped silently and empty bytes are returned.
+
+        :param retry_after: The number of seconds to wait before retrying.
+
+        """
+        self._assert_state(ServerState.READY)
+        version = self._version or self.PROTOCOL_VERSION
+        if version < FRAMED_PROTOCOL_VERSION:
+            return b""
+
+        message = ServerMessageThrottled(channel_name, retry_after)
+        return self._frame(bytes(message))
 
     def _assert_state(self, *states: ServerState) -> None:
         if self._state not in states:
             raise InvalidStateError(self._state, states)
 
+    def _is_framed(self, message_type: int) -> bool:
+        if self._version is None or self._version < FRAMED_PROTOCOL_VERSION:
+            return False
+        return message_type in _FRAMED_MESSAGE_TYPES
+
+    def _is_compact(self) -> bool:
+        version = self._version or self.PROTOCOL_VERSION
+        return version >= COMPACT_PROTOCOL_VERSION
+
+    def _get_channel_name(self, channel_ref: int, channel_name: str) -> str:
+        # Channels are referred to by their index plus one, or by name if zero
+        if channel_ref == 0:
+            return channel_name
+        elif channel_ref > len(self._channel_names):
+            raise MalformedDataError(f"Unknown channel index {channel_ref - 1}")
+        return self._channel_names[channel_ref - 1]
+
+    def _is_compressed(self, message_type: int) -> bool:
+        return self._compressor is not None and message_type & COMPRESSED_FLAG > 0
+
+    def _decompress_frame(self, size: int) -> bytes:
+        assert self._compressor is not None
+        with self._buffer.reader(size) as reader:
+            frame = reader.readexactly_view(size)
+            return self._compressor.decompress_frame(frame, limit=self.buffer_size)
+
+    def _frame(self, data: bytes) -> bytes:
+        version = self._version or self.PROTOCOL_VERSION
+        if version < FRAMED_PROTOCOL_VERSION:
+            return data
+        elif self._compressor is not None and not self.defer_compression:
+            return self._compressor.compress_frame(dumps_frame(data))
+        return dumps_frame(data)
+
     def _maybe_parse_buffer(self) -> ParsedData:
         full_events: list[ServerEvent] = []
         full_outgoing = bytearray()
 
         try:
-            while True:
-                with bytearray_reader(self._buffer) as reader:
-                    events, outgoing = self._read_message(reader)
+            while len(self._buffer) > 0:
+                if self._is_compressed(self._buffer.peek_byte()):
+                    size = peek_frame_size(self._buffer, limit=self.buffer_size)
+                    if size is None:
+                        break  # Wait for the rest of the frame
+
+                    frame = self._decompress_frame(size)
+                    with byte_reader(frame) as reader, check_frame(reader):
+                        events, outgoing = self._read_message(reader)
+                elif self._is_framed(self._buffer.peek_byte()):
+                    size = peek_frame_size(self._buffer, limit=self.buffer_size)
+                    if size is None:
+                        break  # Wait for the rest of the frame
+
+                    with self._buffer.reader(size) as reader, check_frame(reader):
+                        events, outgoing = self._read_message(reader)
+                else:
+                    with self._buffer.reader() as reader:
+                        events, outgoing = self._read_message(reader)
 
                 full_events.extend(events)
                 full_outgoing.extend(outgoing)
@@ -105,50 +413,82 @@ class Server(Protocol):
 
     def _read_message(self, reader: Reader) -> ParsedData:
         n = reader.readexactly(1)[0]
-        try:
-            t = ClientMessageType(n)
-        except ValueError:
-            raise MalformedDataError(f"Unknown message type {n}") from None
-
-        if t == ClientMessageType.HELLO:
-            return self._parse_hello(reader)
-        elif t == ClientMessageType.AUTHENTICATE:
-            return self._authenticate(reader)
-        elif t == ClientMessageType.SEND_MESSAGE:
-            return self._send_message(reader)
-        elif t == ClientMessageType.LIST_CHANNELS:
-            return self._list_channels(reader)
-        elif t == ClientMessageType.LIST_MESSAGES:
-            return self._list_messages(reader)
-
-        raise RuntimeError(f"No handler for {t}")  # pragma: no cover
+        handler = self._MESSAGE_HANDLERS.get(n)
+        if handler is None:
+            raise MalformedDataError(f"Unknown message type {n}")
+
+        if self._is_framed(n):
+            reader.readexactly_view(FRAME_LENGTH_BYTES)  # Validated by caller
+
+        return handler(self, reader)
 
     def _parse_hello(self, reader: Reader) -> ParsedData:
         self._assert_state(ServerState.AWAITING_CLIENT_HELLO)
 
-        version = reader.readexactly(1)[0]
-        if version != self.PROTOCOL_VERSION:
+        (version,) = ClientMessageHello.SCHEMA.decode(reader)
+        if version not in self.SUPPORTED_PROTOCOL_VERSIONS:
             event = ServerEventIncompatibleVersion(version)
             response = ServerMessageSendIncompatibleVersion(self.PROTOCOL_VERSION)
             return [event], bytes(response)
 
-        event = ServerEventHello()
+        compression = CompressionType.NONE
+        if version >= COMPRESSED_PROTOCOL_VERSION:
+            (n,) = ClientMessageHello.COMPRESSION_SCHEMA.decode(reader)
+            try:
+                compression = CompressionType(n)
+            except ValueError:
+                pass  # Unknown compression types are declined
+
+        event = ServerEventHello(compression)
         self._state = ServerState.AWAITING_SERVER_HELLO
+        self._version = version
+        self._requested_compression = compression
         return [event], b""
 
     def _authenticate(self, reader: Reader) -> ParsedData:
         self._assert_state(ServerState.AWAITING_AUTHENTICATION)
-        nick = reader.read_varchar(max_length=MAX_NICK_LENGTH)
+        (nick,) = ClientMessageAuthenticate.SCHEMA.decode(reader)
         event = ServerEventAuthentication(nick=nick)
         return [event], b""
 
     def _send_message(self, reader: Reader) -> ParsedData:
         self._assert_state(ServerState.READY)
-        channel_name = reader.read_varchar(max_length=MAX_CHANNEL_NAME_LENGTH)
-        content = reader.read_varchar(max_length=MAX_MESSAGE_LENGTH)
+        if self._is_compact():
+            channel_ref, channel_name, raw_content = (
+                ClientMessagePost.COMPACT_SCHEMA.decode(reader)
+            )
+            channel_name = self._get_channel_name(channel_ref, channel_name)
+        else:
+            channel_name, raw_content = ClientMessagePost.SCHEMA.decode(reader)
+        content = str(raw_content, "utf-8")
+
+        event = ServerEventMessageReceived(
+            channel_name,
+            content,
+            raw_content=raw_content,
+        )
+        return [event], b""
 
-        event = ServerEventMessageReceived(channel_name, content)
-        # TODO: broadcast message to all users
+    def _send_messages(self, reader: Reader) -> ParsedData:
+        self._assert_state(ServerState.READY)
+        if self._is_compact():
+            channel_ref, channel_name, items = (
+                ClientMessagePostMany.COMPACT_SCHEMA.decode(reader)
+            )
+            channel_name = self._get_channel_name(channel_ref, channel_name)
+        else:
+            channel_name, items = ClientMessagePostMany.SCHEMA.decode(reader)
+        if len(items) == 0:
+            raise MalformedDataError("SEND_MESSAGES must contain at least one message")
+
+        raw_contents = [raw_content for (raw_content,) in items]
+        contents = [str(raw_content, "utf-8") for raw_content in raw_contents]
+
+        event = ServerEventMessagesReceived(
+            channel_name,
+            contents,
+            raw_contents=raw_contents,
+        )
         return [event], b""
 
     def _list_channels(self, reader: Reader) -> ParsedData:
@@ -158,8 +498,59 @@ class Server(Protocol):
 
     def _list_messages(self, reader: Reader) -> ParsedData:
         self._assert_state(ServerState.READY)
-        channel_name = reader.read_varchar(max_length=MAX_CHANNEL_NAME_LENGTH)
-        before = reader.read_bigint() or None
-        after = reader.read_bigint() or None
-        event = ServerEventListMessages(channel_name, before, after)
+        if self._is_compact():
+            channel_ref, channel_name, before, after, limit = (
+                ClientMessageListMessages.COMPACT_SCHEMA.decode(reader)
+            )
+            channel_name = self._get_channel_name(channel_ref, channel_name)
+        else:
+            channel_name, before, after = ClientMessageListMessages.SCHEMA.decode(
+                reader
+            )
+
+            # The limit is an optional trailing field, so it can only be
+            # detected when the message is framed
+            limit = None
+            if (
+                self._is_framed(ClientMessageType.LIST_MESSAGES.value)
+                and reader.remaining
+            ):
+                (limit,) = ClientMessageListMessages.LIMIT_SCHEMA.decode(reader)
+
+        event = ServerEventListMessages(
+            channel_name,
+            before or None,
+            after or None,
+            limit or None,
+        )
+        return [event], b""
+
+    def _join_channel(self, reader: Reader) -> ParsedData:
+        self._assert_state(ServerState.READY)
+        (channel_name,) = ClientMessageJoinChannel.SCHEMA.decode(reader)
+        event = ServerEventJoinChannel(channel_name)
         return [event], b""
+
+    def _part_channel(self, reader: Reader) -> ParsedData:
+        self._assert_state(ServerState.READY)
+        (channel_name,) = ClientMessagePartChannel.SCHEMA.decode(reader)
+        event = ServerEventPartChannel(channel_name)
+        return [event], b""
+
+    def _sync(self, reader: Reader) -> ParsedData:
+        self._assert_state(ServerState.READY)
+        join, watermarks = ClientMessageSync.SCHEMA.decode(reader)
+        event = ServerEventSync(dict(watermarks), join)
+        return [event], b""
+
+    _MESSAGE_HANDLERS: dict[int, Callable[["Server", Reader], ParsedData]] = {
+        ClientMessageType.HELLO.value: _parse_hello,
+        ClientMessageType.AUTHENTICATE.value: _authenticate,
+        ClientMessageType.SEND_MESSAGE.value: _send_message,
+        ClientMessageType.LIST_CHANNELS.value: _list_channels,
+        ClientMessageType.LIST_MESSAGES.value: _list_messages,
+        ClientMessageType.JOIN_CHANNEL.value: _join_channel,
+        ClientMessageType.PART_CHANNEL.value: _part_channel,
+        ClientMessageType.SYNC.value: _sync,
+        ClientMessageType.SEND_MESSAGES.value: _send_messages,
+    }
@@ -4,13 +4,18 @@
 
 64-63: Always 0
 63-19: Unix timestamp in milliseconds
-19-12: Process ID
-12-00: Incrementing per-process ID
+19-12: Worker ID, or the process ID for create_snowflake()
+12-00: Incrementing per-worker sequence
 """
 
 import datetime
 import os
+import threading
 import time
+from typing import Callable
+
+MAX_WORKER_ID = 127
+MAX_SEQUENCE = 4095
 
 _incrementing_id = 0
 
@@ -43,3 +48,87 @@ def create_snowflake(
     increment = increment % 4096
 
     return (t << 19) + (pid << 12) + increment
+
+
+def _get_time_ms() -> int:
+    return time.time_ns() // 1000000
+
+
+class SnowflakeGenerator:
+    """Generates strictly increasing snowflakes for a single worker.
+
+    Unlike :func:`create_snowflake`, each generator has an explicit worker ID
+    and is safe to share between threads. If more than 4096 snowflakes are
+    requested within one millisecond, or the system clock rolls back,
+    the generator borrows timestamps from the future instead of waiting
+    for the clock to catch up, so snowflakes are never repeated or
+    reordered.
+
+    """
+
+    def __init__(
+        self,
+        worker_id: int,
+        *,
+        clock: Callable[[], int] = _get_time_ms,
+    ) -> None:
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f"Worker ID must be between 0 and {MAX_WORKER_ID}")
+
+        self.worker_id = worker_id
+        self._clock = clock
+        self._last_time = -1
+        self._sequence = MAX_SEQUENCE + 1
+        self._lock = threading.Lock()
+
+    def generate(self) -> int:
+        """Return the next snowflake."""
+        with self._lock:
+            if self._sequence > MAX_SEQUENCE:
+                self._advance()
+            else:
+                self._refresh()
+
+            snowflake = self._make_snowflake(self._sequence)
+            self._sequence += 1
+            return snowflake
+
+    def generate_many(self, count: int) -> list[int]:
+        """Return the next `count` snowflakes in ascending order.
+
+        The lock is only acquired once, and snowflakes sharing a timestamp
+        are allocated together.
+
+        """
+        snowflakes: list[int] = []
+        with self._lock:
+            self._refresh()
+            while len(snowflakes) < count:
+                if self._sequence > MAX_SEQUENCE:
+                    self._advance()
+
+                n = min(count - len(snowflakes), MAX_SEQUENCE + 1 - self._sequence)
+                first = self._make_snowflake(self._sequence)
+                snowflakes.extend(range(first, first + n))
+                self._sequence += n
+
+        return snowflakes
+
+    def _refresh(self) -> None:
+        # Restart the sequence once the clock moves past the last timestamp
+        now = self._clock()
+        if now > self._last_time:
+            self._last_time = now
+            self._sequence = 0
+
+    def _advance(self) -> None:
+        # Never reuse a timestamp whose sequence has been exhausted,
+        # even if the clock has rolled back since
+        self._last_time = max(self._clock(), self._last_time + 1)
+        self._sequence = 0
+
+    def _make_snowflake(self, sequence: int) -> int:
+        t = self._last_time
+        if t.bit_length() > 44:
+            raise OverflowError(f"Timestamp {t} out of bounds (are we in 2527?)")
+        return (t << 19) + (self.worker_id << 12) + sequence
@@ -9,8 +9,13 @@ class _Readable(Protocol):
     def read(self, n: int, /) -> bytes: ...
 
 
+def get_length_byte_count(max_length: int) -> int:
+    """Return the number of bytes needed to store the length of a varchar."""
+    return math.ceil(max_length.bit_length() / 8)
+
+
 def load(f: _Readable, *, max_length: int) -> str:
-    byte_count = math.ceil(max_length.bit_length() / 8)
+    byte_count = get_length_byte_count(max_length)
     length_bytes = f.read(byte_count)
     if len(length_bytes) != byte_count:
         raise IndexError(f"Insufficient bytes for {max_length = }")
@@ -31,13 +36,16 @@ def loads(message: bytes, *, max_length: int) -> str:
 
 
 def dumps(message: str, *, max_length: int) -> bytes:
-    message_bytes = message.encode()
+    return dumps_bytes(message.encode(), max_length=max_length)
+
 
-    length = len(message_bytes)
+def dumps_bytes(message: bytes, *, max_length: int) -> bytes:
+    """Prefix an already encoded string with its length."""
+    length = len(message)
     if length > max_length:
         raise InvalidLengthError(length, max_length)
 
-    byte_count = math.ceil(max_length.bit_length() / 8)
-    length_bytes = len(message_bytes).to_bytes(byte_count, byteorder="big")
+    byte_count = get_length_byte_count(max_length)
+    length_bytes = length.to_bytes(byte_count, byteorder="big")
 
-    return length_bytes + message_bytes
+    return length_bytes + message
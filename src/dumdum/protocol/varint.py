@@ -0,0 +1,53 @@
+"""
+Unsigned integers encoded in base 128, least significant group first.
+Every byte except the last has its high bit set:
+
+    300 = 0b10_0101100 -> 0b1_0101100 0b0_0000010 -> b"\\xac\\x02"
+
+Values below 128 take one byte, and a 64-bit value takes at most ten.
+"""
+
+from .errors import MalformedDataError
+
+MAX_VARINT_BYTES = 10
+MAX_VARINT = 2**64 - 1
+
+_SMALL = [bytes((n,)) for n in range(0x80)]
+
+
+def dumps(n: int) -> bytes:
+    if 0 <= n < 0x80:
+        return _SMALL[n]
+    elif not 0 <= n <= MAX_VARINT:
+        raise ValueError(f"Varint must be between 0 and {MAX_VARINT}, not {n}")
+
+    data = bytearray()
+    while n >= 0x80:
+        data.append(n & 0x7F | 0x80)
+        n >>= 7
+    data.append(n)
+    return bytes(data)
+
+
+def load_from(buffer: bytes | bytearray | memoryview, offset: int) -> tuple[int, int]:
+    """Read a varint starting at the given offset of a buffer,
+    returning its value and the offset after it.
+
+    :raises IndexError: The buffer ends before the varint does.
+    :raises MalformedDataError: The varint does not fit in 64 bits.
+
+    """
+    n = shift = 0
+    end = min(len(buffer), offset + MAX_VARINT_BYTES)
+    for i in range(offset, end):
+        b = buffer[i]
+        n |= (b & 0x7F) << shift
+        if b < 0x80:
+            if n > MAX_VARINT:
+                raise MalformedDataError("Varint exceeds 64 bits")
+            return n, i + 1
+        shift += 7
+
+    if end - offset == MAX_VARINT_BYTES:
+        raise MalformedDataError(f"Varint exceeds {MAX_VARINT_BYTES} bytes")
+    raise IndexError("Insufficient bytes for varint")
@@ -1,3 +1,6 @@
 from .connection import Connection
 from .manager import Manager, host_server
+from .outbound import OutboundQueue, SlowConsumerPolicy
+from .ratelimit import RateLimit, RateLimiter
 from .state import ServerState
+from .store import MessageStore, ServerStore
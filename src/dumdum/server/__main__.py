@@ -11,13 +11,25 @@ This can be specified as either:
 
 import argparse
 import asyncio
+import contextlib
+import logging
+import os
 import ssl
+from typing import Any
 
-from dumdum.protocol import Channel
+from dumdum.protocol import Channel, SnowflakeGenerator
+from dumdum.protocol.snowflake import MAX_WORKER_ID
 from dumdum.logging import configure_logging
 
 from .manager import host_server
-from .state import MessageCache, ServerState
+from .outbound import SlowConsumerPolicy
+from .ratelimit import RateLimit
+from .snapshot import Snapshot
+from .state import CacheEvictionPolicy, MessageCache, ServerState
+from .store import MessageStore
+from .wal import DeletedMessage, FsyncPolicy, MessageLog
+
+log = logging.getLogger(__name__)
 
 
 def main():
@@ -57,33 +69,358 @@ def main():
         help="The SSL certificate and private key to use",
         type=parse_cert,
     )
+    parser.add_argument(
+        "--worker-id",
+        default=0,
+        help=(
+            "The worker ID embedded in message IDs, which must be unique among "
+            f"servers sharing a database (0-{MAX_WORKER_ID}, default: %(default)d)"
+        ),
+        type=int,
+    )
     parser.add_argument(
         "--max-messages",
-        default=1000,  # TODO: maybe support removing message cap?
-        help="The maximum number of messages cached per channel (default: %(default)d)",
+        default=None,
+        help=(
+            "The maximum number of messages cached per channel "
+            "(default: 1000, or unlimited with --max-cache-bytes)"
+        ),
+        type=int,
+    )
+    parser.add_argument(
+        "--max-cache-bytes",
+        default=None,
+        help="The maximum encoded size of all cached messages in bytes",
+        type=int,
+    )
+    parser.add_argument(
+        "--cache-eviction-policy",
+        choices=[policy.value for policy in CacheEvictionPolicy],
+        default=CacheEvictionPolicy.OLDEST_FIRST.value,
+        help=(
+            "Which messages to evict when the cache exceeds --max-cache-bytes "
+            "(default: %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        "--columnar-cache",
+        action="store_true",
+        help=(
+            "Store cached messages column by column, using less memory "
+            "but taking longer to list messages"
+        ),
+    )
+    parser.add_argument(
+        "--cache-block-size",
+        default=None,
+        help=(
+            "Compress older cached messages in blocks of this many messages, "
+            "or keep every message uncompressed when not supplied"
+        ),
+        type=int,
+    )
+    parser.add_argument(
+        "--cache-hot-messages",
+        default=1000,
+        help=(
+            "The number of recent messages per channel to keep uncompressed "
+            "with --cache-block-size (default: %(default)d)"
+        ),
+        type=int,
+    )
+    parser.add_argument(
+        "--database",
+        default=None,
+        help=(
+            "The path of an SQLite database to persist messages in. "
+            "Messages no longer cached are read from the database."
+        ),
+    )
+    parser.add_argument(
+        "--snapshot",
+        default=None,
+        help=(
+            "The path of a snapshot to restore cached messages from on startup "
+            "and to save them to on shutdown"
+        ),
+    )
+    parser.add_argument(
+        "--wal",
+        default=None,
+        help=(
+            "The directory of a write-ahead log to record messages in. "
+            "Logged messages are recovered into the cache on startup."
+        ),
+    )
+    parser.add_argument(
+        "--wal-fsync",
+        choices=[policy.value for policy in FsyncPolicy],
+        default=FsyncPolicy.INTERVAL.value,
+        help="How often the write-ahead log is synced to disk (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--wal-fsync-interval",
+        default=100,
+        help=(
+            "The number of milliseconds between syncs with the interval policy "
+            "(default: %(default)d)"
+        ),
+        type=int,
+    )
+    parser.add_argument(
+        "--wal-segment-size",
+        default=2**26,
+        help=(
+            "The number of bytes after which a new log segment is started "
+            "(default: %(default)d)"
+        ),
+        type=int,
+    )
+    parser.add_argument(
+        "--max-page-size",
+        default=500,
+        help=(
+            "The maximum number of messages a client can request at once "
+            "(default: %(default)d)"
+        ),
+        type=int,
+    )
+    parser.add_argument(
+        "--outbound-high-watermark",
+        default=2**20,
+        help=(
+            "The number of bytes that can be queued for a client before "
+            "the slow consumer policy applies (default: %(default)d)"
+        ),
+        type=int,
+    )
+    parser.add_argument(
+        "--outbound-low-watermark",
+        default=2**18,
+        help=(
+            "The number of queued bytes a slow client must drain to "
+            "before resuming normal delivery (default: %(default)d)"
+        ),
         type=int,
     )
+    parser.add_argument(
+        "--slow-consumer-policy",
+        choices=[policy.value for policy in SlowConsumerPolicy],
+        default=SlowConsumerPolicy.DISCONNECT.value,
+        help=(
+            "What to do when a client's outbound queue exceeds the high watermark "
+            "(default: %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        "--rate-limit-messages",
+        default=None,
+        help="The number of messages each client can send per second",
+        type=float,
+    )
+    parser.add_argument(
+        "--rate-limit-bytes",
+        default=None,
+        help="The number of content bytes each client can send per second",
+        type=float,
+    )
+    parser.add_argument(
+        "--channel-rate-limit-messages",
+        default=None,
+        help="The number of messages that can be sent to each channel per second",
+        type=float,
+    )
+    parser.add_argument(
+        "--channel-rate-limit-bytes",
+        default=None,
+        help="The number of content bytes that can be sent to each channel per second",
+        type=float,
+    )
+    parser.add_argument(
+        "--no-compression",
+        action="store_true",
+        help="Decline compression requested by clients",
+    )
+    parser.add_argument(
+        "--compression-threshold",
+        default=256,
+        help=(
+            "The minimum payload size in bytes for frames to be compressed "
+            "when clients request compression (default: %(default)d)"
+        ),
+        type=int,
+    )
+    parser.add_argument(
+        "--rate-limit-burst",
+        default=RateLimit.burst,
+        help=(
+            "The number of seconds of unused rate limit that can be saved up "
+            "for bursts of messages (default: %(default)g)"
+        ),
+        type=float,
+    )
 
     args = parser.parse_args()
     verbose: int = args.verbose
     channels: list[Channel] = args.channels or get_default_channels()
     host: str | None = args.host
     port: int = args.port
-    max_messages: int = args.max_messages
+    max_messages: int | None = args.max_messages
+    max_cache_bytes: int | None = args.max_cache_bytes
+    cache_eviction_policy = CacheEvictionPolicy(args.cache_eviction_policy)
+    columnar_cache: bool = args.columnar_cache
+    cache_block_size: int | None = args.cache_block_size
+    cache_hot_messages: int = args.cache_hot_messages
+    database: str | None = args.database
+    snapshot: str | None = args.snapshot
+    wal: str | None = args.wal
+    wal_fsync = FsyncPolicy(args.wal_fsync)
+    wal_fsync_interval: int = args.wal_fsync_interval
+    wal_segment_size: int = args.wal_segment_size
     ssl_context: ssl.SSLContext | None = args.cert
+    worker_id: int = args.worker_id
+    max_page_size: int = args.max_page_size
+    outbound_high_watermark: int = args.outbound_high_watermark
+    outbound_low_watermark: int = args.outbound_low_watermark
+    slow_consumer_policy = SlowConsumerPolicy(args.slow_consumer_policy)
+    rate_limit_messages: float | None = args.rate_limit_messages
+    rate_limit_bytes: float | None = args.rate_limit_bytes
+    channel_rate_limit_messages: float | None = args.channel_rate_limit_messages
+    channel_rate_limit_bytes: float | None = args.channel_rate_limit_bytes
+    rate_limit_burst: float = args.rate_limit_burst
+    compression: bool = not args.no_compression
+    compression_threshold: int = args.compression_threshold
+
+    if max_page_size < 1:
+        parser.error("--max-page-size must be at least 1")
+
+    if outbound_low_watermark > outbound_high_watermark:
+        parser.error("--outbound-low-watermark cannot exceed --outbound-high-watermark")
+
+    if compression_threshold < 0:
+        parser.error("--compression-threshold must be 0 or greater")
+
+    if not 0 <= worker_id <= MAX_WORKER_ID:
+        parser.error(f"--worker-id must be between 0 and {MAX_WORKER_ID}")
+
+    if max_messages is None and max_cache_bytes is None:
+        max_messages = 1000
+
+    try:
+        connection_rate_limit = RateLimit(
+            messages=rate_limit_messages,
+            bytes=rate_limit_bytes,
+            burst=rate_limit_burst,
+        )
+        channel_rate_limit = RateLimit(
+            messages=channel_rate_limit_messages,
+            bytes=channel_rate_limit_bytes,
+            burst=rate_limit_burst,
+        )
+    except ValueError as e:
+        parser.error(str(e))
 
     configure_logging("server", verbose)
 
-    state = ServerState(message_cache=MessageCache(max_messages=max_messages))
+    message_cache = MessageCache(
+        max_messages=max_messages,
+        max_bytes=max_cache_bytes,
+        eviction_policy=cache_eviction_policy,
+        columnar=columnar_cache,
+        block_size=cache_block_size,
+        hot_messages=cache_hot_messages,
+    )
+    state = ServerState(message_cache=message_cache)
+    message_log_options = {
+        "fsync_policy": wal_fsync,
+        "fsync_interval": wal_fsync_interval / 1000,
+        "segment_size": wal_segment_size,
+        "max_messages": max_messages,
+        "max_bytes": max_cache_bytes,
+    }
     for channel in channels:
         state.add_channel(channel)
 
     try:
-        asyncio.run(host_server(state, host, port, ssl=ssl_context))
+        asyncio.run(
+            serve(
+                state,
+                host,
+                port,
+                database=database,
+                snapshot=snapshot,
+                wal=wal,
+                message_log_options=message_log_options,
+                ssl=ssl_context,
+                max_page_size=max_page_size,
+                outbound_high_watermark=outbound_high_watermark,
+                outbound_low_watermark=outbound_low_watermark,
+                slow_consumer_policy=slow_consumer_policy,
+                snowflake_generator=SnowflakeGenerator(worker_id),
+                connection_rate_limit=connection_rate_limit,
+                channel_rate_limit=channel_rate_limit,
+                compression=compression,
+                compression_threshold=compression_threshold,
+            )
+        )
     except KeyboardInterrupt:
         pass
 
 
+async def serve(
+    state: ServerState,
+    host: str | None,
+    port: int,
+    *,
+    database: str | None,
+    snapshot: str | None,
+    wal: str | None,
+    message_log_options: dict[str, Any],
+    ssl: ssl.SSLContext | None,
+    **kwargs: Any,
+) -> None:
+    async with contextlib.AsyncExitStack() as stack:
+        if snapshot is not None:
+            if os.path.exists(snapshot):
+                load_snapshot(state, snapshot)
+            stack.callback(state.message_cache.close)
+            stack.callback(state.message_cache.write_snapshot, snapshot)
+
+        if wal is not None:
+            message_log = stack.enter_context(
+                MessageLog.open(wal, **message_log_options)
+            )
+            recover_messages(message_log, state)
+            kwargs["message_log"] = message_log
+
+        if database is not None:
+            message_store = await stack.enter_async_context(MessageStore.open(database))
+            kwargs["message_store"] = message_store
+
+        await host_server(state, host, port, ssl=ssl, **kwargs)
+
+
+def load_snapshot(state: ServerState, path: str) -> None:
+    try:
+        snapshot = Snapshot.open(path)
+    except (OSError, ValueError):
+        log.warning(
+            "Failed to open snapshot %r, starting with an empty cache",
+            path,
+            exc_info=True,
+        )
+    else:
+        state.message_cache.load_snapshot(snapshot)
+
+
+def recover_messages(message_log: MessageLog, state: ServerState) -> None:
+    for record in message_log.recover():
+        if isinstance(record, DeletedMessage):
+            state.remove_message(record.channel_name, record.id)
+        else:
+            state.add_message(record)
+
+
 def parse_channel(s: str) -> Channel:
     return Channel(name=s)
 
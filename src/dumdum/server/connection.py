@@ -1,16 +1,25 @@
 from __future__ import annotations
 
 import asyncio
+import contextlib
+import logging
+from ssl import SSLContext
 from typing import TYPE_CHECKING
 
 from dumdum.protocol import Server, ServerEvent
 
+from .outbound import OutboundQueue, SlowConsumerPolicy
+from .ratelimit import RateLimiter
+
 if TYPE_CHECKING:
     from .manager import Manager
 
+log = logging.getLogger(__name__)
+
 
 class Connection:
     nick: str | None
+    rate_limiter: RateLimiter | None
 
     def __init__(
         self,
@@ -23,19 +32,110 @@ class Connection:
         self.reader = reader
         self.writer = writer
         self.server = server
+        self.outbound = OutboundQueue(
+            high_watermark=manager.outbound_high_watermark,
+            low_watermark=manager.outbound_low_watermark,
+        )
+        self._set_write_buffer_limits()
 
         self.nick = None
+        self.rate_limiter = None
+        if manager.connection_rate_limit is not None:
+            self.rate_limiter = RateLimiter(manager.connection_rate_limit)
+
+    @property
+    def addr(self) -> str:
+        return self.writer.get_extra_info("peername")
 
     async def communicate(self) -> None:
+        write_task = asyncio.create_task(self._write_loop())
+        try:
+            await self._read_loop()
+        finally:
+            self.outbound.close()
+            write_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await write_task
+
+    def send(self, data: bytes, *, droppable: bool = False) -> None:
+        """Queue data to be written to the client.
+
+        Broadcasts should be marked as droppable so they can be discarded
+        under the :attr:`SlowConsumerPolicy.DROP_OLDEST` policy. Only
+        broadcasts are subject to the slow consumer policy, as replies
+        already pause reading from the client until they are written.
+
+        """
+        self.outbound.put(data, droppable=droppable)
+        pending = self.outbound.size + self.outbound.buffered
+        if not droppable or pending <= self.outbound.high_watermark:
+            return
+
+        policy = self.manager.slow_consumer_policy
+        if policy == SlowConsumerPolicy.DISCONNECT:
+            log.warning(
+                "Disconnecting %s after exceeding outbound queue limit (%d bytes)",
+                self.addr,
+                pending,
+            )
+            self.abort()
+        elif policy == SlowConsumerPolicy.DROP_OLDEST:
+            dropped = self.outbound.drop_oldest()
+            log.debug("Dropped %d broadcasts for %s", dropped, self.addr)
+
+    async def flush(self) -> None:
+        """Write all queued data to the client and wait for it to drain."""
+        self._write_pending()
+        await self._drain()
+
+    async def start_tls(self, ssl: SSLContext) -> None:
+        """Write all queued data, then upgrade the connection to TLS."""
+        await self.flush()
+        await self.writer.start_tls(ssl)
+        self._set_write_buffer_limits()
+
+    def abort(self) -> None:
+        """Close the connection without flushing any queued data."""
+        self.outbound.close()
+        self.writer.transport.abort()
+
+    async def _read_loop(self) -> None:
         while True:
             data = await self.reader.read(1024)
             if len(data) == 0:
                 break
 
             events, outgoing = self.server.receive_bytes(data)
-            self.writer.write(outgoing)
+            self.send(outgoing)
             await self._handle_events(events)
-            await self._drain()  # exert backpressure
+
+            try:
+                await self._wait_writable()  # exert backpressure
+            except TimeoutError:
+                log.warning("Disconnecting %s for not draining in time", self.addr)
+                self.abort()
+                break
+
+    async def _write_loop(self) -> None:
+        try:
+            while not self.outbound.closed:
+                await self.outbound.wait_readable()
+                self._write_pending()
+                await self._drain()
+        except TimeoutError:
+            log.warning("Disconnecting %s for not draining in time", self.addr)
+            self.abort()
+        except Exception:
+            log.exception("Error occurred while writing to %s", self.addr)
+            self.abort()
+
+    def _write_pending(self) -> None:
+        # Compress only what survived the queue, so that dropped broadcasts
+        # never become part of the compressed stream
+        chunks = [self.server.compress_frames(c) for c in self.outbound.pop_all()]
+        if len(chunks) > 0:
+            self.writer.writelines(chunks)
+            self._update_buffered()
 
     async def _handle_events(self, events: list[ServerEvent]) -> None:
         await self.manager._handle_events(self, events)
@@ -43,3 +143,19 @@ class Connection:
     async def _drain(self) -> None:
         timeout = self.manager.drain_timeout
         await asyncio.wait_for(self.writer.drain(), timeout=timeout)
+        self._update_buffered()
+
+    def _set_write_buffer_limits(self) -> None:
+        # Make drain() wait until the transport's buffer could let
+        # the outbound queue fall to its low watermark
+        high = self.manager.outbound_low_watermark
+        self.writer.transport.set_write_buffer_limits(high=high)
+
+    def _update_buffered(self) -> None:
+        transport = self.writer.transport
+        if not transport.is_closing():
+            self.outbound.set_buffered(transport.get_write_buffer_size())
+
+    async def _wait_writable(self) -> None:
+        timeout = self.manager.drain_timeout
+        await asyncio.wait_for(self.outbound.wait_writable(), timeout=timeout)
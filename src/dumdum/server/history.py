@@ -0,0 +1,801 @@
+import bisect
+import collections
+import zlib
+from array import array
+from typing import Iterable, Sequence, TypeAlias
+
+from dumdum.protocol import Message, varchar
+from dumdum.protocol.constants import (
+    MAX_CHANNEL_NAME_LENGTH,
+    MAX_MESSAGE_LENGTH,
+    MAX_NICK_LENGTH,
+)
+from dumdum.protocol.reader import byte_reader
+
+_MESSAGE_OVERHEAD = (
+    8  # ID
+    + varchar.get_length_byte_count(MAX_CHANNEL_NAME_LENGTH)
+    + varchar.get_length_byte_count(MAX_NICK_LENGTH)
+    + varchar.get_length_byte_count(MAX_MESSAGE_LENGTH)
+)
+
+
+def get_message_size(message: Message) -> int:
+    """Return the number of bytes a message takes up when encoded."""
+    return (
+        _MESSAGE_OVERHEAD
+        + _get_utf8_length(message.channel_name)
+        + _get_utf8_length(message.nick)
+        + (
+            len(message.raw_content)
+            if message.raw_content is not None
+            else _get_utf8_length(message.content)
+        )
+    )
+
+
+def _get_utf8_length(s: str) -> int:
+    # Checking for ASCII is O(1), so most strings are never encoded
+    return len(s) if s.isascii() else len(s.encode())
+
+
+class ChannelHistory:
+    """The cached messages of a single channel, ordered by ID.
+
+    IDs and messages are stored in parallel lists starting from a moving
+    offset, so appending new messages and evicting the oldest messages are
+    both O(1) amortized. Range queries bisect the IDs and only copy the
+    messages being returned.
+
+    Messages are also indexed by ID for O(1) lookups. Removing a message
+    leaves a tombstone in its slot, and the lists are compacted once
+    tombstones outnumber a quarter of the live messages, so range queries
+    only ever walk past a bounded number of tombstones.
+
+    If max_messages is None, the number of messages is not limited.
+
+    """
+
+    _messages: list[Message | None]
+
+    def __init__(self, *, max_messages: int | None) -> None:
+        self.max_messages = max_messages
+        self._ids: list[int] = []
+        self._messages = []
+        self._index: dict[int, Message] = {}
+        self._start = 0
+        self._tombstones = 0
+        self._size = 0
+        self.evicted = 0
+        """The number of messages removed by :meth:`evict_oldest()`."""
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    @property
+    def size(self) -> int:
+        """The total encoded size of every message in bytes."""
+        return self._size
+
+    @property
+    def oldest_id(self) -> int | None:
+        """The lowest message ID, or None if empty."""
+        if self._start < len(self._ids):
+            return self._ids[self._start]
+
+    def add_message(self, message: Message) -> None:
+        if self.max_messages is not None and self.max_messages < 1:
+            return
+
+        # Replace any message with the same ID
+        if self._tombstone(message.id) is not None:
+            self._maybe_compact()
+
+        # Like a bounded deque, make room before inserting the new message
+        while self.max_messages is not None and len(self) >= self.max_messages:
+            self.evict_oldest()
+
+        self._index[message.id] = message
+        self._size += get_message_size(message)
+
+        ids = self._ids
+        if len(ids) == self._start or message.id >= ids[-1]:
+            ids.append(message.id)
+            self._messages.append(message)
+            return
+
+        i = bisect.bisect_right(ids, message.id, lo=self._start)
+        ids.insert(i, message.id)
+        self._messages.insert(i, message)
+
+    def get_message(self, id: int) -> Message | None:
+        return self._index.get(id)
+
+    def get_messages(
+        self,
+        *,
+        before: int | None = None,
+        after: int | None = None,
+        limit: int = 100,
+    ) -> Sequence[Message]:
+        lo, hi = self._start, len(self._ids)
+
+        if before is not None:
+            lo = bisect.bisect_left(self._ids, before, lo, hi)
+
+        if after is not None:
+            hi = bisect.bisect_right(self._ids, after, lo, hi)
+
+        if self._tombstones == 0:
+            lo = max(lo, hi - limit)
+            return self._messages[lo:hi]  # type: ignore  # Evicted slots are < start
+
+        # Walk backwards past any tombstones to find the latest messages
+        messages: list[Message] = []
+        for i in range(hi - 1, lo - 1, -1):
+            if len(messages) >= limit:
+                break
+
+            message = self._messages[i]
+            if message is not None:
+                messages.append(message)
+
+        messages.reverse()
+        return messages
+
+    def remove_message(self, id: int) -> bool:
+        """Remove a message, returning True if it existed."""
+        removed = self._tombstone(id) is not None
+        self._maybe_compact()
+        return removed
+
+    def remove_messages(self, ids: Iterable[int]) -> list[int]:
+        """Remove multiple messages at once, returning the IDs that existed."""
+        removed = [id for id in ids if self._tombstone(id) is not None]
+        self._maybe_compact()
+        return removed
+
+    def get_oldest_messages(self, limit: int) -> list[Message]:
+        """Return up to limit messages with the lowest IDs, in ascending order."""
+        messages: list[Message] = []
+        for i in range(self._start, len(self._messages)):
+            if len(messages) >= limit:
+                break
+
+            message = self._messages[i]
+            if message is not None:
+                messages.append(message)
+
+        return messages
+
+    def evict_oldest(self) -> int | None:
+        """Remove the message with the lowest ID, returning its ID."""
+        if self._start >= len(self._messages):
+            return None
+
+        message = self._messages[self._start]
+        assert message is not None
+
+        del self._index[message.id]
+        self._size -= get_message_size(message)
+        self._messages[self._start] = None
+        self._start += 1
+        self.evicted += 1
+        self._skip_tombstones()
+        return message.id
+
+    def _tombstone(self, id: int) -> Message | None:
+        message = self._index.pop(id, None)
+        if message is None:
+            return None
+
+        i = bisect.bisect_left(self._ids, id, lo=self._start)
+        while self._messages[i] is not message:
+            i += 1  # Skip tombstones left by messages with the same ID
+
+        self._messages[i] = None
+        self._tombstones += 1
+        self._size -= get_message_size(message)
+        self._skip_tombstones()
+        return message
+
+    def _skip_tombstones(self) -> None:
+        # Keep the oldest message at the start so it can be found in O(1)
+        messages = self._messages
+        while self._start < len(messages) and messages[self._start] is None:
+            self._start += 1
+            self._tombstones -= 1
+
+        # Compact once evicted slots take up half the lists
+        if self._start > 0 and self._start * 2 >= len(self._ids):
+            del self._ids[: self._start]
+            del self._messages[: self._start]
+            self._start = 0
+
+    def _maybe_compact(self) -> None:
+        if self._tombstones * 4 <= len(self._index):
+            return
+
+        messages = [m for m in self._messages[self._start :] if m is not None]
+        self._ids = [m.id for m in messages]
+        self._messages = messages  # type: ignore  # list is invariant
+        self._start = 0
+        self._tombstones = 0
+
+
+class StringTable:
+    """Interns strings so they can be referenced by index.
+
+    Each call to :meth:`intern()` takes a reference to its string,
+    which is given back with :meth:`release()`. Once a string has no
+    references left, it is forgotten and its index is reused.
+
+    """
+
+    def __init__(self) -> None:
+        self._strings: list[str] = []
+        self._byte_lengths = array("I")
+        self._refs = array("Q")
+        self._indices: dict[str, int] = {}
+        self._free: list[int] = []
+
+    def __len__(self) -> int:
+        return len(self._indices)
+
+    def intern(self, s: str) -> int:
+        """Return the index of a string, adding it to the table if needed."""
+        index = self._indices.get(s)
+        if index is not None:
+            self._refs[index] += 1
+            return index
+
+        if len(self._free) > 0:
+            index = self._free.pop()
+            self._strings[index] = s
+            self._byte_lengths[index] = _get_utf8_length(s)
+            self._refs[index] = 1
+        else:
+            index = len(self._strings)
+            self._strings.append(s)
+            self._byte_lengths.append(_get_utf8_length(s))
+            self._refs.append(1)
+
+        self._indices[s] = index
+        return index
+
+    def release(self, index: int) -> None:
+        """Give back a reference taken by :meth:`intern()`."""
+        self._refs[index] -= 1
+        if self._refs[index] == 0:
+            del self._indices[self._strings[index]]
+            self._strings[index] = ""
+            self._free.append(index)
+
+    def get(self, index: int) -> str:
+        return self._strings[index]
+
+    def get_byte_length(self, index: int) -> int:
+        """Return the length of a string's UTF-8 encoding."""
+        return self._byte_lengths[index]
+
+
+class ColumnarChannelHistory:
+    """The cached messages of a single channel, stored column by column.
+
+    Rather than keeping a :class:`Message` for each entry, IDs are stored
+    in one array, nicks as indices into a shared :class:`StringTable`,
+    and content as offsets into a single bytearray. Messages are only
+    created when they are requested.
+
+    This has the same interface as :class:`ChannelHistory`, trading slower
+    reads and out-of-order inserts for a fraction of the memory. Evicted
+    and removed entries are marked dead, and the columns are rebuilt once
+    dead entries make up half of them.
+
+    """
+
+    _TOMBSTONE = 2**32 - 1
+
+    def __init__(
+        self,
+        channel_name: str,
+        *,
+        max_messages: int | None,
+        nicks: StringTable,
+    ) -> None:
+        self.channel_name = channel_name
+        self.max_messages = max_messages
+        self._channel_name_length = _get_utf8_length(channel_name)
+        self._nick_table = nicks
+
+        self._ids = array("Q")
+        self._nicks = array("I")
+        self._offsets = array("Q")
+        self._lengths = array("I")
+        self._arena = bytearray()
+
+        self._start = 0
+        self._dead = 0
+        self._count = 0
+        self._size = 0
+        self.evicted = 0
+        """The number of messages removed by :meth:`evict_oldest()`."""
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def size(self) -> int:
+        """The total encoded size of every message in bytes."""
+        return self._size
+
+    @property
+    def oldest_id(self) -> int | None:
+        """The lowest message ID, or None if empty."""
+        if self._start < len(self._ids):
+            return self._ids[self._start]
+
+    def add_message(self, message: Message) -> None:
+        if self.max_messages is not None and self.max_messages < 1:
+            return
+
+        # Replace any message with the same ID
+        self._remove(message.id)
+
+        while self.max_messages is not None and len(self) >= self.max_messages:
+            self.evict_oldest()
+
+        content = message.raw_content
+        if content is None:
+            content = message.content.encode()
+
+        nick = self._nick_table.intern(message.nick)
+        offset = len(self._arena)
+        self._arena += content
+
+        ids = self._ids
+        if len(ids) == self._start or message.id >= ids[-1]:
+            ids.append(message.id)
+            self._nicks.append(nick)
+            self._offsets.append(offset)
+            self._lengths.append(len(content))
+        else:
+            i = bisect.bisect_right(ids, message.id, lo=self._start)
+            ids.insert(i, message.id)
+            self._nicks.insert(i, nick)
+            self._offsets.insert(i, offset)
+            self._lengths.insert(i, len(content))
+
+        self._count += 1
+        self._size += self._get_size(nick, len(content))
+
+    def get_message(self, id: int) -> Message | None:
+        i = self._find(id)
+        if i is not None:
+            return self._materialize(i)
+
+    def get_messages(
+        self,
+        *,
+        before: int | None = None,
+        after: int | None = None,
+        limit: int = 100,
+    ) -> Sequence[Message]:
+        lo, hi = self._start, len(self._ids)
+
+        if before is not None:
+            lo = bisect.bisect_left(self._ids, before, lo, hi)
+
+        if after is not None:
+            hi = bisect.bisect_right(self._ids, after, lo, hi)
+
+        # Walk backwards past any dead entries to find the latest messages
+        indices: list[int] = []
+        for i in range(hi - 1, lo - 1, -1):
+            if len(indices) >= limit:
+                break
+            if self._nicks[i] != self._TOMBSTONE:
+                indices.append(i)
+
+        return [self._materialize(i) for i in reversed(indices)]
+
+    def get_oldest_messages(self, limit: int) -> list[Message]:
+        """Return up to limit messages with the lowest IDs, in ascending order."""
+        indices: list[int] = []
+        for i in range(self._start, len(self._ids)):
+            if len(indices) >= limit:
+                break
+            if self._nicks[i] != self._TOMBSTONE:
+                indices.append(i)
+
+        return [self._materialize(i) for i in indices]
+
+    def remove_message(self, id: int) -> bool:
+        """Remove a message, returning True if it existed."""
+        removed = self._remove(id)
+        self._maybe_compact()
+        return removed
+
+    def remove_messages(self, ids: Iterable[int]) -> list[int]:
+        """Remove multiple messages at once, returning the IDs that existed."""
+        removed = [id for id in ids if self._remove(id)]
+        self._maybe_compact()
+        return removed
+
+    def evict_oldest(self) -> int | None:
+        """Remove the message with the lowest ID, returning its ID."""
+        if self._start >= len(self._ids):
+            return None
+
+        id = self._ids[self._start]
+        self._kill_index(self._start)
+        self.evicted += 1
+        self._maybe_compact()
+        return id
+
+    def _find(self, id: int) -> int | None:
+        i = bisect.bisect_left(self._ids, id, lo=self._start)
+        while i < len(self._ids) and self._ids[i] == id:
+            if self._nicks[i] != self._TOMBSTONE:
+                return i
+            i += 1  # Skip dead entries left by messages with the same ID
+
+    def _remove(self, id: int) -> bool:
+        i = self._find(id)
+        if i is None:
+            return False
+
+        self._kill_index(i)
+        return True
+
+    def _kill_index(self, i: int) -> None:
+        # Dead entries are never materialized, so nothing needs to be decoded
+        nick = self._nicks[i]
+        self._size -= self._get_size(nick, self._lengths[i])
+        self._nick_table.release(nick)
+        self._nicks[i] = self._TOMBSTONE
+        self._count -= 1
+        self._dead += 1
+
+        # Keep the oldest message at the start so it can be found in O(1)
+        while (
+            self._start < len(self._ids) and self._nicks[self._start] == self._TOMBSTONE
+        ):
+            self._start += 1
+
+    def _maybe_compact(self) -> None:
+        if self._dead == 0 or self._dead * 2 < len(self._ids):
+            return
+
+        live = [
+            i
+            for i in range(self._start, len(self._ids))
+            if self._nicks[i] != self._TOMBSTONE
+        ]
+        arena = bytearray()
+        offsets = array("Q")
+        for i in live:
+            offset = self._offsets[i]
+            offsets.append(len(arena))
+            arena += self._arena[offset : offset + self._lengths[i]]
+
+        self._ids = array("Q", (self._ids[i] for i in live))
+        self._nicks = array("I", (self._nicks[i] for i in live))
+        self._lengths = array("I", (self._lengths[i] for i in live))
+        self._offsets = offsets
+        self._arena = arena
+        self._start = 0
+        self._dead = 0
+
+    def _get_size(self, nick: int, content_length: int) -> int:
+        return (
+            _MESSAGE_OVERHEAD
+            + self._channel_name_length
+            + self._nick_table.get_byte_length(nick)
+            + content_length
+        )
+
+    def _materialize(self, i: int) -> Message:
+        offset = self._offsets[i]
+        raw_content = bytes(self._arena[offset : offset + self._lengths[i]])
+        return Message(
+            self._ids[i],
+            self.channel_name,
+            self._nick_table.get(self._nicks[i]),
+            str(raw_content, "utf-8"),
+            raw_content=raw_content,
+        )
+
+
+class ColdBlock:
+    """A sealed run of consecutive messages compressed with zlib.
+
+    Messages are never decompressed just to evict or remove them.
+    Evicted messages are skipped over from the start of the block,
+    and removed messages are remembered by their index.
+
+    """
+
+    __slots__ = ("ids", "sizes", "data", "raw_size", "start", "dead", "count")
+
+    def __init__(self, messages: Sequence[Message]) -> None:
+        raw = b"".join(bytes(m) for m in messages)
+        self.ids = array("Q", (m.id for m in messages))
+        self.sizes = array("I", (get_message_size(m) for m in messages))
+        self.data = zlib.compress(raw)
+        self.raw_size = len(raw)
+        self.start = 0
+        self.dead: set[int] = set()
+        self.count = len(messages)
+
+    @property
+    def first_id(self) -> int:
+        return self.ids[0]
+
+    @property
+    def last_id(self) -> int:
+        return self.ids[-1]
+
+    def is_live(self, i: int) -> bool:
+        return i >= self.start and i not in self.dead
+
+    def find(self, id: int) -> int | None:
+        """Return the index of a live message, or None if not found."""
+        i = bisect.bisect_left(self.ids, id, lo=self.start)
+        if i < len(self.ids) and self.ids[i] == id and i not in self.dead:
+            return i
+
+    def decode(self) -> list[Message]:
+        """Decompress every message in the block, including dead ones."""
+        messages = []
+        with byte_reader(zlib.decompress(self.data)) as reader:
+            while reader.remaining > 0:
+                messages.append(Message.from_reader(reader))
+        return messages
+
+
+class BlockCache:
+    """A least recently used cache of decompressed blocks."""
+
+    _blocks: collections.OrderedDict[ColdBlock, list[Message]]
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._blocks = collections.OrderedDict()
+
+    def get(self, block: ColdBlock) -> list[Message]:
+        messages = self._blocks.get(block)
+        if messages is not None:
+            self.hits += 1
+            self._blocks.move_to_end(block)
+            return messages
+
+        self.misses += 1
+        messages = block.decode()
+        if self.capacity > 0:
+            self._blocks[block] = messages
+            if len(self._blocks) > self.capacity:
+                self._blocks.popitem(last=False)
+        return messages
+
+    def discard(self, block: ColdBlock) -> None:
+        self._blocks.pop(block, None)
+
+
+HotHistory: TypeAlias = ChannelHistory | ColumnarChannelHistory
+
+
+class CompressedChannelHistory:
+    """The cached messages of a single channel, with older messages
+    sealed into compressed blocks.
+
+    The newest messages are kept uncompressed in a hot history.
+    Once it holds ``hot_messages + block_size`` messages, its oldest
+    ``block_size`` messages are sealed into a :class:`ColdBlock`.
+    Every cold message has a lower ID than every hot message,
+    so queries only decompress blocks when the hot history
+    cannot fill them.
+
+    This has the same interface as :class:`ChannelHistory`.
+
+    """
+
+    def __init__(
+        self,
+        hot: HotHistory,
+        *,
+        max_messages: int | None,
+        block_size: int,
+        hot_messages: int,
+        blocks: BlockCache,
+    ) -> None:
+        if hot.max_messages is not None:
+            raise ValueError("Hot history must not limit its number of messages")
+
+        self.hot = hot
+        self.max_messages = max_messages
+        self.block_size = block_size
+        self.hot_messages = hot_messages
+        self.blocks = blocks
+
+        self._cold: list[ColdBlock] = []
+        self._cold_count = 0
+        self._cold_size = 0
+        self.evicted = 0
+        """The number of messages removed by :meth:`evict_oldest()`."""
+
+    def __len__(self) -> int:
+        return len(self.hot) + self._cold_count
+
+    @property
+    def size(self) -> int:
+        """The total encoded size of every message in bytes."""
+        return self.hot.size + self._cold_size
+
+    @property
+    def cold_blocks(self) -> Sequence[ColdBlock]:
+        return self._cold
+
+    @property
+    def oldest_id(self) -> int | None:
+        """The lowest message ID, or None if empty."""
+        if len(self._cold) > 0:
+            block = self._cold[0]
+            return block.ids[block.start]
+        return self.hot.oldest_id
+
+    def add_message(self, message: Message) -> None:
+        if self.max_messages is not None and self.max_messages < 1:
+            return
+
+        # Replace any message with the same ID
+        self.remove_message(message.id)
+
+        while self.max_messages is not None and len(self) >= self.max_messages:
+            self.evict_oldest()
+
+        if len(self._cold) > 0 and message.id <= self._cold[-1].last_id:
+            self._insert_cold(message)
+        else:
+            self.hot.add_message(message)
+
+        while len(self.hot) >= self.hot_messages + self.block_size:
+            self._seal()
+
+    def get_message(self, id: int) -> Message | None:
+        located = self._locate(id)
+        if located is None:
+            return self.hot.get_message(id)
+
+        block, i = located
+        return self.blocks.get(block)[i]
+
+    def get_messages(
+        self,
+        *,
+        before: int | None = None,
+        after: int | None = None,
+        limit: int = 100,
+    ) -> Sequence[Message]:
+        messages = self.hot.get_messages(before=before, after=after, limit=limit)
+        remaining = limit - len(messages)
+        if remaining <= 0 or len(self._cold) == 0:
+            return messages
+
+        # Walk backwards through cold blocks to fill the rest of the page
+        cold: list[Message] = []
+        for block in reversed(self._cold):
+            if after is not None and block.first_id > after:
+                continue
+            if before is not None and block.last_id < before:
+                break
+
+            decoded = self.blocks.get(block)
+            for i in range(len(block.ids) - 1, block.start - 1, -1):
+                id = block.ids[i]
+                if after is not None and id > after or i in block.dead:
+                    continue
+                if before is not None and id < before or len(cold) >= remaining:
+                    break
+                cold.append(decoded[i])
+
+            if len(cold) >= remaining:
+                break
+
+        cold.reverse()
+        cold.extend(messages)
+        return cold
+
+    def remove_message(self, id: int) -> bool:
+        """Remove a message, returning True if it existed.
+
+        Cold messages are marked dead by index without decompressing their block.
+
+        """
+        located = self._locate(id)
+        if located is None:
+            return self.hot.remove_message(id)
+
+        self._kill(*located)
+        return True
+
+    def remove_messages(self, ids: Iterable[int]) -> list[int]:
+        """Remove multiple messages at once, returning the IDs that existed."""
+        return [id for id in ids if self.remove_message(id)]
+
+    def evict_oldest(self) -> int | None:
+        """Remove the message with the lowest ID, returning its ID."""
+        if len(self._cold) == 0:
+            id = self.hot.evict_oldest()
+        else:
+            block = self._cold[0]
+            id = block.ids[block.start]
+            self._kill(block, block.start)
+
+        if id is not None:
+            self.evicted += 1
+        return id
+
+    def _locate(self, id: int) -> tuple[ColdBlock, int] | None:
+        if len(self._cold) == 0 or id > self._cold[-1].last_id:
+            return None
+
+        k = bisect.bisect_right(self._cold, id, key=lambda b: b.first_id) - 1
+        if k < 0:
+            return None
+
+        block = self._cold[k]
+        i = block.find(id)
+        if i is not None:
+            return block, i
+
+    def _seal(self) -> None:
+        messages = self.hot.get_oldest_messages(self.block_size)
+        for _ in messages:
+            self.hot.evict_oldest()
+
+        self._add_block(ColdBlock(messages))
+
+    def _insert_cold(self, message: Message) -> None:
+        # Rare, but messages can arrive out of order, so re-seal the block
+        k = bisect.bisect_left(self._cold, message.id, key=lambda b: b.last_id)
+        old = self._cold[k]
+        decoded = self.blocks.get(old)
+        messages = [m for i, m in enumerate(decoded) if old.is_live(i)]
+        bisect.insort(messages, message, key=lambda m: m.id)
+
+        self._remove_block(k)
+        self._add_block(ColdBlock(messages), k)
+
+    def _kill(self, block: ColdBlock, i: int) -> None:
+        block.dead.add(i)
+        block.count -= 1
+        self._cold_count -= 1
+        self._cold_size -= block.sizes[i]
+
+        while block.start in block.dead:
+            block.dead.remove(block.start)
+            block.start += 1
+
+        if block.count == 0:
+            self._remove_block(self._cold.index(block))
+
+    def _add_block(self, block: ColdBlock, index: int | None = None) -> None:
+        if index is None:
+            self._cold.append(block)
+        else:
+            self._cold.insert(index, block)
+        self._cold_count += block.count
+        self._cold_size += sum(block.sizes)
+
+    def _remove_block(self, index: int) -> None:
+        block = self._cold.pop(index)
+        self.blocks.discard(block)
+        self._cold_count -= block.count
+        self._cold_size -= sum(
+            block.sizes[i]
+            for i in range(block.start, len(block.ids))
+            if block.is_live(i)
+        )
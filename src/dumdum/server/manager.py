@@ -2,25 +2,39 @@ import asyncio
 import contextlib
 import logging
 import ssl
+from typing import Any, Iterable, Sequence
 
 from dumdum.protocol import (
+    Channel,
     InvalidStateError,
     Message,
+    PreparedMessage,
     Server,
     ServerEvent,
     ServerEventAuthentication,
     ServerEventHello,
+    ServerEventJoinChannel,
     ServerEventListChannels,
     ServerEventListMessages,
     ServerEventMessageReceived,
-    create_snowflake,
+    ServerEventMessagesReceived,
+    ServerEventPartChannel,
+    ServerEventSync,
+    SnowflakeGenerator,
 )
 
 from .connection import Connection
+from .outbound import SlowConsumerPolicy
+from .ratelimit import RateLimit, RateLimiter
 from .state import ServerState
+from .store import MessageStore
+from .wal import MessageLog
 
 log = logging.getLogger(__name__)
 
+MESSAGE_PAGE_SIZE = 100
+"""The number of messages sent when a client does not request a page size."""
+
 
 class Manager:
     def __init__(
@@ -30,12 +44,44 @@ class Manager:
         *,
         drain_timeout: float = 30,
         close_timeout: float = 5,
+        outbound_high_watermark: int = 2**20,
+        outbound_low_watermark: int = 2**18,
+        slow_consumer_policy: SlowConsumerPolicy = SlowConsumerPolicy.DISCONNECT,
+        message_store: MessageStore | None = None,
+        message_log: MessageLog | None = None,
+        snowflake_generator: SnowflakeGenerator | None = None,
+        connection_rate_limit: RateLimit | None = None,
+        channel_rate_limit: RateLimit | None = None,
+        max_page_size: int = 500,
+        compression: bool = True,
+        compression_threshold: int = 256,
     ) -> None:
         self.state = state
-        self.connections: list[Connection] = []
+        self.connections: set[Connection] = set()
+        self.connections_by_nick: dict[str, Connection] = {}
         self.ssl = ssl
         self.drain_timeout = drain_timeout
         self.close_timeout = close_timeout
+        self.outbound_high_watermark = outbound_high_watermark
+        self.outbound_low_watermark = outbound_low_watermark
+        self.slow_consumer_policy = slow_consumer_policy
+        self.message_store = message_store
+        self.message_log = message_log
+        self._complete_channels: set[str] = set()
+        if snowflake_generator is None:
+            snowflake_generator = SnowflakeGenerator(0)
+        self.snowflake_generator = snowflake_generator
+
+        if connection_rate_limit is not None and not connection_rate_limit.enabled:
+            connection_rate_limit = None
+        if channel_rate_limit is not None and not channel_rate_limit.enabled:
+            channel_rate_limit = None
+        self.connection_rate_limit = connection_rate_limit
+        self.channel_rate_limit = channel_rate_limit
+        self._channel_rate_limiters: dict[str, RateLimiter] = {}
+        self.max_page_size = max_page_size
+        self.compression = compression
+        self.compression_threshold = compression_threshold
 
     async def accept_connection(
         self,
@@ -46,7 +92,7 @@ class Manager:
         log.info("Accepted connection from %s", addr)
 
         connection = Connection(self, reader, writer, self._create_server())
-        self.connections.append(connection)
+        self.connections.add(connection)
         try:
             await connection.communicate()
         except asyncio.CancelledError:
@@ -65,8 +111,41 @@ class Manager:
 
             self._close_connection(connection)
 
+    async def remove_messages(
+        self,
+        channel_name: str,
+        ids: Iterable[int],
+    ) -> list[int]:
+        """Remove messages from a channel, including the message log
+        and message store.
+
+        Returns the IDs of the messages that were removed from the cache.
+
+        """
+        ids = list(ids)
+        removed = self.state.remove_messages(channel_name, ids)
+        if self.message_log is not None:
+            await self.message_log.append_deletes(channel_name, ids)
+        if self.message_store is not None:
+            await self.message_store.remove_messages(channel_name, ids)
+        return removed
+
+    def remove_channel(self, name: str) -> Channel | None:
+        """Remove a channel along with its cached messages and rate limit.
+
+        Messages in the message log and message store are kept.
+
+        """
+        self._channel_rate_limiters.pop(name, None)
+        self._complete_channels.discard(name)
+        return self.state.remove_channel(name)
+
     def _create_server(self) -> Server:
-        return Server()
+        return Server(
+            compression=self.compression,
+            compression_threshold=self.compression_threshold,
+            defer_compression=True,
+        )
 
     async def _wait_closed(self, writer: asyncio.StreamWriter) -> None:
         timeout = self.close_timeout
@@ -78,84 +157,324 @@ class Manager:
             await self._handle_event(conn, event)
 
     async def _handle_event(self, conn: Connection, event: ServerEvent) -> None:
-        log.debug(
-            "%s produced by %s",
-            type(event).__name__,
-            conn.writer.get_extra_info("peername"),
-        )
+        log.debug("%s produced by %s", type(event).__name__, conn.addr)
 
         if isinstance(event, ServerEventHello):
             await self._hello(conn, event)
         elif isinstance(event, ServerEventAuthentication):
             self._authenticate(conn, event)
         elif isinstance(event, ServerEventMessageReceived):
-            self._broadcast_message(conn, event)
+            await self._broadcast_message(conn, event)
+        elif isinstance(event, ServerEventMessagesReceived):
+            await self._broadcast_messages(conn, event)
         elif isinstance(event, ServerEventListChannels):
             self._list_channels(conn, event)
         elif isinstance(event, ServerEventListMessages):
-            self._list_messages(conn, event)
+            await self._list_messages(conn, event)
+        elif isinstance(event, ServerEventJoinChannel):
+            self._join_channel(conn, event)
+        elif isinstance(event, ServerEventPartChannel):
+            self._part_channel(conn, event)
+        elif isinstance(event, ServerEventSync):
+            await self._sync(conn, event)
 
     async def _hello(self, conn: Connection, event: ServerEventHello) -> None:
         using_ssl = self.ssl is not None
 
         data = conn.server.hello(using_ssl=using_ssl)
-        conn.writer.write(data)
+        conn.send(data)
 
         if using_ssl:
             assert self.ssl is not None
-            await conn.writer.start_tls(self.ssl)
+            await conn.start_tls(self.ssl)
 
     def _authenticate(self, conn: Connection, event: ServerEventAuthentication) -> None:
         user = self.state.get_user(event.nick)
         if user is None:
             self.state.add_user(event.nick)
             conn.nick = event.nick
+            self.connections_by_nick[event.nick] = conn
             success = True
         else:
             success = False
 
         data = conn.server.authenticate(success=success)
-        conn.writer.write(data)
+        conn.send(data)
+
+        version = conn.server.version
+        if success and version is not None and version < 3:
+            # Version 2 clients can't join channels, so subscribe them to everything
+            for channel in self.state.channels:
+                self.state.join_channel(channel.name, event.nick)
 
-    def _broadcast_message(
+    async def _broadcast_message(
         self,
         conn: Connection,
         event: ServerEventMessageReceived,
+    ) -> None:
+        raw_content = event.raw_content
+        if raw_content is None:
+            raw_content = event.content.encode()
+        await self._broadcast(
+            conn,
+            event.channel_name,
+            [(event.content, raw_content)],
+        )
+
+    async def _broadcast_messages(
+        self,
+        conn: Connection,
+        event: ServerEventMessagesReceived,
+    ) -> None:
+        raw_contents = event.raw_contents
+        if raw_contents is None:
+            raw_contents = [content.encode() for content in event.contents]
+        await self._broadcast(
+            conn,
+            event.channel_name,
+            list(zip(event.contents, raw_contents, strict=True)),
+        )
+
+    async def _broadcast(
+        self,
+        conn: Connection,
+        channel_name: str,
+        contents: list[tuple[str, bytes]],
     ) -> None:
         assert conn.nick is not None
 
-        if self.state.get_channel(event.channel_name) is None:
+        if self.state.get_channel(channel_name) is None:
             return
 
-        message = Message(
-            create_snowflake(),
-            event.channel_name,
-            conn.nick,
-            event.content,
-        )
-        self.state.add_message(message)
+        if conn.rate_limiter is not None or self.channel_rate_limit is not None:
+            if self._throttle(conn, channel_name, contents):
+                return
+
+        ids = self.snowflake_generator.generate_many(len(contents))
+        messages = [
+            Message(id, channel_name, conn.nick, content, raw_content=raw_content)
+            for id, (content, raw_content) in zip(ids, contents)
+        ]
+        # Log the messages before anything can read them, and don't yield
+        # between caching and broadcasting them, or a client syncing
+        # in between would receive them twice
+        if self.message_log is not None:
+            await self.message_log.append_messages(messages)
+            if self.state.get_channel(channel_name) is None:
+                return
+        for message in messages:
+            self.state.add_message(message)
+            if self.message_store is not None:
+                self.message_store.add_message(message)
 
-        for peer in self.connections:
+        # Peers receive every message in one frame, so bursts of messages
+        # only cost one write per peer
+        if len(messages) == 1:
+            prepared = Server.prepare_message(messages[0])
+        else:
+            prepared = Server.prepare_messages(messages)
+
+        paused: list[Connection] = []
+        for nick in self.state.get_subscribers(channel_name):
+            peer = self.connections_by_nick[nick]
             with contextlib.suppress(InvalidStateError):
-                data = peer.server.send_message(message)
-                peer.writer.write(data)
+                data = peer.server.send_prepared_message(prepared)
+                peer.send(data, droppable=True)
+
+                if peer.outbound.paused:
+                    paused.append(peer)
+
+        if self.slow_consumer_policy == SlowConsumerPolicy.PAUSE:
+            await self._wait_for_paused_peers(paused)
+
+    def _throttle(
+        self,
+        conn: Connection,
+        channel_name: str,
+        contents: list[tuple[str, bytes]],
+    ) -> bool:
+        """Check if the contents exceed any rate limit, and if so,
+        tell the client to retry later.
+
+        Batches of messages are accepted or rejected as a whole,
+        so clients can safely retry a throttled batch.
+
+        """
+        limiters: list[RateLimiter] = []
+        if conn.rate_limiter is not None:
+            limiters.append(conn.rate_limiter)
+        if self.channel_rate_limit is not None:
+            limiter = self._channel_rate_limiters.get(channel_name)
+            if limiter is None:
+                limiter = RateLimiter(self.channel_rate_limit)
+                self._channel_rate_limiters[channel_name] = limiter
+            limiters.append(limiter)
+
+        count = len(contents)
+        size = sum(len(raw_content) for _, raw_content in contents)
+
+        # Check every limit before consuming from any of them,
+        # so rejected messages don't count against the other limits
+        delay = max(limiter.get_delay(size, count) for limiter in limiters)
+        if delay > 0:
+            log.debug("Throttling %s for %.3f seconds", conn.addr, delay)
+            conn.send(conn.server.throttle(channel_name, retry_after=delay))
+            return True
+
+        for limiter in limiters:
+            limiter.consume(size, count)
+        return False
+
+    async def _wait_for_paused_peers(self, peers: list[Connection]) -> None:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.drain_timeout
+
+        for peer in peers:
+            try:
+                async with asyncio.timeout_at(deadline):
+                    await peer.outbound.wait_writable()
+            except TimeoutError:
+                log.warning("Disconnecting %s for not draining in time", peer.addr)
+                peer.abort()
 
     def _list_channels(self, conn: Connection, event: ServerEventListChannels) -> None:
-        data = conn.server.list_channels(self.state.channels)
-        conn.writer.write(data)
+        data = conn.server.send_prepared_message(self.state.get_channel_list())
+        conn.send(data)
 
-    def _list_messages(self, conn: Connection, event: ServerEventListMessages) -> None:
-        messages = self.state.get_messages(
+    async def _list_messages(
+        self,
+        conn: Connection,
+        event: ServerEventListMessages,
+    ) -> None:
+        limit = min(event.limit or MESSAGE_PAGE_SIZE, self.max_page_size)
+        prepared = await self._get_message_page(
             event.channel_name,
             before=event.before,
             after=event.after,
+            limit=limit,
+        )
+        data = conn.server.send_prepared_message(prepared)
+        conn.send(data)
+
+    async def _sync(self, conn: Connection, event: ServerEventSync) -> None:
+        assert conn.nick is not None
+
+        # Join before reading any messages, so that nothing sent
+        # in the meantime is missed
+        channels = self.state.channels
+        if event.join:
+            for channel in channels:
+                self.state.join_channel(channel.name, conn.nick)
+
+        pages: list[PreparedMessage] = []
+        for channel in channels:
+            watermark = event.watermarks.get(channel.name)
+            before = watermark + 1 if watermark is not None else None
+            pages.append(await self._get_message_page(channel.name, before=before))
+
+        data = conn.server.sync(channels, pages)
+        conn.send(data)
+
+    async def _get_message_page(
+        self,
+        channel_name: str,
+        *,
+        before: int | None = None,
+        after: int | None = None,
+        limit: int = MESSAGE_PAGE_SIZE,
+    ) -> PreparedMessage:
+        pages = self.state.get_message_pages(channel_name)
+        prepared = pages.get(before=before, after=after, limit=limit)
+        if prepared is None:
+            messages = await self._get_messages(
+                channel_name,
+                before=before,
+                after=after,
+                limit=limit,
+            )
+            prepared = Server.prepare_message_list(messages)
+            pages.put(prepared, before=before, after=after, limit=limit)
+        return prepared
+
+    async def _get_messages(
+        self,
+        channel_name: str,
+        *,
+        before: int | None = None,
+        after: int | None = None,
+        limit: int = MESSAGE_PAGE_SIZE,
+    ) -> Sequence[Message]:
+        messages = self.state.get_messages(
+            channel_name,
+            before=before,
+            after=after,
+            limit=limit,
+        )
+        if self.message_store is None or len(messages) >= limit:
+            return messages
+
+        # The cache holds every message from its oldest message onwards
+        oldest_id = self.state.get_oldest_id(channel_name)
+        if before is not None and oldest_id is not None and oldest_id <= before:
+            return messages
+        elif await self._is_cache_complete(channel_name):
+            return messages
+
+        # Older messages may have been evicted from the cache, or were sent
+        # before the server restarted
+        return await self.message_store.get_messages(
+            channel_name,
+            before=before,
+            after=after,
+            limit=limit,
+        )
+
+    async def _is_cache_complete(self, channel_name: str) -> bool:
+        # Only channels that never evicted a message can hold every message,
+        # but the store may still have messages from before the server started
+        assert self.message_store is not None
+        if self.state.has_evicted(channel_name):
+            return False
+        elif channel_name in self._complete_channels:
+            return True
+
+        oldest_id = self.state.get_oldest_id(channel_name)
+        after = oldest_id - 1 if oldest_id is not None else None
+        older = await self.message_store.get_messages(
+            channel_name, after=after, limit=1
         )
-        data = conn.server.list_messages(messages)
-        conn.writer.write(data)
+        if len(older) > 0:
+            return False
+
+        self._complete_channels.add(channel_name)
+        return True
+
+    def _join_channel(self, conn: Connection, event: ServerEventJoinChannel) -> None:
+        assert conn.nick is not None
+        self.state.join_channel(event.channel_name, conn.nick)
+
+    def _part_channel(self, conn: Connection, event: ServerEventPartChannel) -> None:
+        assert conn.nick is not None
+        self.state.part_channel(event.channel_name, conn.nick)
 
     def _close_connection(self, conn: Connection) -> None:
-        self.connections.remove(conn)
+        stats = conn.server.compression_stats
+        if stats is not None:
+            log.info(
+                "Connection %s compressed %d frames at %.2fx in %.3fs, "
+                "decompressed %d frames at %.2fx in %.3fs",
+                conn.addr,
+                stats.frames_compressed,
+                stats.compression_ratio,
+                stats.compress_time,
+                stats.frames_decompressed,
+                stats.decompression_ratio,
+                stats.decompress_time,
+            )
+
+        self.connections.discard(conn)
         if conn.nick is not None:
+            self.connections_by_nick.pop(conn.nick, None)
             self.state.remove_user(conn.nick)
 
 
@@ -165,8 +484,14 @@ async def host_server(
     port: int,
     *,
     ssl: ssl.SSLContext | None,
+    **kwargs: Any,
 ) -> None:
-    manager = Manager(state, ssl)
+    """Host a server on the given address until cancelled.
+
+    Any additional keyword arguments are passed to :class:`Manager`.
+
+    """
+    manager = Manager(state, ssl, **kwargs)
     server = await asyncio.start_server(
         manager.accept_connection,
         host=host,
@@ -0,0 +1,165 @@
+import asyncio
+import collections
+from enum import Enum
+
+
+class SlowConsumerPolicy(Enum):
+    """Determines what happens when a connection's outbound queue
+    exceeds its high watermark.
+    """
+
+    DISCONNECT = "disconnect"
+    """Immediately disconnect the client."""
+    DROP_OLDEST = "drop-oldest"
+    """Drop the oldest broadcasts until the queue reaches its low watermark."""
+    PAUSE = "pause"
+    """Pause the clients sending broadcasts until the queue reaches
+    its low watermark."""
+
+
+class OutboundQueue:
+    """A bounded queue of data waiting to be written to a connection.
+
+    Once the queue's size exceeds the high watermark, it is considered
+    paused until its size falls back to or below the low watermark.
+    Data that was popped from the queue but is still buffered by the
+    transport counts towards its size, as reported by :meth:`set_buffered()`.
+
+    """
+
+    _chunks: collections.deque[tuple[bytes, bool]]
+
+    def __init__(self, *, high_watermark: int, low_watermark: int) -> None:
+        if low_watermark > high_watermark:
+            raise ValueError(
+                f"Low watermark ({low_watermark}) cannot exceed "
+                f"high watermark ({high_watermark})"
+            )
+
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+
+        self._chunks = collections.deque()
+        self._size = 0
+        self._buffered = 0
+        self._dropped = 0
+        self._closed = False
+        self._readable = asyncio.Event()
+        self._writable = asyncio.Event()
+        self._writable.set()
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    @property
+    def size(self) -> int:
+        """The number of bytes waiting in the queue."""
+        return self._size
+
+    @property
+    def buffered(self) -> int:
+        """The number of bytes popped from the queue that the transport
+        has not sent yet.
+        """
+        return self._buffered
+
+    @property
+    def dropped(self) -> int:
+        """The number of broadcasts dropped from the queue."""
+        return self._dropped
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @property
+    def paused(self) -> bool:
+        """Whether the queue exceeded its high watermark and has not
+        yet fallen to its low watermark.
+        """
+        return not self._writable.is_set()
+
+    def put(self, data: bytes, *, droppable: bool = False) -> None:
+        """Add data to the queue.
+
+        Data marked as droppable may be discarded by :meth:`drop_oldest()`.
+        If the queue is closed, the data is discarded.
+
+        """
+        if self._closed or len(data) == 0:
+            return
+
+        self._chunks.append((data, droppable))
+        self._size += len(data)
+        self._readable.set()
+
+        if self._size + self._buffered > self.high_watermark:
+            self._writable.clear()
+
+    def pop_all(self) -> list[bytes]:
+        """Remove and return all data in the queue.
+
+        The popped data still counts towards the queue's size until
+        :meth:`set_buffered()` reports that the transport has sent it.
+
+        """
+        chunks = [data for data, _ in self._chunks]
+        self._chunks.clear()
+        self._buffered += self._size
+        self._size = 0
+        self._readable.clear()
+        return chunks
+
+    def set_buffered(self, size: int) -> None:
+        """Set the number of bytes still buffered by the transport."""
+        self._buffered = size
+        self._update_writable()
+
+    def drop_oldest(self) -> int:
+        """Drop the oldest droppable data until the queue reaches
+        its low watermark.
+
+        Returns the number of chunks that were dropped.
+
+        """
+        if self._size + self._buffered <= self.low_watermark:
+            return 0
+
+        kept: collections.deque[tuple[bytes, bool]] = collections.deque()
+        dropped = 0
+        for data, droppable in self._chunks:
+            if droppable and self._size + self._buffered > self.low_watermark:
+                self._size -= len(data)
+                dropped += 1
+            else:
+                kept.append((data, droppable))
+
+        self._chunks = kept
+        self._dropped += dropped
+
+        self._update_writable()
+        if len(self._chunks) == 0:
+            self._readable.clear()
+
+        return dropped
+
+    def close(self) -> None:
+        """Close the queue, discarding any remaining data."""
+        self._closed = True
+        self._chunks.clear()
+        self._size = 0
+        self._buffered = 0
+        self._readable.set()
+        self._writable.set()
+
+    def _update_writable(self) -> None:
+        if self._closed or self._size + self._buffered <= self.low_watermark:
+            self._writable.set()
+
+    async def wait_readable(self) -> None:
+        """Wait until the queue has data or is closed."""
+        await self._readable.wait()
+
+    async def wait_writable(self) -> None:
+        """Wait until the queue is not paused or is closed."""
+        await self._writable.wait()
@@ -0,0 +1,109 @@
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """The rate at which messages can be sent.
+
+    Each rate is refilled continuously, and up to ``burst`` seconds
+    of unused capacity can be saved up for later.
+
+    """
+
+    messages: float | None = None
+    """The number of messages allowed per second, or None for no limit."""
+    bytes: float | None = None
+    """The number of content bytes allowed per second, or None for no limit."""
+    burst: float = 5
+
+    def __post_init__(self) -> None:
+        if self.messages is not None and self.messages <= 0:
+            raise ValueError(f"Message rate must be positive, not {self.messages}")
+        if self.bytes is not None and self.bytes <= 0:
+            raise ValueError(f"Byte rate must be positive, not {self.bytes}")
+        if self.burst <= 0:
+            raise ValueError(f"Burst must be positive, not {self.burst}")
+
+    @property
+    def enabled(self) -> bool:
+        return self.messages is not None or self.bytes is not None
+
+
+class TokenBucket:
+    """A bucket of tokens refilled at a constant rate.
+
+    To let amounts larger than the bucket's capacity through,
+    a full bucket can always be consumed from, going into debt
+    until it refills.
+
+    """
+
+    __slots__ = ("rate", "capacity", "tokens", "updated_at")
+
+    def __init__(self, rate: float, capacity: float, *, now: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = now
+
+    def get_delay(self, amount: float, *, now: float) -> float:
+        """Return the number of seconds until the amount can be consumed,
+        or zero if it can be consumed now.
+        """
+        elapsed = now - self.updated_at
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated_at = now
+
+        required = min(amount, self.capacity)
+        if self.tokens >= required:
+            return 0
+        return (required - self.tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        self.tokens -= amount
+
+
+class RateLimiter:
+    """Enforces a :class:`RateLimit` for one connection or channel."""
+
+    __slots__ = ("limit", "_clock", "_messages", "_bytes")
+
+    def __init__(
+        self,
+        limit: RateLimit,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.limit = limit
+        self._clock = clock
+
+        now = clock()
+        self._messages = None
+        self._bytes = None
+        if limit.messages is not None:
+            capacity = limit.messages * limit.burst
+            self._messages = TokenBucket(limit.messages, capacity, now=now)
+        if limit.bytes is not None:
+            capacity = limit.bytes * limit.burst
+            self._bytes = TokenBucket(limit.bytes, capacity, now=now)
+
+    def get_delay(self, size: int, count: int = 1) -> float:
+        """Return the number of seconds until ``count`` messages totalling
+        the given size can be sent, or zero if they can be sent now.
+        """
+        now = self._clock()
+        delay = 0.0
+        if self._messages is not None:
+            delay = max(delay, self._messages.get_delay(count, now=now))
+        if self._bytes is not None:
+            delay = max(delay, self._bytes.get_delay(size, now=now))
+        return delay
+
+    def consume(self, size: int, count: int = 1) -> None:
+        """Record ``count`` messages totalling the given size being sent."""
+        if self._messages is not None:
+            self._messages.consume(count)
+        if self._bytes is not None:
+            self._bytes.consume(size)
@@ -0,0 +1,199 @@
+"""Read and write snapshots of the server's message cache.
+
+A snapshot stores each channel's messages back to back in their wire format,
+followed by an index of where each channel's messages are located:
+
+    [8 bytes] Magic number
+    [u64]     Index offset
+    [...]     Message data
+    [u32]     Number of channels
+    For each channel:
+      [varchar] Channel name
+      [u64]     Data offset
+      [u64]     Data length
+      [u32]     Number of messages
+
+Snapshots are memory-mapped when opened, so only the index is read upfront
+and each channel can be decoded when it is first needed.
+
+"""
+
+import mmap
+import os
+import struct
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Iterable, Self
+
+from dumdum.protocol import MalformedDataError, Message, varchar
+from dumdum.protocol.constants import MAX_CHANNEL_NAME_LENGTH
+from dumdum.protocol.reader import byte_reader
+
+SNAPSHOT_MAGIC = b"DUMDUMS\x01"
+SNAPSHOT_HEADER = struct.Struct(">8sQ")
+SNAPSHOT_INDEX_ENTRY = struct.Struct(">QQI")
+
+
+@dataclass(frozen=True)
+class SnapshotChannel:
+    """The location of a channel's messages in a snapshot."""
+
+    offset: int
+    length: int
+    count: int
+
+
+class Snapshot:
+    """A memory-mapped snapshot of cached messages.
+
+    Use :meth:`open()` to open a snapshot file, and :meth:`close()`
+    to unmap it once every channel has been read.
+
+    """
+
+    def __init__(self, buffer: bytes | mmap.mmap) -> None:
+        self._buffer = buffer
+        self.channels = self._read_index()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def read_messages(self, channel_name: str) -> list[Message]:
+        """Decode every message stored for a channel.
+
+        :raises KeyError: The channel is not in the snapshot.
+        :raises ValueError: The snapshot is corrupted.
+
+        """
+        channel = self.channels[channel_name]
+        end = channel.offset + channel.length
+
+        messages = []
+        with byte_reader(memoryview(self._buffer)[channel.offset : end]) as reader:
+            try:
+                while reader.remaining > 0:
+                    messages.append(Message.from_reader(reader))
+            except (IndexError, MalformedDataError, UnicodeDecodeError) as e:
+                raise ValueError(f"Corrupted snapshot channel {channel_name!r}") from e
+
+        return messages
+
+    def read_raw(self, channel_name: str) -> bytes:
+        """Return the encoded messages stored for a channel.
+
+        :raises KeyError: The channel is not in the snapshot.
+
+        """
+        channel = self.channels[channel_name]
+        return self._buffer[channel.offset : channel.offset + channel.length]
+
+    def close(self) -> None:
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+
+    def _read_index(self) -> dict[str, SnapshotChannel]:
+        try:
+            magic, index_offset = SNAPSHOT_HEADER.unpack_from(self._buffer)
+        except struct.error as e:
+            raise ValueError("Snapshot header is truncated") from e
+
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"Unrecognized snapshot format {magic!r}")
+
+        channels = {}
+        with byte_reader(memoryview(self._buffer)[index_offset:]) as reader:
+            try:
+                count = int.from_bytes(reader.readexactly_view(4), byteorder="big")
+                for _ in range(count):
+                    name = reader.read_varchar(max_length=MAX_CHANNEL_NAME_LENGTH)
+                    entry = reader.readexactly_view(SNAPSHOT_INDEX_ENTRY.size)
+                    channels[name] = SnapshotChannel(
+                        *SNAPSHOT_INDEX_ENTRY.unpack(entry)
+                    )
+            except (IndexError, MalformedDataError, UnicodeDecodeError) as e:
+                raise ValueError("Snapshot index is corrupted") from e
+
+        return channels
+
+    @classmethod
+    def open(cls, path: str | os.PathLike) -> Self:
+        """Memory-map the snapshot at the given path.
+
+        :raises ValueError: The file is not a valid snapshot.
+
+        """
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                raise ValueError("Snapshot is empty")
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            return cls(buffer)
+        except BaseException:
+            buffer.close()
+            raise
+
+
+class SnapshotWriter:
+    """Writes a snapshot to a temporary file, replacing the given path
+    once the writer is closed without an exception.
+    """
+
+    _file: BinaryIO
+
+    def __init__(self, path: str | os.PathLike) -> None:
+        self.path = Path(path)
+        self._tmp_path = self.path.with_name(self.path.name + ".tmp")
+        self._index: dict[str, SnapshotChannel] = {}
+
+    def __enter__(self) -> Self:
+        self._file = open(self._tmp_path, "wb")
+        self._file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, 0))
+        return self
+
+    def __exit__(self, exc_type, exc_val, tb) -> None:
+        try:
+            if exc_type is None:
+                self._write_index()
+                self._file.flush()
+                os.fsync(self._file.fileno())
+        finally:
+            self._file.close()
+
+        if exc_type is None:
+            os.replace(self._tmp_path, self.path)
+        else:
+            self._tmp_path.unlink(missing_ok=True)
+
+    def add_messages(self, channel_name: str, messages: Iterable[Message]) -> None:
+        """Write a channel's messages in order of their IDs."""
+        offset = self._file.tell()
+        count = 0
+        for message in messages:
+            self._file.write(bytes(message))
+            count += 1
+
+        length = self._file.tell() - offset
+        self._index[channel_name] = SnapshotChannel(offset, length, count)
+
+    def add_raw(self, channel_name: str, data: bytes, count: int) -> None:
+        """Write a channel's messages that are already encoded."""
+        offset = self._file.tell()
+        self._file.write(data)
+        self._index[channel_name] = SnapshotChannel(offset, len(data), count)
+
+    def _write_index(self) -> None:
+        index_offset = self._file.tell()
+        self._file.write(len(self._index).to_bytes(4, byteorder="big"))
+        for name, channel in self._index.items():
+            self._file.write(varchar.dumps(name, max_length=MAX_CHANNEL_NAME_LENGTH))
+            self._file.write(
+                SNAPSHOT_INDEX_ENTRY.pack(channel.offset, channel.length, channel.count)
+            )
+
+        self._file.seek(0)
+        self._file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, index_offset))
+        self._file.seek(0, os.SEEK_END)
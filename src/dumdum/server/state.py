@@ -1,32 +1,150 @@
 from __future__ import annotations
 
-import bisect
 import collections
-from typing import Sequence, TypeAlias
-
-from dumdum.protocol import Channel, Message
+import heapq
+import logging
+import os
+from dataclasses import dataclass
+from enum import Enum
+from typing import Collection, Iterable, Sequence, TypeAlias
+
+from dumdum.protocol import Channel, Message, PreparedMessage, Server
+
+from .history import (
+    BlockCache,
+    ChannelHistory,
+    ColumnarChannelHistory,
+    CompressedChannelHistory,
+    StringTable,
+)
+from .snapshot import Snapshot, SnapshotWriter
+
+log = logging.getLogger(__name__)
 
 User: TypeAlias = str
+History: TypeAlias = ChannelHistory | ColumnarChannelHistory | CompressedChannelHistory
+
+
+class MessagePages:
+    """Encoded LIST_MESSAGES responses for a single channel,
+    keyed by the query that produced them.
+
+    Once more than ``max_pages`` responses are stored,
+    the oldest response is discarded.
+
+    """
+
+    def __init__(self, max_pages: int) -> None:
+        self.max_pages = max_pages
+        self._pages: dict[tuple[int | None, int | None, int], PreparedMessage] = {}
+
+    def __len__(self) -> int:
+        return len(self._pages)
+
+    def get(
+        self,
+        *,
+        before: int | None,
+        after: int | None,
+        limit: int,
+    ) -> PreparedMessage | None:
+        return self._pages.get((before, after, limit))
+
+    def put(
+        self,
+        prepared: PreparedMessage,
+        *,
+        before: int | None,
+        after: int | None,
+        limit: int,
+    ) -> None:
+        if self.max_pages < 1:
+            return
+
+        self._pages[before, after, limit] = prepared
+        if len(self._pages) > self.max_pages:
+            del self._pages[next(iter(self._pages))]
 
 
 class ServerState:
-    def __init__(self, *, message_cache: MessageCache) -> None:
+    def __init__(
+        self,
+        *,
+        message_cache: MessageCache,
+        max_message_pages: int = 16,
+    ) -> None:
         self.message_cache = message_cache
+        self.max_message_pages = max_message_pages
         self._channels: dict[str, Channel] = {}
         self._users: dict[str, User] = {}
+        self._subscribers: dict[str, set[User]] = {}
+        self._subscriptions: dict[User, set[str]] = {}
+        self._channel_tuple: tuple[Channel, ...] | None = None
+        self._channel_list: PreparedMessage | None = None
+        self._message_pages: dict[str, MessagePages] = {}
 
     @property
     def channels(self) -> tuple[Channel, ...]:
-        return tuple(self._channels.values())
+        if self._channel_tuple is None:
+            self._channel_tuple = tuple(self._channels.values())
+        return self._channel_tuple
+
+    def get_channel_list(self) -> PreparedMessage:
+        """Return the LIST_CHANNELS response for every channel.
+
+        The response is encoded once and reused until a channel
+        is added or removed.
+
+        """
+        if self._channel_list is None:
+            self._channel_list = Server.prepare_channel_list(self.channels)
+        return self._channel_list
 
     def add_channel(self, channel: Channel) -> None:
         self._channels[channel.name] = channel
+        self._subscribers.setdefault(channel.name, set())
+        self._invalidate_channels()
 
     def get_channel(self, name: str) -> Channel | None:
         return self._channels.get(name)
 
     def remove_channel(self, name: str) -> Channel | None:
-        return self._channels.pop(name, None)
+        for user in self._subscribers.pop(name, ()):
+            self._subscriptions[user].discard(name)
+        channel = self._channels.pop(name, None)
+        if channel is not None:
+            self._invalidate_channels()
+        self.message_cache.remove_channel(name)
+        self._message_pages.pop(name, None)
+        return channel
+
+    def join_channel(self, channel_name: str, user: User) -> bool:
+        """Subscribe a user to the given channel.
+
+        Returns False if the channel or user does not exist.
+
+        """
+        subscribers = self._subscribers.get(channel_name)
+        subscriptions = self._subscriptions.get(user)
+        if subscribers is None or subscriptions is None:
+            return False
+
+        subscribers.add(user)
+        subscriptions.add(channel_name)
+        return True
+
+    def part_channel(self, channel_name: str, user: User) -> None:
+        """Unsubscribe a user from the given channel."""
+        self._subscribers.get(channel_name, set()).discard(user)
+        self._subscriptions.get(user, set()).discard(channel_name)
+
+    def get_subscribers(self, channel_name: str) -> Collection[User]:
+        """Return the users subscribed to the given channel."""
+        return self._subscribers.get(channel_name, ())
+
+    def get_subscriptions(self, user: User) -> Collection[str]:
+        """Return the names of the channels a user is subscribed to."""
+        return self._subscriptions.get(user, ())
 
     def get_messages(
         self,
@@ -43,54 +161,251 @@ class ServerState:
             limit=limit,
         )
 
+    def get_message_pages(self, channel_name: str) -> MessagePages:
+        """Return the cached LIST_MESSAGES responses of a channel.
+
+        The returned pages are replaced whenever a message is added to
+        or removed from the channel, so responses put into them after
+        that point are never served. Pages are not kept for channels
+        that do not exist.
+
+        """
+        pages = self._message_pages.get(channel_name)
+        if pages is None:
+            pages = MessagePages(self.max_message_pages)
+            if channel_name in self._channels:
+                self._message_pages[channel_name] = pages
+        return pages
+
+    def get_oldest_id(self, channel_name: str) -> int | None:
+        return self.message_cache.get_oldest_id(channel_name)
+
+    def has_evicted(self, channel_name: str) -> bool:
+        return self.message_cache.has_evicted(channel_name)
+
     def add_message(self, message: Message) -> None:
+        self._message_pages.pop(message.channel_name, None)
         return self.message_cache.add_message(message)
 
     def get_message(self, channel_name: str, id: int) -> Message | None:
         return self.message_cache.get_message(channel_name, id)
 
-    def remove_message(self, channel_name: str, id: int) -> Message | None:
+    def remove_message(self, channel_name: str, id: int) -> bool:
+        self._message_pages.pop(channel_name, None)
         return self.message_cache.remove_message(channel_name, id)
 
+    def remove_messages(self, channel_name: str, ids: Iterable[int]) -> list[int]:
+        self._message_pages.pop(channel_name, None)
+        return self.message_cache.remove_messages(channel_name, ids)
+
     @property
     def users(self) -> tuple[User, ...]:
         return tuple(self._users.values())
 
     def add_user(self, user: User) -> None:
         self._users[user] = user
+        self._subscriptions.setdefault(user, set())
 
     def get_user(self, nick: str) -> User | None:
         return self._users.get(nick)
 
     def remove_user(self, nick: str) -> User | None:
+        for channel_name in self._subscriptions.pop(nick, ()):
+            self._subscribers[channel_name].discard(nick)
         return self._users.pop(nick, None)
 
+    def _invalidate_channels(self) -> None:
+        self._channel_tuple = None
+        self._channel_list = None
+
+
+class CacheEvictionPolicy(Enum):
+    """Determines which messages are evicted when the message cache
+    exceeds its byte budget.
+    """
+
+    OLDEST_FIRST = "oldest"
+    """Evict the oldest message across all channels."""
+    LRU_CHANNEL = "lru-channel"
+    """Evict the oldest message in the least recently used channel."""
+
+
+@dataclass
+class CompressionStats:
+    """Statistics about the compressed blocks in a message cache."""
+
+    blocks: int
+    """The number of compressed blocks."""
+    compressed_bytes: int
+    """The total size of every block after compression."""
+    uncompressed_bytes: int
+    """The total size of every block before compression."""
+    cache_hits: int
+    """The number of times a block was read from the block cache."""
+    cache_misses: int
+    """The number of times a block had to be decompressed."""
+
+    @property
+    def compression_ratio(self) -> float:
+        """The uncompressed size divided by the compressed size."""
+        if self.compressed_bytes == 0:
+            return 1.0
+        return self.uncompressed_bytes / self.compressed_bytes
+
+    @property
+    def cache_hit_rate(self) -> float:
+        """The fraction of block reads served by the block cache."""
+        total = self.cache_hits + self.cache_misses
+        if total == 0:
+            return 0.0
+        return self.cache_hits / total
+
 
 class MessageCache:
-    _channel_messages: dict[str, collections.deque[Message]]
+    """Caches the most recent messages of each channel.
+
+    The cache can be bounded by the number of messages per channel,
+    the total encoded size of all messages, or both. When the byte budget
+    is exceeded, messages are evicted across channels according to the
+    given eviction policy.
+
+    If columnar is True, each channel's messages are stored with
+    :class:`ColumnarChannelHistory` to reduce memory usage, at the cost
+    of creating a new :class:`Message` every time one is read.
+
+    If block_size is given, all but the newest hot_messages of each channel
+    are sealed into zlib-compressed blocks of block_size messages.
+    Up to block_cache_size decompressed blocks are kept around to serve
+    requests for older messages. See :meth:`get_compression_stats()`.
+
+    Messages can be restored from a :class:`Snapshot` with
+    :meth:`load_snapshot()`. Each channel in the snapshot is only decoded
+    when it is first accessed, and does not count towards the cache's size
+    until then.
+
+    """
+
+    _channel_messages: dict[str, History]
 
-    def __init__(self, *, max_messages: int) -> None:
+    def __init__(
+        self,
+        *,
+        max_messages: int | None,
+        max_bytes: int | None = None,
+        eviction_policy: CacheEvictionPolicy = CacheEvictionPolicy.OLDEST_FIRST,
+        columnar: bool = False,
+        block_size: int | None = None,
+        hot_messages: int = 1000,
+        block_cache_size: int = 16,
+    ) -> None:
         self.max_messages = max_messages
-        self._channel_messages = collections.defaultdict(self._create_message_queue)
+        self.max_bytes = max_bytes
+        self.eviction_policy = eviction_policy
+        self.columnar = columnar
+        self.block_size = block_size
+        self.hot_messages = hot_messages
+        self._blocks = BlockCache(block_cache_size)
+        self._channel_messages = {}
+        self._nicks = StringTable()
+        self._size = 0
+        self._evicted = 0
+
+        # Min-heap of (oldest ID, channel name), validated lazily on eviction.
+        # Entries not matching a channel's current key are discarded.
+        self._oldest: list[tuple[int, str]] = []
+        self._oldest_keys: dict[str, int] = {}
+        # Channel names ordered from least to most recently used
+        self._recent: collections.OrderedDict[str, None] = collections.OrderedDict()
+
+        self._snapshot: Snapshot | None = None
+        self._unloaded: set[str] = set()
+
+    def __len__(self) -> int:
+        return sum(len(history) for history in self._channel_messages.values())
+
+    @property
+    def size(self) -> int:
+        """The total encoded size of all cached messages in bytes."""
+        return self._size
+
+    @property
+    def evicted(self) -> int:
+        """The number of messages evicted to stay within the byte budget."""
+        return self._evicted
+
+    def get_compression_stats(self) -> CompressionStats:
+        """Return statistics about compressed blocks across all channels."""
+        blocks = compressed = uncompressed = 0
+        for history in self._channel_messages.values():
+            if isinstance(history, CompressedChannelHistory):
+                for block in history.cold_blocks:
+                    blocks += 1
+                    compressed += len(block.data)
+                    uncompressed += block.raw_size
+
+        return CompressionStats(
+            blocks=blocks,
+            compressed_bytes=compressed,
+            uncompressed_bytes=uncompressed,
+            cache_hits=self._blocks.hits,
+            cache_misses=self._blocks.misses,
+        )
+
+    def get_oldest_id(self, channel_name: str) -> int | None:
+        """Return the ID of a channel's oldest cached message,
+        or None if the channel has no cached messages.
+        """
+        history = self._get_history(channel_name)
+        if history is None:
+            return None
+        return history.oldest_id
+
+    def has_evicted(self, channel_name: str) -> bool:
+        """Return True if any of a channel's messages were ever evicted,
+        either by the per-channel limit or the byte budget.
+        """
+        history = self._get_history(channel_name)
+        return history is not None and history.evicted > 0
+
+    def get_channel_size(self, channel_name: str) -> int:
+        """Return the total encoded size of a channel's messages in bytes."""
+        history = self._get_history(channel_name)
+        if history is None:
+            return 0
+        return history.size
 
     def add_message(self, message: Message) -> None:
-        messages = self._channel_messages[message.channel_name]
+        channel_name = message.channel_name
+        if channel_name in self._unloaded:
+            self._load_channel(channel_name)
 
-        # Ensure deque isn't full before insorting it
-        messages.append(message)
-        assert messages.pop() == message
+        history = self._channel_messages.get(channel_name)
+        if history is None:
+            history = self._create_history(channel_name)
+            self._channel_messages[channel_name] = history
 
-        bisect.insort(messages, message, key=lambda m: m.id)
+        size = history.size
+        history.add_message(message)
+        self._size += history.size - size
 
-    def get_message(self, channel_name: str, id: int) -> Message | None:
-        messages = self._channel_messages[channel_name]
-        if len(messages) < 1:
-            return None
+        if self.max_bytes is None:
+            return
+
+        self._touch(channel_name)
+        if (
+            history.oldest_id == message.id
+            and self._oldest_keys.get(channel_name) != message.id
+        ):
+            self._oldest_keys[channel_name] = message.id
+            heapq.heappush(self._oldest, (message.id, channel_name))
 
-        i = self._index_message(messages, id)
-        message = messages[i]
-        if message.id == id:
-            return message
+        while self._size > self.max_bytes and self._evict():
+            pass
+
+    def get_message(self, channel_name: str, id: int) -> Message | None:
+        history = self._get_history(channel_name)
+        if history is not None:
+            return history.get_message(id)
 
     def get_messages(
         self,
@@ -100,31 +415,194 @@ class MessageCache:
         after: int | None = None,
         limit: int = 100,
     ) -> Sequence[Message]:
-        messages = list(self._channel_messages[channel_name])
-
-        if before is not None:
-            i = bisect.bisect_left(messages, before, key=lambda m: m.id)
-            messages = messages[i:]
-
-        if after is not None:
-            i = bisect.bisect_right(messages, after, key=lambda m: m.id)
-            messages = messages[:i]
-
-        return messages[-limit:]
-
-    def remove_message(self, channel_name: str, id: int) -> Message | None:
-        messages = self._channel_messages[channel_name]
-        if len(messages) < 1:
-            return None
-
-        i = self._index_message(messages, id)
-        message = messages[i]
-        if message.id == id:
-            del messages[i]
-            return message
-
-    def _create_message_queue(self) -> collections.deque[Message]:
-        return collections.deque(maxlen=self.max_messages)
+        history = self._get_history(channel_name)
+        if history is None:
+            return []
+
+        if self.max_bytes is not None:
+            self._touch(channel_name)
+        return history.get_messages(before=before, after=after, limit=limit)
+
+    def remove_message(self, channel_name: str, id: int) -> bool:
+        """Remove a message from a channel, returning True if it existed."""
+        history = self._get_history(channel_name)
+        if history is None:
+            return False
+
+        size = history.size
+        removed = history.remove_message(id)
+        self._size -= size - history.size
+        return removed
+
+    def remove_messages(self, channel_name: str, ids: Iterable[int]) -> list[int]:
+        """Remove multiple messages from a channel at once.
+
+        Returns the IDs of the messages that were removed.
+
+        """
+        history = self._get_history(channel_name)
+        if history is None:
+            return []
+
+        size = history.size
+        removed = history.remove_messages(ids)
+        self._size -= size - history.size
+        return removed
+
+    def remove_channel(self, channel_name: str) -> None:
+        """Discard every message cached for a channel."""
+        self._unloaded.discard(channel_name)
+        if len(self._unloaded) == 0:
+            self.close()
+
+        history = self._channel_messages.pop(channel_name, None)
+        self._oldest_keys.pop(channel_name, None)
+        self._recent.pop(channel_name, None)
+        if history is None:
+            return
+
+        # Give back the nicks and compressed blocks shared with other channels
+        self._size -= history.size
+        while history.evict_oldest() is not None:
+            pass
+
+    def load_snapshot(self, snapshot: Snapshot) -> None:
+        """Lazily load messages from the given snapshot.
+
+        The cache takes ownership of the snapshot, closing it once every
+        channel has been loaded or when :meth:`close()` is called.
+
+        """
+        self.close()
+        self._snapshot = snapshot
+        self._unloaded = set(snapshot.channels)
+        if len(self._unloaded) == 0:
+            self.close()
+
+    def write_snapshot(self, path: str | os.PathLike) -> None:
+        """Write all cached messages to a snapshot at the given path.
+
+        Channels that have not been loaded from the current snapshot
+        are copied over without being decoded.
+
+        """
+        with SnapshotWriter(path) as writer:
+            for channel_name, history in self._channel_messages.items():
+                if len(history) > 0:
+                    messages = history.get_messages(limit=len(history))
+                    writer.add_messages(channel_name, messages)
+
+            if self._snapshot is not None:
+                for channel_name in self._unloaded:
+                    data = self._snapshot.read_raw(channel_name)
+                    count = self._snapshot.channels[channel_name].count
+                    writer.add_raw(channel_name, data, count)
+
+                # The current snapshot may be the one being replaced
+                self._snapshot.close()
+                self._snapshot = None
+
+        if len(self._unloaded) > 0:
+            self._snapshot = Snapshot.open(path)
+
+    def close(self) -> None:
+        """Close the current snapshot, discarding any channels not yet loaded."""
+        if self._snapshot is not None:
+            self._snapshot.close()
+            self._snapshot = None
+        self._unloaded.clear()
+
+    def _get_history(self, channel_name: str) -> History | None:
+        if channel_name in self._unloaded:
+            self._load_channel(channel_name)
+        return self._channel_messages.get(channel_name)
+
+    def _load_channel(self, channel_name: str) -> None:
+        assert self._snapshot is not None
+        self._unloaded.discard(channel_name)
+
+        try:
+            messages = self._snapshot.read_messages(channel_name)
+        except ValueError:
+            log.exception("Failed to load %r from snapshot", channel_name)
+            messages = []
+
+        if len(self._unloaded) == 0:
+            self.close()
+
+        for message in messages:
+            self.add_message(message)
+
+    def _create_history(self, channel_name: str) -> History:
+        if self.block_size is None:
+            return self._create_hot_history(channel_name, self.max_messages)
+
+        return CompressedChannelHistory(
+            self._create_hot_history(channel_name, None),
+            max_messages=self.max_messages,
+            block_size=self.block_size,
+            hot_messages=self.hot_messages,
+            blocks=self._blocks,
+        )
 
-    def _index_message(self, messages: Sequence[Message], id: int) -> int:
-        return bisect.bisect_left(messages, id, key=lambda m: m.id)
+    def _create_hot_history(
+        self,
+        channel_name: str,
+        max_messages: int | None,
+    ) -> ChannelHistory | ColumnarChannelHistory:
+        if self.columnar:
+            return ColumnarChannelHistory(
+                channel_name,
+                max_messages=max_messages,
+                nicks=self._nicks,
+            )
+        return ChannelHistory(max_messages=max_messages)
+
+    def _touch(self, channel_name: str) -> None:
+        if self.eviction_policy == CacheEvictionPolicy.LRU_CHANNEL:
+            self._recent[channel_name] = None
+            self._recent.move_to_end(channel_name)
+
+    def _evict(self) -> bool:
+        if self.eviction_policy == CacheEvictionPolicy.LRU_CHANNEL:
+            history = self._pop_least_recent()
+        else:
+            history = self._pop_oldest()
+
+        if history is None:
+            return False
+
+        size = history.size
+        history.evict_oldest()
+        self._size -= size - history.size
+        self._evicted += 1
+        return True
+
+    def _pop_least_recent(self) -> History | None:
+        while len(self._recent) > 0:
+            channel_name = next(iter(self._recent))
+            history = self._channel_messages.get(channel_name)
+            if history is not None and len(history) > 0:
+                return history
+
+            # Forget channels with nothing left to evict
+            del self._recent[channel_name]
+
+    def _pop_oldest(self) -> History | None:
+        while len(self._oldest) > 0:
+            id, channel_name = self._oldest[0]
+            if self._oldest_keys.get(channel_name) != id:
+                heapq.heappop(self._oldest)  # Superseded by a newer entry
+                continue
+
+            history = self._channel_messages[channel_name]
+            oldest_id = history.oldest_id
+            if oldest_id is None:
+                heapq.heappop(self._oldest)
+                del self._oldest_keys[channel_name]
+            elif oldest_id != id:
+                # The oldest message was evicted or removed since this entry
+                self._oldest_keys[channel_name] = oldest_id
+                heapq.heapreplace(self._oldest, (oldest_id, channel_name))
+            else:
+                return history
@@ -0,0 +1,202 @@
+import asyncio
+import concurrent.futures
+import contextlib
+import logging
+from typing import AsyncIterator, Callable, Iterable, Iterator, Self, TypeVar
+
+from dumdum.db import Connection, SQLiteConnection, run_migrations
+from dumdum.protocol import Message
+
+T = TypeVar("T")
+
+log = logging.getLogger(__name__)
+
+
+class ServerStore:
+    """Persists server messages to a database."""
+
+    def __init__(self, conn: Connection) -> None:
+        self._conn = conn
+
+    @contextlib.contextmanager
+    def transaction(self) -> Iterator[Self]:
+        with self._conn.transaction():
+            yield self
+
+    def add_messages(self, messages: Iterable[Message]) -> None:
+        """Insert messages, replacing any existing messages with the same ID."""
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO message (id, channel_name, nick, content) "
+            "VALUES (?, ?, ?, ?)",
+            ((m.id, m.channel_name, m.nick, m.content) for m in messages),
+        )
+
+    def get_messages(
+        self,
+        channel_name: str,
+        *,
+        before: int | None = None,
+        after: int | None = None,
+        limit: int = 100,
+    ) -> list[Message]:
+        rows = self._conn.fetchall(
+            "SELECT id, channel_name, nick, content FROM message "
+            "WHERE channel_name = ?1 "
+            "AND (?2 IS NULL OR id >= ?2) AND (?3 IS NULL OR id <= ?3) "
+            "ORDER BY id DESC LIMIT ?4",
+            channel_name,
+            before,
+            after,
+            limit,
+        )
+        return [Message(*row) for row in reversed(rows)]
+
+    def remove_messages(self, channel_name: str, ids: Iterable[int]) -> None:
+        self._conn.executemany(
+            "DELETE FROM message WHERE channel_name = ? AND id = ?",
+            ((channel_name, id) for id in ids),
+        )
+
+    @classmethod
+    @contextlib.contextmanager
+    def connect(cls, path: str) -> Iterator[Self]:
+        with SQLiteConnection.connect(path) as conn:
+            with conn.transaction():
+                run_migrations(conn, "server")
+
+            yield cls(conn)
+
+
+class MessageStore:
+    """Writes messages to a :class:`ServerStore` in the background.
+
+    New messages are buffered in memory and inserted in a single transaction
+    every flush interval, or sooner once the batch size is reached.
+    All database access happens on one worker thread so the event loop
+    never waits on disk.
+
+    Use :meth:`open()` to create a message store.
+
+    """
+
+    _store: ServerStore
+
+    def __init__(
+        self,
+        executor: concurrent.futures.ThreadPoolExecutor,
+        *,
+        flush_interval: float,
+        batch_size: int,
+    ) -> None:
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+
+        self._executor = executor
+        self._pending: list[Message] = []
+        self._wakeup = asyncio.Event()
+
+    @property
+    def pending(self) -> int:
+        """The number of messages waiting to be written."""
+        return len(self._pending)
+
+    def add_message(self, message: Message) -> None:
+        """Queue a message to be written in the next batch."""
+        self._pending.append(message)
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def get_messages(
+        self,
+        channel_name: str,
+        *,
+        before: int | None = None,
+        after: int | None = None,
+        limit: int = 100,
+    ) -> list[Message]:
+        # Submit pending messages first so the query can see them
+        await self.flush()
+        return await self._run(
+            lambda: self._store.get_messages(
+                channel_name,
+                before=before,
+                after=after,
+                limit=limit,
+            )
+        )
+
+    async def remove_messages(self, channel_name: str, ids: Iterable[int]) -> None:
+        ids = set(ids)
+        self._pending = [
+            m
+            for m in self._pending
+            if m.channel_name != channel_name or m.id not in ids
+        ]
+        await self._run(lambda: self._remove_messages(channel_name, ids))
+
+    async def flush(self) -> None:
+        """Write all pending messages to the database."""
+        if len(self._pending) == 0:
+            return
+
+        messages, self._pending = self._pending, []
+        try:
+            await self._run(lambda: self._add_messages(messages))
+        except Exception:
+            log.exception("Failed to write %d messages", len(messages))
+        else:
+            log.debug("Wrote %d messages", len(messages))
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+
+            self._wakeup.clear()
+            await self.flush()
+
+    def _add_messages(self, messages: list[Message]) -> None:
+        with self._store.transaction():
+            self._store.add_messages(messages)
+
+    def _remove_messages(self, channel_name: str, ids: Iterable[int]) -> None:
+        with self._store.transaction():
+            self._store.remove_messages(channel_name, ids)
+
+    async def _run(self, func: Callable[[], T]) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func)
+
+    @classmethod
+    @contextlib.asynccontextmanager
+    async def open(
+        cls,
+        path: str,
+        *,
+        flush_interval: float = 1,
+        batch_size: int = 1000,
+    ) -> AsyncIterator[Self]:
+        """Open the database at the given path and start writing messages.
+
+        Pending messages are flushed before the database is closed.
+
+        """
+        with (
+            concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor,
+            contextlib.ExitStack() as stack,
+        ):
+            self = cls(executor, flush_interval=flush_interval, batch_size=batch_size)
+            # SQLite connections can only be used by the thread that created them
+            self._store = await self._run(
+                lambda: stack.enter_context(ServerStore.connect(path))
+            )
+
+            flush_task = asyncio.create_task(self._flush_periodically())
+            try:
+                yield self
+            finally:
+                flush_task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await flush_task
+                await self.flush()
+                await self._run(stack.close)
@@ -0,0 +1,392 @@
+"""An append-only log of posted and deleted messages.
+
+The log is split into segment files which are rolled over once they reach
+a given size. Each record in a segment is stored as:
+
+    [u8]  Record type
+    [u32] Payload length
+    [u32] CRC-32 of the payload
+    [...] Payload
+
+Message records contain the message in its wire format, and delete records
+contain the message ID followed by the channel name as a varchar.
+
+"""
+
+import asyncio
+import collections
+import concurrent.futures
+import contextlib
+import logging
+import os
+import struct
+import threading
+import zlib
+from dataclasses import dataclass
+from enum import Enum, IntEnum
+from pathlib import Path
+from typing import Iterable, Iterator, Self, Sequence
+
+from dumdum.protocol import MalformedDataError, Message, varchar
+from dumdum.protocol.constants import MAX_CHANNEL_NAME_LENGTH
+from dumdum.protocol.reader import byte_reader
+
+from .history import get_message_size
+
+log = logging.getLogger(__name__)
+
+RECORD_HEADER = struct.Struct(">BII")
+SEGMENT_SUFFIX = ".wal"
+
+
+class FsyncPolicy(Enum):
+    """Determines how often the message log is flushed to disk."""
+
+    ALWAYS = "always"
+    """Sync after every write, blocking until it is written to disk."""
+    INTERVAL = "interval"
+    """Sync in the background once per interval. At most one interval
+    of records can be lost if the machine crashes."""
+    OS = "os"
+    """Leave syncing to the operating system."""
+
+
+class RecordType(IntEnum):
+    MESSAGE = 1
+    DELETE = 2
+
+
+_Record = tuple[RecordType, bytes, str | None]
+
+
+@dataclass(frozen=True)
+class DeletedMessage:
+    """A record of a message being deleted."""
+
+    channel_name: str
+    id: int
+
+
+@dataclass
+class _Segment:
+    path: Path
+    # The number of messages logged per channel, or None if not yet recovered
+    channel_counts: collections.Counter[str] | None
+    # The encoded size of the messages logged per channel
+    channel_bytes: collections.Counter[str]
+
+
+class MessageLog:
+    """An append-only log of messages split into segment files.
+
+    Segments are compacted once every channel has at least ``max_messages``
+    newer messages, or ``max_bytes`` of newer messages, in later segments.
+    Since the message cache always evicts a channel's oldest messages first,
+    those segments can no longer contain cached messages. Only the oldest
+    segments are removed, so a channel that stops receiving messages keeps
+    its segments around.
+
+    Use :meth:`open()` to create a message log, then iterate through
+    :meth:`recover()` to read back any existing records. Segments that
+    have not been recovered are never compacted. Records should be written
+    with :meth:`append_messages()` and :meth:`append_deletes()`, which write
+    on a worker thread so that syncing, rolling over segments and compaction
+    never block the event loop.
+
+    """
+
+    def __init__(
+        self,
+        directory: str | os.PathLike,
+        *,
+        fsync_policy: FsyncPolicy = FsyncPolicy.INTERVAL,
+        fsync_interval: float = 0.1,
+        segment_size: int = 2**26,
+        max_messages: int | None = None,
+        max_bytes: int | None = None,
+    ) -> None:
+        self.directory = Path(directory)
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self.segment_size = segment_size
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+
+        self._segments = [
+            _Segment(path, None, collections.Counter())
+            for path in sorted(self.directory.glob(f"*{SEGMENT_SUFFIX}"))
+        ]
+        self._next_segment = self._get_next_segment_number()
+        self._active: _Segment | None = None
+        self._file: int | None = None
+        self._active_size = 0
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._executor: concurrent.futures.ThreadPoolExecutor | None = None
+
+    def recover(self) -> Iterator[Message | DeletedMessage]:
+        """Read every record in the existing segments.
+
+        Segments ending with an incomplete or corrupted record are truncated
+        to the last valid record.
+
+        """
+        for segment in [s for s in self._segments if s.channel_counts is None]:
+            counts: collections.Counter[str] = collections.Counter()
+            for record in self._read_segment(segment.path):
+                if isinstance(record, Message):
+                    counts[record.channel_name] += 1
+                    segment.channel_bytes[record.channel_name] += get_message_size(
+                        record
+                    )
+                yield record
+
+            segment.channel_counts = counts
+
+    def append_message(self, message: Message) -> None:
+        """Append a message to the log."""
+        self._append([self._message_record(message)])
+
+    def append_delete(self, channel_name: str, id: int) -> None:
+        """Append a record of a message being deleted to the log."""
+        self._append([self._delete_record(channel_name, id)])
+
+    async def append_messages(self, messages: Sequence[Message]) -> None:
+        """Append messages to the log without blocking the event loop."""
+        await self._append_async([self._message_record(m) for m in messages])
+
+    async def append_deletes(self, channel_name: str, ids: Iterable[int]) -> None:
+        """Append records of messages being deleted to the log
+        without blocking the event loop.
+        """
+        await self._append_async([self._delete_record(channel_name, id) for id in ids])
+
+    def sync(self) -> None:
+        """Flush any unsynced records to disk."""
+        with self._lock:
+            if self._file is None or not self._dirty:
+                return
+
+            # Sync a duplicate so the active segment can roll over meanwhile
+            fd = os.dup(self._file)
+            self._dirty = False
+
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_segment()
+
+    @staticmethod
+    def _message_record(message: Message) -> _Record:
+        return RecordType.MESSAGE, bytes(message), message.channel_name
+
+    @staticmethod
+    def _delete_record(channel_name: str, id: int) -> _Record:
+        payload = id.to_bytes(8, byteorder="big") + varchar.dumps(
+            channel_name,
+            max_length=MAX_CHANNEL_NAME_LENGTH,
+        )
+        return RecordType.DELETE, payload, None
+
+    async def _append_async(self, records: list[_Record]) -> None:
+        if len(records) == 0:
+            return
+        elif self._executor is None:
+            # Not opened with open(), so there is no worker to write on
+            self._append(records)
+            return
+
+        # Records are written in submission order by the single worker
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._append, records)
+
+    def _append(self, records: list[_Record]) -> None:
+        with self._lock:
+            for type, payload, channel_name in records:
+                self._write_record(type, payload, channel_name)
+
+            # Sync once per write, even if it spans several records
+            if self.fsync_policy == FsyncPolicy.ALWAYS and self._file is not None:
+                os.fsync(self._file)
+                self._dirty = False
+
+    def _write_record(
+        self,
+        type: RecordType,
+        payload: bytes,
+        channel_name: str | None,
+    ) -> None:
+        header = RECORD_HEADER.pack(type, len(payload), zlib.crc32(payload))
+        record = header + payload
+
+        if self._file is None:
+            self._open_segment()
+        assert self._active is not None and self._file is not None
+
+        view = memoryview(record)
+        while len(view) > 0:
+            view = view[os.write(self._file, view) :]
+
+        self._active_size += len(record)
+        self._dirty = True
+        if channel_name is not None:
+            assert self._active.channel_counts is not None
+            self._active.channel_counts[channel_name] += 1
+            self._active.channel_bytes[channel_name] += len(payload)
+
+        if self._active_size >= self.segment_size:
+            self._close_segment()
+            self._compact()
+
+    def _open_segment(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{self._next_segment:08d}{SEGMENT_SUFFIX}"
+        self._next_segment += 1
+
+        self._file = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._active = _Segment(path, collections.Counter(), collections.Counter())
+        self._active_size = 0
+        self._segments.append(self._active)
+
+    def _close_segment(self) -> None:
+        if self._file is None:
+            return
+
+        if self.fsync_policy != FsyncPolicy.OS:
+            os.fsync(self._file)
+        os.close(self._file)
+        self._file = None
+        self._active = None
+        self._dirty = False
+
+    def _compact(self) -> None:
+        if self.max_messages is None and self.max_bytes is None:
+            return
+
+        # Count how many newer messages each channel has after each segment
+        newer: collections.Counter[str] = collections.Counter()
+        newer_bytes: collections.Counter[str] = collections.Counter()
+        obsolete = [False] * len(self._segments)
+        for i in range(len(self._segments) - 1, -1, -1):
+            segment = self._segments[i]
+            counts = segment.channel_counts
+            if counts is None:
+                break
+
+            obsolete[i] = all(
+                self.max_messages is not None
+                and newer[c] >= self.max_messages
+                or self.max_bytes is not None
+                and newer_bytes[c] >= self.max_bytes
+                for c in counts
+            )
+            newer.update(counts)
+            newer_bytes.update(segment.channel_bytes)
+
+        # Delete records may refer to messages in any earlier segment,
+        # so only the oldest segments can be removed
+        while len(self._segments) > 0 and obsolete[0]:
+            segment = self._segments.pop(0)
+            obsolete.pop(0)
+            segment.path.unlink(missing_ok=True)
+            log.debug("Compacted message log segment %s", segment.path.name)
+
+    def _read_segment(self, path: Path) -> Iterator[Message | DeletedMessage]:
+        data = path.read_bytes()
+        offset = 0
+
+        while offset < len(data):
+            try:
+                record, size = self._parse_record(data, offset)
+            except ValueError as e:
+                log.warning(
+                    "Truncating message log segment %s at byte %d: %s",
+                    path.name,
+                    offset,
+                    e,
+                )
+                with open(path, "r+b") as f:
+                    f.truncate(offset)
+                return
+
+            offset += size
+            yield record
+
+    @staticmethod
+    def _parse_record(data: bytes, offset: int) -> tuple[Message | DeletedMessage, int]:
+        try:
+            type, length, checksum = RECORD_HEADER.unpack_from(data, offset)
+        except struct.error as e:
+            raise ValueError("Incomplete record header") from e
+
+        start = offset + RECORD_HEADER.size
+        payload = data[start : start + length]
+        if len(payload) != length:
+            raise ValueError("Incomplete record payload")
+        if zlib.crc32(payload) != checksum:
+            raise ValueError("Checksum mismatch")
+
+        with byte_reader(payload) as reader:
+            try:
+                if type == RecordType.MESSAGE:
+                    record = Message.from_reader(reader)
+                elif type == RecordType.DELETE:
+                    id = reader.read_bigint()
+                    name = reader.read_varchar(max_length=MAX_CHANNEL_NAME_LENGTH)
+                    record = DeletedMessage(name, id)
+                else:
+                    raise ValueError(f"Unknown record type {type}")
+            except (IndexError, MalformedDataError, UnicodeDecodeError) as e:
+                raise ValueError("Malformed record payload") from e
+
+        return record, RECORD_HEADER.size + length
+
+    def _get_next_segment_number(self) -> int:
+        numbers = [int(s.path.stem) for s in self._segments if s.path.stem.isdigit()]
+        return max(numbers, default=0) + 1
+
+    def _sync_periodically(self, stop: threading.Event) -> None:
+        while not stop.wait(self.fsync_interval):
+            try:
+                self.sync()
+            except OSError:
+                log.exception("Failed to sync message log")
+
+    @classmethod
+    @contextlib.contextmanager
+    def open(cls, directory: str | os.PathLike, **kwargs) -> Iterator[Self]:
+        """Open a message log in the given directory.
+
+        Any additional keyword arguments are passed to :class:`MessageLog`.
+
+        """
+        self = cls(directory, **kwargs)
+        stop = threading.Event()
+        thread = None
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix="dumdum-wal-write",
+        )
+        if self.fsync_policy == FsyncPolicy.INTERVAL:
+            thread = threading.Thread(
+                target=self._sync_periodically,
+                args=(stop,),
+                name="dumdum-wal-sync",
+                daemon=True,
+            )
+            thread.start()
+
+        try:
+            yield self
+        finally:
+            stop.set()
+            if thread is not None:
+                thread.join()
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+            self.close()
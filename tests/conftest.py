@@ -0,0 +1,5 @@
+from dumdum.protocol import Message
+
+
+def create_message(id: int, channel_name: str = "general") -> Message:
+    return Message(id, channel_name, "thegamecracks", f"Message #{id}")
@@ -0,0 +1,382 @@
+import asyncio
+import contextlib
+import ssl
+from pathlib import Path
+from ssl import SSLContext
+from typing import AsyncIterator, TypeVar
+
+from conftest import create_message
+
+from dumdum.protocol import (
+    Channel,
+    Client,
+    ClientEvent,
+    ClientEventAuthentication,
+    ClientEventHello,
+    ClientEventMessageReceived,
+    ClientEventMessagesListed,
+    ClientEventSynced,
+    ClientEventThrottled,
+    CompressionType,
+    Message,
+)
+from dumdum.server import Manager, ServerState, SlowConsumerPolicy
+from dumdum.server.manager import MESSAGE_PAGE_SIZE
+from dumdum.server.ratelimit import RateLimit
+from dumdum.server.state import MessageCache
+from dumdum.server.wal import DeletedMessage, MessageLog
+
+T = TypeVar("T", bound=ClientEvent)
+
+CERTIFICATE = Path(__file__).parent / "localhost.pem"
+
+
+def create_state(*channel_names: str) -> ServerState:
+    state = ServerState(message_cache=MessageCache(max_messages=100))
+    for name in channel_names or ("general",):
+        state.add_channel(Channel(name))
+    return state
+
+
+@contextlib.asynccontextmanager
+async def serve(manager: Manager) -> AsyncIterator[int]:
+    server = await asyncio.start_server(manager.accept_connection, "127.0.0.1", 0)
+    async with server:
+        yield server.sockets[0].getsockname()[1]
+
+
+class Peer:
+    """A client connected to a manager over TCP."""
+
+    def __init__(
+        self,
+        client: Client,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        self.client = client
+        self.reader = reader
+        self.writer = writer
+        self.events: list[ClientEvent] = []
+        self.hello: ClientEventHello | None = None
+
+    @classmethod
+    async def connect(
+        cls,
+        port: int,
+        client: Client,
+        ssl: SSLContext | None = None,
+    ) -> "Peer":
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        peer = cls(client, reader, writer)
+        peer.send(client.hello())
+        peer.hello = await peer.receive(ClientEventHello)
+        if ssl is not None:
+            await writer.start_tls(ssl, server_hostname="localhost")
+        peer.send(client.authenticate())
+        await peer.receive(ClientEventAuthentication)
+        return peer
+
+    def send(self, data: bytes) -> None:
+        self.writer.write(data)
+
+    async def receive(self, event_type: type[T]) -> T:
+        """Read from the server until an event of the given type is received."""
+        while True:
+            for i, event in enumerate(self.events):
+                if isinstance(event, event_type):
+                    del self.events[i]
+                    return event
+
+            data = await asyncio.wait_for(self.reader.read(65536), 5)
+            if len(data) == 0:
+                raise EOFError("Server closed the connection")
+
+            events, outgoing = self.client.receive_bytes(data)
+            self.events.extend(events)
+            self.writer.write(outgoing)
+
+    async def close(self) -> None:
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+def test_manager_remove_messages(tmp_path):
+    state = create_state()
+    for i in range(1, 4):
+        state.add_message(create_message(i))
+
+    with MessageLog.open(tmp_path) as wal:
+        manager = Manager(state, None, message_log=wal)
+        removed = asyncio.run(manager.remove_messages("general", [1, 3]))
+        assert removed == [1, 3]
+
+    assert [m.id for m in state.get_messages("general")] == [2]
+    with MessageLog.open(tmp_path) as wal:
+        assert list(wal.recover()) == [
+            DeletedMessage("general", 1),
+            DeletedMessage("general", 3),
+        ]
+
+
+def test_manager_sync():
+    state = create_state("general", "memes")
+    messages = [
+        create_message(1),
+        create_message(2),
+        create_message(3, channel_name="memes"),
+    ]
+    for message in messages:
+        state.add_message(message)
+
+    async def main():
+        async with serve(Manager(state, None)) as port:
+            peer = await Peer.connect(port, Client("thegamecracks"))
+            peer.send(peer.client.sync({"general": 1}, join=True))
+            event = await peer.receive(ClientEventSynced)
+            assert "thegamecracks" in state.get_subscribers("general")
+            await peer.close()
+        return event
+
+    event = asyncio.run(main())
+    assert event == ClientEventSynced(list(state.channels), messages[1:])
+    # Each channel's page is cached for the next sync
+    pages = state.get_message_pages("general")
+    assert pages.get(before=2, after=None, limit=MESSAGE_PAGE_SIZE) is not None
+
+
+def test_manager_sync_exceeding_buffer():
+    # Every channel is sent in its own frame, so the response as a whole
+    # can exceed both the client's buffer and the outbound queue limit
+    names = [f"channel-{i}" for i in range(12)]
+    state = create_state(*names)
+    messages = [
+        Message(i, name, "thegamecracks", "a" * 1000)
+        for name in names
+        for i in range(1, MESSAGE_PAGE_SIZE + 1)
+    ]
+    for message in messages:
+        state.add_message(message)
+
+    async def main():
+        async with serve(Manager(state, None)) as port:
+            peer = await Peer.connect(port, Client("thegamecracks"))
+            peer.send(peer.client.sync())
+            event = await peer.receive(ClientEventSynced)
+            await peer.close()
+        return event
+
+    event = asyncio.run(main())
+    assert sum(len(m.content) for m in event.messages) > 2**20
+    assert event.messages == messages
+
+
+def test_manager_message_pages_cached():
+    state = create_state()
+    for i in range(1, 4):
+        state.add_message(create_message(i))
+
+    async def main():
+        async with serve(Manager(state, None)) as port:
+            peer = await Peer.connect(port, Client("thegamecracks"))
+            peer.send(peer.client.list_messages("general"))
+            first = await peer.receive(ClientEventMessagesListed)
+            page = pages.get(before=None, after=None, limit=MESSAGE_PAGE_SIZE)
+
+            # Syncs without a watermark share the same page
+            peer.send(peer.client.sync())
+            synced = await peer.receive(ClientEventSynced)
+            await peer.close()
+        return first, page, synced
+
+    pages = state.get_message_pages("general")
+    first, page, synced = asyncio.run(main())
+    assert page is not None
+    assert pages.get(before=None, after=None, limit=MESSAGE_PAGE_SIZE) is page
+    assert first.messages == synced.messages == state.get_messages("general")
+
+
+def test_manager_throttle():
+    state = create_state()
+
+    async def main():
+        manager = Manager(state, None, channel_rate_limit=RateLimit(1, burst=1))
+        async with serve(manager) as port:
+            peer = await Peer.connect(port, Client("thegamecracks"))
+            peer.send(peer.client.send_message("general", "Hello world!"))
+            peer.send(peer.client.send_message("general", "Hello again!"))
+            event = await peer.receive(ClientEventThrottled)
+            await peer.close()
+        return event
+
+    event = asyncio.run(main())
+    assert event.channel_name == "general"
+    assert 0 < event.retry_after <= 1
+    assert [m.content for m in state.get_messages("general")] == ["Hello world!"]
+
+
+def test_manager_throttle_batch():
+    state = create_state()
+
+    async def main():
+        manager = Manager(state, None, channel_rate_limit=RateLimit(2, burst=1))
+        async with serve(manager) as port:
+            peer = await Peer.connect(port, Client("thegamecracks"))
+            peer.send(peer.client.send_message("general", "a"))
+            peer.send(peer.client.send_messages("general", ["b", "c"]))
+            event = await peer.receive(ClientEventThrottled)
+            await peer.close()
+        return event
+
+    # None of a batch is accepted if it would exceed the rate limit
+    event = asyncio.run(main())
+    assert event.channel_name == "general"
+    assert [m.content for m in state.get_messages("general")] == ["a"]
+
+
+def test_manager_remove_channel():
+    state = create_state()
+
+    async def main():
+        manager = Manager(state, None, channel_rate_limit=RateLimit(1, burst=1))
+        async with serve(manager) as port:
+            peer = await Peer.connect(port, Client("thegamecracks"))
+            peer.send(peer.client.send_message("general", "Hello world!"))
+            peer.send(peer.client.send_message("general", "Hello again!"))
+            await peer.receive(ClientEventThrottled)
+
+            # A channel re-created with the same name starts over
+            manager.remove_channel("general")
+            state.add_channel(Channel("general"))
+            peer.send(peer.client.send_message("general", "Hello there!"))
+            peer.send(peer.client.send_message("general", "Hello again!"))
+            await peer.receive(ClientEventThrottled)
+            await peer.close()
+
+    asyncio.run(main())
+    assert [m.content for m in state.get_messages("general")] == ["Hello there!"]
+
+
+def test_manager_compression():
+    state = create_state()
+    for i in range(1, 4):
+        state.add_message(create_message(i))
+
+    async def main(compression: bool) -> Peer:
+        manager = Manager(state, None, compression=compression)
+        async with serve(manager) as port:
+            client = Client("thegamecracks", compression=CompressionType.ZLIB)
+            peer = await Peer.connect(port, client)
+            peer.send(client.list_messages("general"))
+            listed = await peer.receive(ClientEventMessagesListed)
+            assert listed.messages == state.get_messages("general")
+            await peer.close()
+        return peer
+
+    peer = asyncio.run(main(compression=True))
+    assert peer.hello == ClientEventHello(False, CompressionType.ZLIB)
+    assert peer.client.compression_stats is not None
+
+    peer = asyncio.run(main(compression=False))
+    assert peer.hello == ClientEventHello(False, CompressionType.NONE)
+    assert peer.client.compression_stats is None
+
+
+def test_manager_compression_drop_oldest():
+    state = create_state()
+
+    async def main():
+        manager = Manager(
+            state,
+            None,
+            outbound_high_watermark=128,
+            outbound_low_watermark=64,
+            slow_consumer_policy=SlowConsumerPolicy.DROP_OLDEST,
+            compression_threshold=0,
+        )
+        async with serve(manager) as port:
+            compression = CompressionType.ZLIB
+            receiver = await Peer.connect(
+                port, Client("receiver", compression=compression)
+            )
+            receiver.send(receiver.client.sync(join=True))
+            await receiver.receive(ClientEventSynced)
+
+            # Broadcasts handled in one read overflow the receiver's queue
+            sender = await Peer.connect(port, Client("sender"))
+            sender.send(
+                b"".join(
+                    sender.client.send_message("general", f"Message #{i}")
+                    for i in range(20)
+                )
+            )
+
+            received: list[Message] = []
+            while len(received) == 0 or received[-1].content != "Message #19":
+                event = await receiver.receive(ClientEventMessageReceived)
+                received.append(event.message)
+
+            dropped = manager.connections_by_nick["receiver"].outbound.dropped
+            await sender.close()
+            await receiver.close()
+        return received, dropped
+
+    received, dropped = asyncio.run(main())
+    assert dropped > 0
+    assert len(received) == 20 - dropped
+    assert received == sorted(received, key=lambda m: m.id)
+
+
+def test_manager_logs_messages_before_caching(tmp_path):
+    state = create_state()
+    cached_during_append: list[list[Message]] = []
+
+    class InspectedMessageLog(MessageLog):
+        async def append_messages(self, messages):
+            cached_during_append.append(list(state.get_messages("general")))
+            await super().append_messages(messages)
+
+    async def main():
+        with InspectedMessageLog.open(tmp_path) as wal:
+            async with serve(Manager(state, None, message_log=wal)) as port:
+                peer = await Peer.connect(port, Client("thegamecracks"))
+                peer.send(peer.client.sync(join=True))
+                await peer.receive(ClientEventSynced)
+                peer.send(peer.client.send_message("general", "Hello world!"))
+                event = await peer.receive(ClientEventMessageReceived)
+                await peer.close()
+        return event
+
+    event = asyncio.run(main())
+    assert cached_during_append == [[]]
+    assert state.get_messages("general") == [event.message]
+
+
+def test_manager_tls():
+    state = create_state()
+    for i in range(1, 4):
+        state.add_message(create_message(i))
+
+    server_ssl = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    server_ssl.load_cert_chain(CERTIFICATE)
+    client_ssl = ssl.create_default_context(cafile=CERTIFICATE)
+
+    async def main():
+        manager = Manager(state, server_ssl, outbound_low_watermark=4096)
+        async with serve(manager) as port:
+            peer = await Peer.connect(port, Client("thegamecracks"), client_ssl)
+            assert peer.hello == ClientEventHello(True)
+
+            peer.send(peer.client.list_messages("general"))
+            listed = await peer.receive(ClientEventMessagesListed)
+
+            # The TLS transport must keep tracking the outbound watermarks
+            conn = manager.connections_by_nick["thegamecracks"]
+            assert conn.writer.get_extra_info("ssl_object") is not None
+            _, high = conn.writer.transport.get_write_buffer_limits()
+            await peer.close()
+        return listed, high
+
+    listed, high = asyncio.run(main())
+    assert listed.messages == state.get_messages("general")
+    assert high == 4096
@@ -0,0 +1,83 @@
+import pytest
+
+from dumdum.server import OutboundQueue
+
+
+def test_outbound_queue_watermarks():
+    queue = OutboundQueue(high_watermark=10, low_watermark=5)
+
+    queue.put(b"Hello")
+    queue.put(b"world!")
+    assert len(queue) == 2
+    assert queue.size == 11
+    assert queue.paused
+
+    assert queue.pop_all() == [b"Hello", b"world!"]
+    assert queue.size == 0
+    assert queue.buffered == 11
+    assert queue.paused
+
+    queue.set_buffered(0)
+    assert not queue.paused
+
+
+def test_outbound_queue_counts_buffered_data():
+    queue = OutboundQueue(high_watermark=10, low_watermark=5)
+
+    queue.put(b"Hello")
+    queue.pop_all()
+    queue.set_buffered(6)
+    assert not queue.paused
+
+    queue.put(b"world")
+    assert queue.size == 5
+    assert queue.paused
+
+    queue.pop_all()
+    queue.set_buffered(5)
+    assert not queue.paused
+
+
+def test_outbound_queue_drop_oldest():
+    queue = OutboundQueue(high_watermark=10, low_watermark=9)
+
+    queue.put(b"Hello", droppable=True)
+    queue.put(b"world!")
+    queue.put(b"foo", droppable=True)
+    queue.put(b"bar", droppable=True)
+    assert queue.size == 17
+
+    # Only "Hello" and "foo" need to be dropped, and "world!" can't be dropped
+    assert queue.drop_oldest() == 2
+    assert queue.dropped == 2
+    assert queue.pop_all() == [b"world!", b"bar"]
+
+    # Data buffered by the transport can't be dropped, but still counts
+    queue.put(b"Hello", droppable=True)
+    assert queue.drop_oldest() == 1
+    assert queue.pop_all() == []
+
+
+def test_outbound_queue_stays_paused_above_low_watermark():
+    queue = OutboundQueue(high_watermark=10, low_watermark=5)
+
+    queue.put(b"Hello world!")
+    assert queue.drop_oldest() == 0
+    assert queue.paused
+
+
+def test_outbound_queue_closed():
+    queue = OutboundQueue(high_watermark=10, low_watermark=5)
+    queue.put(b"Hello world!")
+    queue.close()
+
+    assert queue.size == 0
+    assert not queue.paused
+
+    queue.put(b"Hello world!")
+    assert queue.size == 0
+
+
+def test_outbound_queue_invalid_watermarks():
+    with pytest.raises(ValueError):
+        OutboundQueue(high_watermark=5, low_watermark=10)
@@ -3,6 +3,7 @@ from typing import Sequence, Type, TypeVar
 import pytest
 
 from dumdum.protocol import (
+    MAX_MESSAGE_LENGTH,
     BufferOverflowError,
     Channel,
     Client,
@@ -10,8 +11,17 @@ from dumdum.protocol import (
     ClientEventChannelsListed,
     ClientEventHello,
     ClientEventIncompatibleVersion,
+    ClientEventMessageListCompleted,
+    ClientEventMessageReceived,
+    ClientEventMessageStreamed,
     ClientEventMessagesListed,
+    ClientEventMessagesReceived,
+    ClientEventSynced,
+    ClientEventThrottled,
+    ClientMessagePost,
+    ClientMessagePostMany,
     ClientState,
+    CompressionType,
     InvalidStateError,
     MalformedDataError,
     Message,
@@ -20,11 +30,18 @@ from dumdum.protocol import (
     ServerEventAuthentication,
     ServerEventHello,
     ServerEventIncompatibleVersion,
+    ServerEventJoinChannel,
     ServerEventListChannels,
     ServerEventListMessages,
     ServerEventMessageReceived,
+    ServerEventMessagesReceived,
+    ServerEventPartChannel,
+    ServerEventSync,
+    ServerMessageListMessages,
     ServerState,
 )
+from dumdum.protocol.compression import COMPRESSED_FLAG
+from dumdum.protocol.frame import dumps_frame
 
 T = TypeVar("T")
 
@@ -120,7 +137,8 @@ def test_hello_incompatible_version():
     client = Client(nick=nick)
     server = Server()
 
-    client.PROTOCOL_VERSION = server.PROTOCOL_VERSION - 1  # type: ignore
+    unsupported_version = min(server.SUPPORTED_PROTOCOL_VERSIONS) - 1
+    client.PROTOCOL_VERSION = unsupported_version  # type: ignore
 
     client_events, server_events = communicate(client, client.hello(), server)
     assert_incompatible_version(client, server, client_events, server_events)
@@ -148,6 +166,39 @@ def test_send_message():
     assert server_events == [ServerEventMessageReceived(channel_name, content)]
 
 
+def test_relay_raw_content():
+    content = "Hello world! 🐢"
+
+    client = Client(nick="thegamecracks")
+    server = Server()
+
+    communicate(client, client.hello(), server)
+    communicate(server, server.hello(using_ssl=False), client)
+    communicate(client, client.authenticate(), server)
+    communicate(server, server.authenticate(success=True), client)
+
+    _, server_events = communicate(
+        client,
+        client.send_message("general", content),
+        server,
+    )
+    event = server_events[0]
+    assert isinstance(event, ServerEventMessageReceived)
+    assert event.raw_content == content.encode()
+
+    # Raw content should be written as-is, without encoding the content again
+    message = Message(1, "general", "thegamecracks", "", raw_content=b"spliced")
+    assert bytes(message) == bytes(Message(1, "general", "thegamecracks", "spliced"))
+
+    _, client_events = communicate(server, server.send_message(message), client)
+    assert client_events == [
+        ClientEventMessageReceived(Message(1, "general", "thegamecracks", "spliced"))
+    ]
+
+    # Clients only need the decoded content
+    assert client_events[0].message.raw_content is None
+
+
 def test_list_channels():
     channels = [
         Channel("announcements"),
@@ -175,6 +226,34 @@ def test_list_channels():
     assert server_events == []
 
 
+def test_join_and_part_channel():
+    channel = Channel("general")
+
+    client = Client(nick="thegamecracks")
+    server = Server()
+
+    communicate(client, client.hello(), server)
+    communicate(server, server.hello(using_ssl=False), client)
+    communicate(client, client.authenticate(), server)
+    communicate(server, server.authenticate(success=True), client)
+
+    client_events, server_events = communicate(
+        client,
+        client.join_channel(channel.name),
+        server,
+    )
+    assert client_events == []
+    assert server_events == [ServerEventJoinChannel(channel.name)]
+
+    client_events, server_events = communicate(
+        client,
+        client.part_channel(channel.name),
+        server,
+    )
+    assert client_events == []
+    assert server_events == [ServerEventPartChannel(channel.name)]
+
+
 def test_unauthenticated_send_message():
     nick = "thegamecracks"
     content = "Hello world!"
@@ -211,6 +290,23 @@ def test_unauthenticated_server_send_message():
         communicate(server, data, client)
 
 
+def test_send_prepared_message():
+    message = Message(0, "general", "thegamecracks", "Hello world!")
+    prepared = Server.prepare_message(message)
+
+    unauthenticated = Server()
+    with pytest.raises(InvalidStateError):
+        unauthenticated.send_prepared_message(prepared)
+
+    servers = [Server() for _ in range(3)]
+    for server in servers:
+        server._state = ServerState.READY
+
+    outgoing = [server.send_prepared_message(prepared) for server in servers]
+    assert outgoing[0] == servers[0].send_message(message)
+    assert all(data is outgoing[0] for data in outgoing)
+
+
 def test_list_messages():
     nick = "thegamecracks"
     channel = Channel("general")
@@ -237,6 +333,539 @@ def test_list_messages():
     assert client_events == [ClientEventMessagesListed(messages)]
 
 
+def test_compact_message_list():
+    nick = "thegamecracks"
+    messages = [
+        Message((1 << 40) + i * 4096, "general", f"user{i % 3}", "Hello world!")
+        for i in range(100)
+    ]
+
+    client = Client(nick=nick)
+    server = Server()
+
+    communicate(client, client.hello(), server)
+    communicate(server, server.hello(using_ssl=False), client)
+    communicate(client, client.authenticate(), server)
+    communicate(server, server.authenticate(success=True), client)
+
+    data = server.list_messages(messages)
+    assert len(data) < len(bytes(ServerMessageListMessages(messages))) / 2
+    _, client_events = communicate(server, data, client)
+    assert client_events == [ClientEventMessagesListed(messages)]
+    assert all(m.raw_content is None for m in client_events[0].messages)
+
+    with pytest.raises(ValueError):
+        server.list_messages(messages[::-1])
+    with pytest.raises(ValueError):
+        server.list_messages([messages[0], Message(messages[1].id, "memes", nick, "")])
+
+    # Version 4 clients receive the original encoding
+    client = Client(nick=nick)
+    server = Server()
+    client.PROTOCOL_VERSION = 4  # type: ignore
+
+    communicate(client, client.hello(), server)
+    communicate(server, server.hello(using_ssl=False), client)
+    communicate(client, client.authenticate(), server)
+    communicate(server, server.authenticate(success=True), client)
+
+    prepared = Server.prepare_message_list(messages)
+    data = server.send_prepared_message(prepared)
+    assert data == prepared.framed
+    _, client_events = communicate(server, data, client)
+    assert client_events == [ClientEventMessagesListed(messages)]
+
+
+def test_channel_indices():
+    channels = [Channel("general"), Channel("memes")]
+
+    client = Client(nick="thegamecracks")
+    server = Server()
+
+    communicate(client, client.hello(), server)
+    communicate(server, server.hello(using_ssl=False), client)
+    communicate(client, client.authenticate(), server)
+    communicate(server, server.authenticate(success=True), client)
+
+    # Channels are named until the client receives the list it requested
+    assert b"memes" in client.send_message("memes", "Hello world!")
+    communicate(client, client.list_channels(), server)
+    assert b"memes" in client.send_message("memes", "Hello world!")
+
+    prepared = Server.prepare_channel_list(channels)
+    communicate(server, server.send_prepared_message(prepared), client)
+
+    data = b"".join(
+        (
+            client.send_message("memes", "Hello world!"),
+            client.send_messages("general", ["a", "b"]),
+            client.list_messages("memes", before=1, limit=5),
+            client.send_message("unlisted", "Hello world!"),
+        )
+    )
+    assert b"memes" not in data and b"general" not in data
+    _, server_events = communicate(client, data, server)
+    assert server_events == [
+        ServerEventMessageReceived("memes", "Hello world!"),
+        ServerEventMessagesReceived("general", ["a", "b"]),
+        ServerEventListMessages("memes", 1, None, 5),
+        ServerEventMessageReceived("unlisted", "Hello world!"),
+    ]
+
+    # Sync responses assign new indices too
+    communicate(client, client.sync(), server)
+    page = Server.prepare_message_list([])
+    communicate(server, server.sync([Channel("memes")], [page]), client)
+    data = client.send_message("memes", "Hello world!")
+    assert b"memes" not in data
+    _, server_events = communicate(client, data, server)
+    assert server_events == [ServerEventMessageReceived("memes", "Hello world!")]
+
+    server = Server()
+    server._state = ServerState.READY
+    server._version = server.PROTOCOL_VERSION
+    with pytest.raises(MalformedDataError):
+        server.receive_bytes(data)
+
+
+def test_list_messages_limit():
+    client = Client(nick="thegamecracks")
+    server = Server()
+
+    communicate(client, client.hello(), server)
+    communicate(server, server.hello(using_ssl=False), client)
+    communicate(client, client.authenticate(), server)
+    communicate(server, server.authenticate(success=True), client)
+
+    # Messages without a limit should not consume the next message
+    data = client.list_messages("general", limit=20) + client.list_messages("memes")
+    client_events, server_events = communicate(client, data, server)
+    assert server_events == [
+        ServerEventListMessages("general", None, None, 20),
+        ServerEventListMessages("memes", None, None, None),
+    ]
+
+    with pytest.raises(ValueError):
+        client.list_messages("general", limit=0)
+    with pytest.raises(ValueError):
+        client.list_messages("general", limit=2**16)
+
+    client.PROTOCOL_VERSION = 2  # type: ignore
+    with pytest.raises(ValueError):
+        client.list_messages("general", limit=20)
+
+
+def test_stream_message_list():
+    nick = "thegamecracks"
+    client = Client(nick=nick, buffer_size=1024, stream_message_lists=True)
+    server = Server()
+
+    communicate(client, client.hello(), server)
+    communicate(server, server.hello(using_ssl=False), client)
+    communicate(client, client.authenticate(), server)
+    communicate(server, server.authenticate(success=True), client)
+
+    # The list is much larger than the client's buffer
+    messages = [Message(i, "general", nick, "Hello world!" * 10) for i in range(100)]
+    data = server.list_messages(messages) + server.list_messages([])
+    assert len(data) > client.buffer_size
+
+    events = []
+    for i in range(0, len(data), 100):
+        received, outgoing = client.receive_bytes(data[i : i + 100])
+        events.extend(received)
+
+    assert events == [
+        *(ClientEventMessageStreamed(m) for m in messages),
+        ClientEventMessageListCompleted(100),
+        ClientEventMessageListCompleted(0),
+    ]
+
+
+def test_stream_compressed_message_list():
+    nick = "thegamecracks"
+    client = Client(
+        nick=nick,
+        stream_message_lists=True,
+        compression=CompressionType.ZLIB,
+    )
+    server = Server()
+
+    communicate(client, client.hello(), server)
+    communicate(server, server.hello(using_ssl=False), client)
+    communicate(client, client.authenticate(), server)
+    communicate(server, server.authenticate(success=True), client)
+
+    # Compressed lists produce the same events as streamed lists
+    messages = [Message(i, "general", nick, "Hello world!" * 10) for i in range(100)]
+    data = server.list_messages(messages)
+    assert data[0] & COMPRESSED_FLAG
+    _, client_events = communicate(server, data, client)
+    assert client_events == [
+        *(ClientEventMessageStreamed(m) for m in messages),
+        ClientEventMessageListCompleted(100),
+    ]
+
+
+def test_stream_message_list_overrun():
+    client = Client(nick="thegamecracks", stream_message_lists=True)
+    server = Server()
+
+    communicate(client, client.hello(), server)
+    communicate(server, server.hello(using_ssl=False), client)
+    communicate(client, client.authenticate(), server)
+    communicate(server, server.authenticate(success=True), client)
+
+    data = bytearray(server.list_messages([Message(1, "general", "a", "b")]))
+    data[-1:] = b""  # Truncate the list, but not its frame
+    data[1:5] = (len(data) - 5).to_bytes(4, byteorder="big")
+    data[5:8] = (len(data) - 8).to_bytes(3, byteorder="big")
+
+    with pytest.raises(MalformedDataError):
+        client.receive_bytes(bytes(data))
+
+
+def test_sync():
+    nick = "thegamecracks"
+    channels = [Channel("general"), Channel("memes")]
+
+    client = Client(nick=nick)
+    server = Server()
+
+    communicate(client, client.hello(), server)
+    communicate(server, server.hello(using_ssl=False), client)
+    communicate(client, client.authenticate(), server)
+    communicate(server, server.authenticate(success=True), client)
+
+    client_events, server_events = communicate(client, client.sync(), server)
+    assert server_events == [ServerEventSync({}, False)]
+
+    watermarks = {"general": 123, "memes": 456}
+    data = client.sync(watermarks, join=True)
+    client_events, server_events = communicate(client, data, server)
+    assert server_events == [ServerEventSync(watermarks, True)]
+
+    pages = [
+        [Message(i, channel.name, nick, f"Message #{i}") for i in range(100)]
+        for channel in channels
+    ]
+    messages = [m for page in pages for m in page]
+    data = server.sync(channels, [Server.prepare_message_list(p) for p in pages])
+    server_events, client_events = communicate(server, data, client)
+    assert client_events == [ClientEventSynced(channels, messages)]
+
+    # Streamed message lists are collected into the sync
+    client.stream_message_lists = True
+    data = server.sync(channels, [Server.prepare_message_list(p) for p in pages])
+    server_events, client_events = communicate(server, data, client)
+    assert client_events == [ClientEventSynced(channels, messages)]
+
+    # Syncs without channels complete immediately
+    server_events, client_events = communicate(server, server.sync([], []), client)
+    assert client_events == [ClientEventSynced([], [])]
+
+    with pytest.raises(ValueError):
+        server.sync(channels, [])
+
+
+def test_sync_compact():
+    nick = "thegamecracks"
+    channels = [Channel("general"), Channel("memes")]
+    pages = [
+        [Message(i, channel.name, nick, f"Message #{i}") for i in range(100)]
+        for channel in channels
+    ]
+    prepared = [Server.prepare_message_list(p) for p in pages]
+
+    sizes = {}
+    for version in (4, 5):
+        client = Client(nick=nick)
+        client.PROTOCOL_VERSION = version  # type: ignore
+        server = Server()
+
+        communicate(client, client.hello(), server)
+        communicate(server, server.hello(using_ssl=False), client)
+        communicate(client, client.authenticate(), server)
+        communicate(server, server.authenticate(success=True), client)
+
+        data = server.sync(channels, prepared)
+        sizes[version] = len(data)
+        _, client_events = communicate(server, data, client)
+        assert client_events == [
+            ClientEventSynced(channels, [m for p in pages for m in p])
+        ]
+
+    # Version 5 pages of a sync are encoded compactly
+    assert sizes[5] < sizes[4] / 2
+
+
+def test_throttle():
+    client = Client(nick="thegamecracks")
+    server = Server()
+
+    communicate(client, client.hello(), server)
+    communicate(server, server.hello(using_ssl=False), client)
+    communicate(client, client.authenticate(), server)
+    communicate(server, server.authenticate(success=True), client)
+
+    data = server.throttle("general", retry_after=1.2345)
+    server_events, client_events = communicate(server, data, client)
+    assert client_events == [ClientEventThrottled("general", 1.235)]
+
+
+def test_throttle_unframed_protocol_version():
+    client = Client(nick="thegamecracks")
+    server = Server()
+
+    client.PROTOCOL_VERSION = 2  # type: ignore
+
+    communicate(client, client.hello(), server)
+    communicate(server, server.hello(using_ssl=False), client)
+    communicate(client, client.authenticate(), server)
+    communicate(server, server.authenticate(success=True), client)
+
+    assert server.throttle("general", retry_after=1) == b""
+
+
+def test_send_messages():
+    nick = "thegamecracks"
+    client = Client(nick=nick)
+    server = Server()
+
+    communicate(client, client.hello(), server)
+    communicate(server, server.hello(using_ssl=False), client)
+    communicate(client, client.authenticate(), server)
+    communicate(server, server.authenticate(success=True), client)
+
+    contents = [f"Line {i} 👋" for i in range(50)]
+    data = client.send_messages("general", contents)
+    client_events, server_events = communicate(client, data, server)
+    assert server_events == [ServerEventMessagesReceived("general", contents)]
+    assert server_events[0].raw_contents == [c.encode() for c in contents]
+
+    messages = [Message(i, "general", nick, c) for i, c in enumerate(contents)]
+    data = server.send_messages(messages)
+    server_events, client_events = communicate(server, data, client)
+    assert client_events == [ClientEventMessagesReceived(messages)]
+
+    with pytest.raises(ValueError):
+        client.send_messages("general", [])
+
+    # Batches must fit in the default buffer size of the server
+    with pytest.raises(ValueError):
+        client.send_messages("general", ["a" * MAX_MESSAGE_LENGTH] * 1024)
+    contents = ["a" * MAX_MESSAGE_LENGTH] * 1000
+    data = client.send_messages("general", contents)
+    client_events, server_events = communicate(client, data, server)
+    assert server_events == [ServerEventMessagesReceived("general", contents)]
+
+    # Empty batches are rejected
+    empty = ClientMessagePostMany("general", [], compact=True)
+    with pytest.raises(MalformedDataError):
+        server.receive_bytes(dumps_frame(bytes(empty)))
+
+
+def test_send_messages_unframed_protocol_version():
+    nick = "thegamecracks"
+    client = Client(nick=nick)
+    server = Server()
+
+    client.PROTOCOL_VERSION = 2  # type: ignore
+
+    communicate(client, client.hello(), server)
+    communicate(server, server.hello(using_ssl=False), client)
+    communicate(client, client.authenticate(), server)
+    communicate(server, server.authenticate(success=True), client)
+
+    # Version 2 clients receive each message separately
+    messages = [Message(i, "general", nick, "Hello world!") for i in range(3)]
+    data = server.send_messages(messages)
+    server_events, client_events = communicate(server, data, client)
+    assert client_events == [ClientEventMessageReceived(m) for m in messages]
+
+    with pytest.raises(ValueError):
+        client.send_messages("general", ["Hello world!"])
+
+
+def test_compression():
+    nick = "thegamecracks"
+    client = Client(
+        nick=nick,
+        compression=CompressionType.ZLIB,
+        compression_threshold=0,
+    )
+    server = Server(compression_threshold=64)
+
+    _, server_events = communicate(client, client.hello(), server)
+    assert server_events == [ServerEventHello(CompressionType.ZLIB)]
+    _, client_events = communicate(server, server.hello(using_ssl=False), client)
+    assert client_events == [ClientEventHello(False, CompressionType.ZLIB)]
+    communicate(client, client.authenticate(), server)
+    communicate(server, server.authenticate(success=True), client)
+
+    data = client.send_message("general", "Hello world!")
+    _, server_events = communicate(client, data, server)
+    assert server_events == [ServerEventMessageReceived("general", "Hello world!")]
+
+    messages = [Message(i, "general", nick, "Hello world!") for i in range(100)]
+    for _ in range(2):
+        data = server.list_messages(messages)
+        assert len(data) < len(bytes(ServerMessageListMessages(messages))) / 5
+        _, client_events = communicate(server, data, client)
+        assert client_events == [ClientEventMessagesListed(messages)]
+
+    # Frames below the threshold are sent uncompressed
+    data = server.send_message(messages[0])
+    assert data[0] == 0x03
+    _, client_events = communicate(server, data, client)
+    assert client_events == [ClientEventMessageReceived(messages[0])]
+
+    client_stats = client.compression_stats
+    server_stats = server.compression_stats
+    assert client_stats is not None and server_stats is not None
+    assert client_stats.frames_compressed == server_stats.frames_decompressed == 2
+    assert server_stats.frames_compressed == client_stats.frames_decompressed == 2
+    assert server_stats.compression_ratio > 5
+    assert client_stats.decompression_ratio == server_stats.compression_ratio
+
+
+def test_compression_deferred():
+    nick = "thegamecracks"
+    client = Client(nick=nick, compression=CompressionType.ZLIB)
+    server = Server(compression_threshold=0, defer_compression=True)
+
+    communicate(client, client.hello(), server)
+    data = server.hello(using_ssl=False)
+    assert server.compress_frames(data) == data
+    communicate(server, data, client)
+    communicate(client, client.authenticate(), server)
+    data = server.compress_frames(server.authenticate(success=True))
+    communicate(server, data, client)
+
+    # Frames left out of the stream before compression don't corrupt it
+    messages = [Message(i, "general", nick, f"Message #{i}") for i in range(10)]
+    sent = [server.send_message(m) for m in messages]
+    assert sent[0][0] == 0x03
+    data = b"".join(server.compress_frames(d) for d in sent[::2])
+    _, client_events = communicate(server, data, client)
+    assert client_events == [ClientEventMessageReceived(m) for m in messages[::2]]
+
+    # Several frames returned at once are compressed separately
+    pages = [Server.prepare_message_list(messages)]
+    data = server.compress_frames(server.sync([Channel("general")], pages))
+    _, client_events = communicate(server, data, client)
+    assert client_events == [ClientEventSynced([Channel("general")], messages)]
+
+    server_stats = server.compression_stats
+    assert server_stats is not None
+    assert server_stats.frames_compressed == 8
+
+
+def test_compression_declined():
+    client = Client(nick="thegamecracks", compression=CompressionType.ZLIB)
+    server = Server(compression=False)
+
+    communicate(client, client.hello(), server)
+    _, client_events = communicate(server, server.hello(using_ssl=False), client)
+    assert client_events == [ClientEventHello(False, CompressionType.NONE)]
+    communicate(client, client.authenticate(), server)
+    communicate(server, server.authenticate(success=True), client)
+
+    data = server.list_messages([Message(1, "general", "a", "b" * 1000)])
+    assert data[0] == 0x05
+    assert client.compression_stats is None
+    assert server.compression_stats is None
+
+    client = Client(nick="thegamecracks", compression=CompressionType.ZLIB)
+    client.PROTOCOL_VERSION = 3  # type: ignore
+    with pytest.raises(ValueError):
+        client.hello()
+
+
+def test_decompressed_frame_exceeds_buffer_size():
+    client = Client(nick="thegamecracks", compression=CompressionType.ZLIB)
+    server = Server(buffer_size=1024)
+
+    communicate(client, client.hello(), server)
+    communicate(server, server.hello(using_ssl=False), client)
+    communicate(client, client.authenticate(), server)
+    communicate(server, server.authenticate(success=True), client)
+
+    client.compression_threshold = 0
+    data = client.sync({f"channel-{i}": i for i in range(100)})
+    assert len(data) < 1024
+    with pytest.raises(MalformedDataError):
+        server.receive_bytes(data)
+
+
+def test_unframed_protocol_version():
+    nick = "thegamecracks"
+    channel = Channel("general")
+
+    client = Client(nick=nick)
+    server = Server()
+
+    client.PROTOCOL_VERSION = 2  # type: ignore
+
+    communicate(client, client.hello(), server)
+    assert server.version == 2
+    communicate(server, server.hello(using_ssl=False), client)
+    communicate(client, client.authenticate(), server)
+    communicate(server, server.authenticate(success=True), client)
+
+    data = client.send_message(channel.name, "Hello world!")
+    assert data == bytes(ClientMessagePost(channel.name, "Hello world!"))
+    client_events, server_events = communicate(client, data, server)
+    assert server_events == [ServerEventMessageReceived(channel.name, "Hello world!")]
+
+    messages = [Message(i, channel.name, nick, "Hello world!") for i in range(100)]
+    data = server.list_messages(messages)
+    assert data == bytes(ServerMessageListMessages(messages))
+    server_events, client_events = communicate(server, data, client)
+    assert client_events == [ClientEventMessagesListed(messages)]
+
+
+def test_partial_frame():
+    nick = "thegamecracks"
+    channel = Channel("general")
+
+    client = Client(nick=nick)
+    server = Server()
+
+    communicate(client, client.hello(), server)
+    communicate(server, server.hello(using_ssl=False), client)
+    communicate(client, client.authenticate(), server)
+    communicate(server, server.authenticate(success=True), client)
+
+    messages = [Message(i, channel.name, nick, "Hello world!") for i in range(10)]
+    data = server.list_messages(messages)
+
+    for i in range(len(data) - 1):
+        assert client.receive_bytes(data[i : i + 1]) == ([], b"")
+
+    events, outgoing = client.receive_bytes(data[-1:])
+    assert events == [ClientEventMessagesListed(messages)]
+    assert outgoing == b""
+
+
+def test_frame_exceeds_buffer_size():
+    client = Client("thegamecracks", buffer_size=64)
+    client._state = ClientState.READY
+
+    # LIST_MESSAGES frame with a payload of 64 bytes
+    with pytest.raises(BufferOverflowError):
+        client.receive_bytes(b"\x05\x00\x00\x00\x40")
+
+
+def test_frame_with_unread_bytes():
+    client = Client("thegamecracks")
+    client._state = ClientState.READY
+
+    # LIST_CHANNELS with an empty channel list and one extra byte
+    with pytest.raises(MalformedDataError):
+        client.receive_bytes(b"\x04\x00\x00\x00\x03\x00\x00\x00")
+
+
 def test_invalid_message_type():
     client = Client("thegamecracks")
     server = Server()
@@ -259,12 +888,12 @@ def test_unicode_decode_error():
 
     with pytest.raises(MalformedDataError):
         # LIST_CHANNELS, Channel name \N{EYES} but missing last 3 bytes
-        data = b"\x04\x00\x02\x01\xf0"
+        data = b"\x04\x00\x00\x00\x04\x00\x02\x01\xf0"
         client.receive_bytes(data)
 
     with pytest.raises(MalformedDataError):
         # SEND_MESSAGE, Channel name \N{EYES} but missing last 3 bytes
-        data = b"\x03\x01\xf0"
+        data = b"\x03\x00\x00\x00\x02\x01\xf0"
         server.receive_bytes(data)
 
 
@@ -301,7 +930,8 @@ def test_hello_after_incompatible_version():
     client = Client("thegamecracks")
     server = Server()
 
-    client.PROTOCOL_VERSION = server.PROTOCOL_VERSION - 1  # type: ignore
+    unsupported_version = min(server.SUPPORTED_PROTOCOL_VERSIONS) - 1
+    client.PROTOCOL_VERSION = unsupported_version  # type: ignore
     client_events, server_events = communicate(client, client.hello(), server)
     assert_incompatible_version(client, server, client_events, server_events)
 
@@ -0,0 +1,86 @@
+import pytest
+
+from dumdum.server.ratelimit import RateLimit, RateLimiter
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.t = 0.0
+
+    def __call__(self) -> float:
+        return self.t
+
+
+def send(limiter: RateLimiter, size: int = 1) -> float:
+    delay = limiter.get_delay(size)
+    if delay == 0:
+        limiter.consume(size)
+    return delay
+
+
+def test_rate_limit_messages():
+    clock = FakeClock()
+    limiter = RateLimiter(RateLimit(messages=2, burst=2), clock=clock)
+
+    assert [send(limiter) for _ in range(4)] == [0, 0, 0, 0]
+    assert send(limiter) == pytest.approx(0.5)
+
+    clock.t = 0.5
+    assert send(limiter) == 0
+    assert send(limiter) == pytest.approx(0.5)
+
+    # Unused capacity is only saved up to the burst
+    clock.t = 100
+    assert [send(limiter) for _ in range(4)] == [0, 0, 0, 0]
+    assert send(limiter) > 0
+
+
+def test_rate_limit_bytes():
+    clock = FakeClock()
+    limiter = RateLimiter(RateLimit(bytes=100, burst=1), clock=clock)
+
+    assert send(limiter, 60) == 0
+    assert send(limiter, 60) == pytest.approx(0.2)
+    assert send(limiter, 40) == 0
+
+    # Messages larger than the burst are let through once the bucket is full
+    clock.t = 1
+    assert send(limiter, 250) == 0
+    assert send(limiter, 1) == pytest.approx(1.51)
+
+
+def test_rate_limit_rejection_is_free():
+    clock = FakeClock()
+    limiter = RateLimiter(RateLimit(messages=1, bytes=10, burst=1), clock=clock)
+
+    assert send(limiter, 10) == 0
+    for _ in range(10):
+        assert send(limiter, 10) == pytest.approx(1)
+
+    clock.t = 1
+    assert send(limiter, 10) == 0
+
+
+def test_rate_limit_batches():
+    clock = FakeClock()
+    limiter = RateLimiter(RateLimit(messages=2, burst=2), clock=clock)
+
+    assert limiter.get_delay(3, count=3) == 0
+    limiter.consume(3, count=3)
+
+    # A batch is only let through once all of it fits
+    assert limiter.get_delay(2, count=2) == pytest.approx(0.5)
+    clock.t = 0.5
+    assert limiter.get_delay(2, count=2) == 0
+
+
+def test_rate_limit_validation():
+    assert not RateLimit().enabled
+    assert RateLimit(messages=1).enabled
+
+    with pytest.raises(ValueError):
+        RateLimit(messages=0)
+    with pytest.raises(ValueError):
+        RateLimit(bytes=-1)
+    with pytest.raises(ValueError):
+        RateLimit(messages=1, burst=0)
@@ -1,6 +1,6 @@
 import pytest
 
-from dumdum.protocol import bytearray_reader, byte_reader
+from dumdum.protocol import ReceiveBuffer, bytearray_reader, byte_reader
 
 
 def test_bytearray_reader_commit_and_rollback():
@@ -46,3 +46,44 @@ def test_reader_closed():
 
     with pytest.raises(RuntimeError):
         reader.readexactly(1)
+
+
+def test_receive_buffer_commit_and_rollback():
+    buffer = ReceiveBuffer()
+    buffer.extend(b"Hello world!\n", limit=None)
+
+    with buffer.reader() as reader:
+        assert reader.read(5) == b"Hello"
+
+    assert len(buffer) == 8
+
+    with pytest.raises(RuntimeError), buffer.reader() as reader:
+        assert reader.read() == b" world!\n"
+        raise RuntimeError
+
+    with buffer.reader() as reader:
+        assert reader.read() == b" world!\n"
+
+    assert len(buffer) == 0
+
+
+def test_receive_buffer_compacts_on_extend():
+    buffer = ReceiveBuffer()
+    buffer.extend(b"Hello", limit=5)
+
+    with buffer.reader() as reader:
+        reader.readexactly(5)
+
+    # Consumed bytes no longer count towards the limit
+    buffer.extend(b" world!\n", limit=8)
+
+    with buffer.reader() as reader:
+        assert reader.read() == b" world!\n"
+
+
+def test_reader_view():
+    with byte_reader(b"Hello world!\n") as reader:
+        view = reader.readexactly_view(5)
+        assert isinstance(view, memoryview)
+        assert view == b"Hello"
+        assert reader.offset == 5
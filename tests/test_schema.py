@@ -0,0 +1,162 @@
+import pytest
+
+from dumdum.protocol import (
+    Channel,
+    InvalidLengthError,
+    Message,
+    ServerMessageListChannels,
+    ServerMessagePost,
+    ServerMessageSync,
+    byte_reader,
+    varchar,
+)
+from dumdum.protocol.enums import ServerMessageType
+from dumdum.protocol.schema import (
+    BOOL,
+    U8,
+    U16,
+    U32,
+    U64,
+    VARINT,
+    Repeated,
+    Schema,
+    Varchar,
+)
+
+
+def decode(schema: Schema, data: bytes) -> tuple:
+    with byte_reader(data) as reader:
+        assert reader.readexactly(1)[0] == schema.message_type
+        values = schema.decode(reader)
+        assert reader.remaining == 0
+    return values
+
+
+def test_schema_round_trip():
+    schema = Schema(
+        9,
+        U8,
+        BOOL,
+        Varchar(32),
+        U16,
+        U32,
+        U64,
+        Varchar(1024, raw=True),
+    )
+    values = (255, True, "general 👀", 65535, 2**32 - 1, 2**64 - 1, b"\xf0\x9f\x90\xa2")
+
+    data = schema.encode(*values)
+    assert data == b"".join(
+        (
+            b"\x09\xff\x01",
+            varchar.dumps("general 👀", max_length=32),
+            b"\xff\xff" + b"\xff" * 4 + b"\xff" * 8,
+            varchar.dumps_bytes(b"\xf0\x9f\x90\xa2", max_length=1024),
+        )
+    )
+    assert decode(schema, data) == values
+
+
+def test_schema_empty():
+    schema = Schema(4)
+    assert schema.encode() == b"\x04"
+    assert decode(schema, b"\x04") == ()
+
+
+def test_schema_repeated():
+    schema = Schema(8, BOOL, Repeated((Varchar(32), U64), count=U16))
+    data = schema.encode(False, {"a": 1, "bc": 2}.items())
+    assert (
+        data == b"\x08\x00\x00\x02\x01a" + bytes(7) + b"\x01\x02bc" + bytes(7) + b"\x02"
+    )
+    assert decode(schema, data) == (False, [("a", 1), ("bc", 2)])
+    assert decode(schema, schema.encode(True, [])) == (True, [])
+
+
+def test_schema_varint():
+    schema = Schema(
+        5,
+        U8,
+        VARINT,
+        Varchar(1024, raw=True, varint=True),
+        Repeated((VARINT,), count=VARINT),
+    )
+    values = (1, 300, b"x" * 200, [(0,), (2**64 - 1,)])
+
+    data = schema.encode(*values)
+    assert data == b"".join(
+        (
+            b"\x05\x01\xac\x02\xc8\x01",
+            b"x" * 200,
+            b"\x02\x00" + b"\xff" * 9 + b"\x01",
+        )
+    )
+    assert decode(schema, data) == values
+
+    for i in range(1, len(data)):
+        with byte_reader(data[1:i]) as reader, pytest.raises(IndexError):
+            schema.decode(reader)
+
+    with byte_reader(b"\x01\x00\x81\x08") as reader:
+        with pytest.raises(InvalidLengthError):
+            schema.decode(reader)
+
+
+def test_schema_matches_message():
+    message = Message(123, "general", "thegamecracks", "Hello world! 👋")
+    expected = b"".join(
+        (
+            message.id.to_bytes(8, byteorder="big"),
+            varchar.dumps(message.channel_name, max_length=32),
+            varchar.dumps(message.nick, max_length=32),
+            varchar.dumps(message.content, max_length=1024),
+        )
+    )
+    assert bytes(message) == expected
+
+    with byte_reader(expected) as reader:
+        assert Message.from_reader(reader) == message
+
+
+def test_schema_matches_server_messages():
+    message = Message(123, "general", "thegamecracks", "Hello world! 👋")
+    expected = bytes([ServerMessageType.SEND_MESSAGE.value]) + bytes(message)
+    assert bytes(ServerMessagePost(message)) == expected
+
+    channels = [Channel("general"), Channel("memes")]
+    channel_bytes = b"".join(varchar.dumps(c.name, max_length=32) for c in channels)
+    for cls, message_type in (
+        (ServerMessageListChannels, ServerMessageType.LIST_CHANNELS),
+        (ServerMessageSync, ServerMessageType.SYNC),
+    ):
+        expected = b"".join(
+            (
+                bytes([message_type.value]),
+                len(channel_bytes).to_bytes(2, byteorder="big"),
+                channel_bytes,
+            )
+        )
+        assert bytes(cls(channels)) == expected
+
+
+def test_schema_invalid_length():
+    schema = Schema(1, Varchar(4))
+    with pytest.raises(InvalidLengthError):
+        schema.encode("Hello")
+
+    with byte_reader(b"\x05Hello") as reader, pytest.raises(InvalidLengthError):
+        schema.decode(reader)
+
+
+def test_schema_insufficient_data():
+    schema = Schema(1, Varchar(32), U64)
+    data = schema.encode("general", 1)
+    for i in range(1, len(data)):
+        with byte_reader(data[1:i]) as reader, pytest.raises(IndexError):
+            schema.decode(reader)
+
+
+def test_schema_unsupported_varchar_length():
+    assert Schema(1, Varchar(2**24)).encode("") == b"\x01" + bytes(4)
+    with pytest.raises(ValueError):
+        Schema(1, Varchar(2**16))
@@ -0,0 +1,64 @@
+import pytest
+from conftest import create_message
+
+from dumdum.protocol import Message
+from dumdum.server.snapshot import Snapshot
+from dumdum.server.state import MessageCache
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = tmp_path / "cache.snapshot"
+    cache = MessageCache(max_messages=100)
+    for i in range(1, 11):
+        cache.add_message(create_message(i, "general" if i % 2 else "memes"))
+    cache.write_snapshot(path)
+
+    with Snapshot.open(path) as snapshot:
+        assert set(snapshot.channels) == {"general", "memes"}
+        assert snapshot.channels["general"].count == 5
+        assert snapshot.read_messages("memes") == [
+            create_message(i, "memes") for i in range(2, 11, 2)
+        ]
+
+
+def test_snapshot_non_ascii(tmp_path):
+    path = tmp_path / "cache.snapshot"
+    message = Message(1, "général", "thegamecracks", "Message #1 🐢")
+    cache = MessageCache(max_messages=100)
+    cache.add_message(message)
+    cache.write_snapshot(path)
+
+    with Snapshot.open(path) as snapshot:
+        assert snapshot.read_messages("général") == [message]
+
+
+def test_snapshot_loads_channels_lazily(tmp_path):
+    path = tmp_path / "cache.snapshot"
+    cache = MessageCache(max_messages=100)
+    for i in range(1, 11):
+        cache.add_message(create_message(i, "general" if i % 2 else "memes"))
+    cache.write_snapshot(path)
+
+    cache = MessageCache(max_messages=100)
+    cache.load_snapshot(Snapshot.open(path))
+    assert cache.size == 0
+
+    cache.add_message(create_message(11))
+    assert [m.id for m in cache.get_messages("general")] == [1, 3, 5, 7, 9, 11]
+    assert cache.size == sum(len(bytes(create_message(i))) for i in (1, 3, 5, 7, 9, 11))
+
+    # Unloaded channels should be copied over when writing a new snapshot
+    cache.write_snapshot(path)
+    assert [m.id for m in cache.get_messages("memes")] == [2, 4, 6, 8, 10]
+
+    cache = MessageCache(max_messages=100)
+    cache.load_snapshot(Snapshot.open(path))
+    assert [m.id for m in cache.get_messages("general")] == [1, 3, 5, 7, 9, 11]
+    assert [m.id for m in cache.get_messages("memes")] == [2, 4, 6, 8, 10]
+
+
+def test_snapshot_invalid(tmp_path):
+    path = tmp_path / "cache.snapshot"
+    path.write_bytes(b"not a snapshot file")
+    with pytest.raises(ValueError):
+        Snapshot.open(path)
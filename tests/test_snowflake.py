@@ -0,0 +1,96 @@
+import threading
+
+import pytest
+
+from dumdum.protocol import SnowflakeGenerator
+from dumdum.protocol.snowflake import MAX_SEQUENCE
+
+
+class FakeClock:
+    def __init__(self, t: int) -> None:
+        self.t = t
+
+    def __call__(self) -> int:
+        return self.t
+
+
+def get_time(snowflake: int) -> int:
+    return snowflake >> 19
+
+
+def get_worker_id(snowflake: int) -> int:
+    return (snowflake >> 12) & 0x7F
+
+
+def test_snowflake_generator_worker_id():
+    generator = SnowflakeGenerator(42, clock=FakeClock(1000))
+    snowflake = generator.generate()
+    assert get_time(snowflake) == 1000
+    assert get_worker_id(snowflake) == 42
+
+    with pytest.raises(ValueError):
+        SnowflakeGenerator(128)
+    with pytest.raises(ValueError):
+        SnowflakeGenerator(-1)
+
+
+def test_snowflake_generator_sequence_exhaustion():
+    clock = FakeClock(1000)
+    generator = SnowflakeGenerator(0, clock=clock)
+
+    snowflakes = [generator.generate() for _ in range(MAX_SEQUENCE + 2)]
+    assert snowflakes == sorted(set(snowflakes))
+    assert get_time(snowflakes[MAX_SEQUENCE]) == 1000
+    assert get_time(snowflakes[-1]) == 1001
+
+    # The borrowed millisecond is reused once the clock catches up
+    clock.t = 1001
+    assert generator.generate() == snowflakes[-1] + 1
+
+
+def test_snowflake_generator_clock_rollback():
+    clock = FakeClock(1000)
+    generator = SnowflakeGenerator(0, clock=clock)
+    first = generator.generate()
+
+    clock.t = 900
+    second = generator.generate()
+    assert second == first + 1
+
+    clock.t = 1002
+    assert get_time(generator.generate()) == 1002
+
+
+def test_snowflake_generator_batch():
+    clock = FakeClock(1000)
+    generator = SnowflakeGenerator(0, clock=clock)
+    first = generator.generate()
+
+    batch = generator.generate_many(MAX_SEQUENCE * 2)
+    assert len(batch) == MAX_SEQUENCE * 2
+    assert batch == sorted(set(batch))
+    assert batch[0] == first + 1
+    assert get_time(batch[MAX_SEQUENCE - 1]) == 1000
+    assert get_time(batch[MAX_SEQUENCE]) == 1001
+    assert get_time(batch[-1]) == 1001
+    assert generator.generate() > batch[-1]
+    assert generator.generate_many(0) == []
+
+
+def test_snowflake_generator_threads():
+    generator = SnowflakeGenerator(0)
+    results: list[list[int]] = [[] for _ in range(4)]
+
+    def generate(snowflakes: list[int]) -> None:
+        for _ in range(5000):
+            snowflakes.append(generator.generate())
+
+    threads = [threading.Thread(target=generate, args=(r,)) for r in results]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for snowflakes in results:
+        assert snowflakes == sorted(snowflakes)
+    assert len({s for r in results for s in r}) == 20000
@@ -0,0 +1,473 @@
+import random
+from typing import Any
+
+import pytest
+from conftest import create_message
+
+from dumdum.protocol import (
+    Channel,
+    Message,
+    PreparedMessage,
+    ServerMessageListChannels,
+)
+from dumdum.server.history import ColumnarChannelHistory, StringTable
+from dumdum.server.state import CacheEvictionPolicy, MessageCache, ServerState
+
+CACHE_OPTIONS = [
+    pytest.param({}, id="objects"),
+    pytest.param({"columnar": True}, id="columnar"),
+    pytest.param({"block_size": 4, "hot_messages": 3}, id="compressed"),
+]
+
+
+def create_state() -> ServerState:
+    return ServerState(message_cache=MessageCache(max_messages=100))
+
+
+def test_join_and_part_channel():
+    state = create_state()
+    state.add_channel(Channel("general"))
+    state.add_channel(Channel("memes"))
+    state.add_user("thegamecracks")
+
+    assert state.join_channel("general", "thegamecracks")
+    assert state.join_channel("memes", "thegamecracks")
+    assert not state.join_channel("unknown", "thegamecracks")
+    assert not state.join_channel("general", "unknown")
+
+    assert set(state.get_subscribers("general")) == {"thegamecracks"}
+    assert set(state.get_subscriptions("thegamecracks")) == {"general", "memes"}
+
+    state.part_channel("general", "thegamecracks")
+    assert set(state.get_subscribers("general")) == set()
+    assert set(state.get_subscriptions("thegamecracks")) == {"memes"}
+
+
+def test_remove_user_parts_channels():
+    state = create_state()
+    state.add_channel(Channel("general"))
+    state.add_user("thegamecracks")
+    state.join_channel("general", "thegamecracks")
+
+    state.remove_user("thegamecracks")
+    assert set(state.get_subscribers("general")) == set()
+    assert set(state.get_subscriptions("thegamecracks")) == set()
+
+
+def test_remove_channel_parts_users():
+    state = create_state()
+    state.add_channel(Channel("general"))
+    state.add_user("thegamecracks")
+    state.join_channel("general", "thegamecracks")
+
+    state.remove_channel("general")
+    assert set(state.get_subscribers("general")) == set()
+    assert set(state.get_subscriptions("thegamecracks")) == set()
+
+
+def test_remove_channel_discards_messages():
+    state = create_state()
+    state.add_channel(Channel("general"))
+    state.add_message(create_message(1))
+    pages = state.get_message_pages("general")
+    pages.put(PreparedMessage(b""), before=None, after=None, limit=100)
+
+    state.remove_channel("general")
+    state.add_channel(Channel("general"))
+    assert state.get_messages("general") == []
+    assert len(state.get_message_pages("general")) == 0
+
+
+def test_message_pages():
+    state = create_state()
+    state.add_channel(Channel("general"))
+    state.add_channel(Channel("memes"))
+    prepared = PreparedMessage(b"")
+
+    pages = state.get_message_pages("general")
+    assert pages.get(before=None, after=None, limit=100) is None
+    pages.put(prepared, before=None, after=None, limit=100)
+    assert state.get_message_pages("general") is pages
+    assert pages.get(before=None, after=None, limit=100) is prepared
+    assert pages.get(before=None, after=None, limit=50) is None
+
+    # Messages in other channels don't affect the page
+    state.add_message(create_message(1, "memes"))
+    assert state.get_message_pages("general") is pages
+
+    state.add_message(create_message(2, "general"))
+    new_pages = state.get_message_pages("general")
+    assert new_pages is not pages
+    assert new_pages.get(before=None, after=None, limit=100) is None
+
+    new_pages.put(prepared, before=None, after=None, limit=100)
+    state.remove_message("general", 2)
+    assert len(state.get_message_pages("general")) == 0
+
+    pages = state.get_message_pages("unknown")
+    pages.put(prepared, before=None, after=None, limit=100)
+    assert len(state.get_message_pages("unknown")) == 0
+
+
+def test_message_pages_limit():
+    state = ServerState(
+        message_cache=MessageCache(max_messages=100), max_message_pages=2
+    )
+    state.add_channel(Channel("general"))
+    pages = state.get_message_pages("general")
+
+    for limit in range(3):
+        pages.put(PreparedMessage(bytes([limit])), before=None, after=None, limit=limit)
+
+    assert len(pages) == 2
+    assert pages.get(before=None, after=None, limit=0) is None
+
+
+def test_channel_list_cache():
+    state = create_state()
+    state.add_channel(Channel("general"))
+
+    channel_list = state.get_channel_list()
+    assert state.get_channel_list() is channel_list
+    assert channel_list.data == bytes(ServerMessageListChannels([Channel("general")]))
+
+    state.add_channel(Channel("memes"))
+    channel_list = state.get_channel_list()
+    assert channel_list.data == bytes(
+        ServerMessageListChannels([Channel("general"), Channel("memes")])
+    )
+
+    state.remove_channel("unknown")
+    assert state.get_channel_list() is channel_list
+
+    state.remove_channel("general")
+    assert state.channels == (Channel("memes"),)
+    assert state.get_channel_list().data == bytes(
+        ServerMessageListChannels([Channel("memes")])
+    )
+
+
+@pytest.mark.parametrize("options", CACHE_OPTIONS)
+def test_message_cache_eviction(options: dict[str, Any]):
+    cache = MessageCache(max_messages=3, **options)
+    for i in range(1, 6):
+        cache.add_message(create_message(i))
+
+    assert [m.id for m in cache.get_messages("general")] == [3, 4, 5]
+
+    # Oldest message is evicted before inserting an out-of-order message
+    cache.add_message(create_message(2))
+    assert [m.id for m in cache.get_messages("general")] == [2, 4, 5]
+
+
+@pytest.mark.parametrize("options", CACHE_OPTIONS)
+def test_message_cache_get_messages_range(options: dict[str, Any]):
+    cache = MessageCache(max_messages=100, **options)
+    for i in range(1, 11):
+        cache.add_message(create_message(i))
+
+    def get_ids(**kwargs) -> list[int]:
+        return [m.id for m in cache.get_messages("general", **kwargs)]
+
+    assert get_ids(before=8) == [8, 9, 10]
+    assert get_ids(after=3) == [1, 2, 3]
+    assert get_ids(before=4, after=6) == [4, 5, 6]
+    assert get_ids(limit=2) == [9, 10]
+    assert get_ids(before=4, after=6, limit=2) == [5, 6]
+    assert get_ids(before=11) == []
+    assert cache.get_messages("unknown") == []
+
+
+@pytest.mark.parametrize("options", CACHE_OPTIONS)
+def test_message_cache_out_of_order(options: dict[str, Any]):
+    ids = [5, 3, 9, 1, 7, 2, 8]
+    cache = MessageCache(max_messages=100, **options)
+    for i in ids:
+        cache.add_message(create_message(i))
+
+    assert [m.id for m in cache.get_messages("general")] == sorted(ids)
+
+
+@pytest.mark.parametrize("options", CACHE_OPTIONS)
+def test_message_cache_replaces_duplicate_id(options: dict[str, Any]):
+    cache = MessageCache(max_messages=100, **options)
+    cache.add_message(create_message(1))
+    cache.add_message(Message(1, "general", "thegamecracks", "Edited"))
+
+    assert cache.get_messages("general") == [
+        Message(1, "general", "thegamecracks", "Edited"),
+    ]
+
+
+@pytest.mark.parametrize("options", CACHE_OPTIONS)
+def test_message_cache_get_and_remove_message(options: dict[str, Any]):
+    cache = MessageCache(max_messages=100, **options)
+    for i in range(1, 11):
+        cache.add_message(create_message(i))
+
+    assert cache.get_message("general", 5) == create_message(5)
+    assert cache.get_message("general", 11) is None
+    assert cache.get_message("unknown", 5) is None
+
+    assert cache.remove_message("general", 5)
+    assert not cache.remove_message("general", 5)
+    assert cache.get_message("general", 5) is None
+    assert len(cache.get_messages("general")) == 9
+
+
+@pytest.mark.parametrize("options", CACHE_OPTIONS)
+def test_message_cache_remove_messages(options: dict[str, Any]):
+    cache = MessageCache(max_messages=100, **options)
+    for i in range(1, 101):
+        cache.add_message(create_message(i))
+
+    removed = cache.remove_messages("general", [i for i in range(1, 101) if i % 3])
+    assert len(removed) == 67
+    assert cache.get_message("general", 2) is None
+    assert cache.get_message("general", 3) == create_message(3)
+
+    ids = [m.id for m in cache.get_messages("general", limit=5)]
+    assert ids == [87, 90, 93, 96, 99]
+
+
+@pytest.mark.parametrize("options", CACHE_OPTIONS)
+def test_message_cache_evict_after_remove(options: dict[str, Any]):
+    cache = MessageCache(max_messages=10, **options)
+    for i in range(1, 11):
+        cache.add_message(create_message(i))
+
+    cache.remove_messages("general", [1, 2, 4])
+    for i in range(11, 15):
+        cache.add_message(create_message(i))
+
+    # Evicting the oldest message should skip over removed messages
+    assert cache.get_message("general", 3) is None
+    assert cache.get_message("general", 5) == create_message(5)
+    assert [m.id for m in cache.get_messages("general", limit=3)] == [12, 13, 14]
+
+
+@pytest.mark.parametrize("options", CACHE_OPTIONS)
+def test_message_cache_remove_and_readd(options: dict[str, Any]):
+    cache = MessageCache(max_messages=100, **options)
+    for i in range(1, 11):
+        cache.add_message(create_message(i))
+
+    cache.remove_message("general", 5)
+    cache.add_message(create_message(5))
+    assert cache.remove_message("general", 5)
+    assert [m.id for m in cache.get_messages("general")] == [1, 2, 3, 4, 6, 7, 8, 9, 10]
+
+
+@pytest.mark.parametrize("options", CACHE_OPTIONS)
+def test_message_cache_remove_channel(options: dict[str, Any]):
+    cache = MessageCache(max_messages=None, max_bytes=10_000, **options)
+    for i in range(1, 11):
+        cache.add_message(create_message(i))
+        cache.add_message(create_message(i + 10, channel_name="memes"))
+
+    cache.remove_channel("general")
+    assert cache.get_messages("general") == []
+    assert cache.size == cache.get_channel_size("memes")
+
+    # Evicting should skip over the removed channel
+    cache.max_bytes = cache.size - 1
+    cache.add_message(create_message(21, channel_name="memes"))
+    assert cache.get_message("memes", 11) is None
+    assert cache.get_message("memes", 21) == create_message(21, channel_name="memes")
+
+
+@pytest.mark.parametrize("options", CACHE_OPTIONS)
+def test_message_cache_byte_accounting(options: dict[str, Any]):
+    cache = MessageCache(max_messages=None, **options)
+    sizes = {i: len(bytes(create_message(i))) for i in range(1, 11)}
+
+    for i in range(1, 11):
+        cache.add_message(create_message(i))
+    assert cache.size == sum(sizes.values())
+    assert cache.get_channel_size("general") == sum(sizes.values())
+
+    cache.remove_messages("general", [1, 2, 3])
+    cache.add_message(create_message(10))
+    assert cache.size == sum(sizes[i] for i in range(4, 11))
+    assert cache.get_channel_size("unknown") == 0
+
+
+@pytest.mark.parametrize("options", CACHE_OPTIONS)
+def test_message_cache_byte_budget_oldest_first(options: dict[str, Any]):
+    size = len(bytes(create_message(1, channel_name="a")))
+    cache = MessageCache(max_messages=None, max_bytes=4 * size, **options)
+
+    cache.add_message(create_message(1, channel_name="a"))
+    cache.add_message(create_message(2, channel_name="b"))
+    cache.add_message(create_message(3, channel_name="a"))
+    cache.add_message(create_message(4, channel_name="b"))
+    cache.remove_message("a", 1)
+    cache.add_message(create_message(5, channel_name="b"))
+    cache.add_message(create_message(6, channel_name="a"))
+    assert cache.size == 4 * size
+    assert cache.evicted == 1
+    assert [m.id for m in cache.get_messages("b")] == [4, 5]
+
+    cache.add_message(create_message(7, channel_name="a"))
+    cache.add_message(create_message(8, channel_name="a"))
+    assert cache.size == 4 * size
+    assert cache.evicted == 3
+    assert [m.id for m in cache.get_messages("a")] == [6, 7, 8]
+    assert [m.id for m in cache.get_messages("b")] == [5]
+
+
+@pytest.mark.parametrize("options", CACHE_OPTIONS)
+def test_message_cache_byte_budget_lru_channel(options: dict[str, Any]):
+    size = len(bytes(create_message(1, channel_name="a")))
+    cache = MessageCache(
+        max_messages=None,
+        max_bytes=4 * size,
+        eviction_policy=CacheEvictionPolicy.LRU_CHANNEL,
+        **options,
+    )
+
+    cache.add_message(create_message(1, channel_name="a"))
+    cache.add_message(create_message(2, channel_name="a"))
+    cache.add_message(create_message(3, channel_name="b"))
+    cache.add_message(create_message(4, channel_name="b"))
+    cache.get_messages("a")
+
+    cache.add_message(create_message(5, channel_name="c"))
+    cache.add_message(create_message(6, channel_name="c"))
+    assert cache.size == 4 * size
+    assert [m.id for m in cache.get_messages("a")] == [1, 2]
+    assert [m.id for m in cache.get_messages("b")] == []
+    assert [m.id for m in cache.get_messages("c")] == [5, 6]
+
+
+def test_message_cache_layouts_agree():
+    rng = random.Random(1234)
+    caches = [
+        MessageCache(max_messages=50, **param.values[0]) for param in CACHE_OPTIONS
+    ]
+
+    next_id = 1000
+    for _ in range(2000):
+        op = rng.random()
+        if op < 0.6:
+            next_id += rng.randint(1, 3)
+            message = create_message(next_id, rng.choice(["a", "b"]))
+        elif op < 0.7:
+            message = create_message(rng.randint(900, next_id), rng.choice(["a", "b"]))
+        else:
+            message = None
+        removed_id = rng.randint(900, next_id)
+
+        for cache in caches:
+            if message is not None:
+                cache.add_message(message)
+            elif op < 0.85:
+                cache.remove_message("a", removed_id)
+
+        channel_name = rng.choice(["a", "b"])
+        before = rng.choice([None, rng.randint(900, next_id)])
+        after = rng.choice([None, rng.randint(900, next_id)])
+        limit = rng.randint(1, 60)
+        results = [
+            [
+                (m.id, m.content)
+                for m in cache.get_messages(
+                    channel_name, before=before, after=after, limit=limit
+                )
+            ]
+            for cache in caches
+        ]
+        assert results[1:] == results[:1] * (len(results) - 1)
+        assert len({cache.size for cache in caches}) == 1
+        assert len({len(cache) for cache in caches}) == 1
+
+
+def test_message_cache_compression_stats():
+    cache = MessageCache(max_messages=None, block_size=10, hot_messages=5)
+    for i in range(1, 101):
+        cache.add_message(create_message(i))
+
+    stats = cache.get_compression_stats()
+    assert stats.blocks == 9
+    assert stats.compression_ratio > 1
+    assert stats.cache_hit_rate == 0
+
+    assert [m.id for m in cache.get_messages("general", limit=15)] == list(
+        range(86, 101)
+    )
+    assert cache.get_compression_stats().cache_misses == 1
+
+    assert cache.get_message("general", 90) == create_message(90)
+    stats = cache.get_compression_stats()
+    assert (stats.cache_hits, stats.cache_misses) == (1, 1)
+    assert stats.cache_hit_rate == 0.5
+
+
+def test_message_cache_evicts_cold_messages_without_decompressing():
+    cache = MessageCache(max_messages=50, block_size=10, hot_messages=5)
+    for i in range(1, 101):
+        cache.add_message(create_message(i))
+
+    assert cache.get_oldest_id("general") == 51
+    assert cache.remove_message("general", 55)
+    assert cache.remove_messages("general", [56, 57, 1000]) == [56, 57]
+
+    stats = cache.get_compression_stats()
+    assert (stats.cache_hits, stats.cache_misses) == (0, 0)
+    assert len(cache) == 47
+
+
+@pytest.mark.parametrize("options", CACHE_OPTIONS)
+def test_message_cache_oldest_id(options: dict[str, Any]):
+    cache = MessageCache(max_messages=10, **options)
+    assert cache.get_oldest_id("general") is None
+
+    for i in range(1, 21):
+        cache.add_message(create_message(i))
+    assert cache.get_oldest_id("general") == 11
+
+    cache.remove_message("general", 11)
+    assert cache.get_oldest_id("general") == 12
+
+
+@pytest.mark.parametrize("options", CACHE_OPTIONS)
+def test_message_cache_has_evicted(options: dict[str, Any]):
+    cache = MessageCache(max_messages=10, **options)
+    for i in range(1, 11):
+        cache.add_message(create_message(i))
+
+    cache.remove_message("general", 1)
+    assert not cache.has_evicted("general")
+    assert not cache.has_evicted("unknown")
+
+    cache.add_message(create_message(11))
+    cache.add_message(create_message(12))
+    assert cache.has_evicted("general")
+
+
+def test_string_table_release():
+    table = StringTable()
+    alice = table.intern("alice")
+    assert table.intern("alice") == alice
+    table.intern("bob")
+
+    table.release(alice)
+    assert len(table) == 2
+    table.release(alice)
+    assert len(table) == 1
+
+    # Released indices are reused by new strings
+    assert table.intern("carol") == alice
+    assert table.get(alice) == "carol"
+
+
+def test_columnar_history_releases_nicks():
+    table = StringTable()
+    history = ColumnarChannelHistory("general", max_messages=2, nicks=table)
+    for i in range(1, 6):
+        history.add_message(Message(i, "general", f"user{i}", "Hello world!"))
+
+    assert history.evict_oldest() == 4
+    assert len(table) == 1
+    assert history.remove_message(5)
+    assert len(table) == 0
@@ -0,0 +1,50 @@
+import asyncio
+
+from conftest import create_message
+
+from dumdum.server.store import MessageStore, ServerStore
+
+
+def test_server_store_get_messages():
+    with ServerStore.connect(":memory:") as store, store.transaction():
+        store.add_messages(create_message(i) for i in range(1, 11))
+        store.add_messages([create_message(11, "memes")])
+
+        assert store.get_messages("general", limit=3) == [
+            create_message(8),
+            create_message(9),
+            create_message(10),
+        ]
+        assert [m.id for m in store.get_messages("general", before=3, after=5)] == [
+            3,
+            4,
+            5,
+        ]
+        assert store.get_messages("memes") == [create_message(11, "memes")]
+
+        store.remove_messages("general", [9, 10])
+        assert [m.id for m in store.get_messages("general", limit=1)] == [8]
+
+
+def test_message_store_persists_messages(tmp_path):
+    path = str(tmp_path / "server.db")
+
+    async def write():
+        async with MessageStore.open(path, flush_interval=60) as store:
+            for i in range(1, 6):
+                store.add_message(create_message(i))
+            assert store.pending == 5
+
+            # Reads should see messages that have not been flushed yet
+            messages = await store.get_messages("general", limit=2)
+            assert [m.id for m in messages] == [4, 5]
+            assert store.pending == 0
+
+            store.add_message(create_message(6))
+
+    async def read():
+        async with MessageStore.open(path) as store:
+            return await store.get_messages("general")
+
+    asyncio.run(write())
+    assert [m.id for m in asyncio.run(read())] == [1, 2, 3, 4, 5, 6]
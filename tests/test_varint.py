@@ -0,0 +1,42 @@
+import pytest
+
+from dumdum.protocol import MalformedDataError, byte_reader, varint
+
+
+def test_dumps():
+    assert varint.dumps(0) == b"\x00"
+    assert varint.dumps(127) == b"\x7f"
+    assert varint.dumps(300) == b"\xac\x02"
+    assert varint.dumps(2**64 - 1) == b"\xff" * 9 + b"\x01"
+
+    with pytest.raises(ValueError):
+        varint.dumps(-1)
+    with pytest.raises(ValueError):
+        varint.dumps(2**64)
+
+
+def test_load_from_round_trip():
+    for n in (0, 1, 127, 128, 300, 2**21, 2**63 - 1, 2**64 - 1):
+        data = b"\xff" + varint.dumps(n) + b"\x00"
+        assert varint.load_from(data, 1) == (n, len(data) - 1)
+
+
+def test_load_from_insufficient_data():
+    for data in (b"", b"\x80", b"\xff\xff"):
+        with pytest.raises(IndexError):
+            varint.load_from(data, 0)
+
+
+def test_load_from_exceeds_64_bits():
+    with pytest.raises(MalformedDataError):
+        varint.load_from(b"\xff" * 9 + b"\x02", 0)
+    with pytest.raises(MalformedDataError):
+        varint.load_from(b"\x80" * 10 + b"\x00", 0)
+
+
+def test_read_varint():
+    with byte_reader(b"\xac\x02\x05") as reader:
+        assert reader.read_varint() == 300
+        assert reader.read_varint() == 5
+        with pytest.raises(IndexError):
+            reader.read_varint()
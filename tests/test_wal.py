@@ -0,0 +1,105 @@
+import asyncio
+import os
+import threading
+
+import pytest
+from conftest import create_message
+
+from dumdum.server.wal import DeletedMessage, FsyncPolicy, MessageLog
+
+
+def test_message_log_recover(tmp_path):
+    with MessageLog.open(tmp_path, fsync_policy=FsyncPolicy.ALWAYS) as wal:
+        assert list(wal.recover()) == []
+        wal.append_message(create_message(1))
+        wal.append_message(create_message(2, "memes"))
+        wal.append_delete("general", 1)
+
+    with MessageLog.open(tmp_path) as wal:
+        assert list(wal.recover()) == [
+            create_message(1),
+            create_message(2, "memes"),
+            DeletedMessage("general", 1),
+        ]
+        wal.append_message(create_message(3))
+
+    with MessageLog.open(tmp_path, fsync_policy=FsyncPolicy.OS) as wal:
+        assert [record.id for record in wal.recover()] == [1, 2, 1, 3]
+
+
+def test_message_log_truncates_torn_records(tmp_path):
+    with MessageLog.open(tmp_path) as wal:
+        wal.append_message(create_message(1))
+        wal.append_message(create_message(2))
+
+    (segment,) = tmp_path.iterdir()
+    data = segment.read_bytes()
+    segment.write_bytes(data[:-3])
+
+    with MessageLog.open(tmp_path) as wal:
+        assert list(wal.recover()) == [create_message(1)]
+    assert segment.stat().st_size == len(data) - len(bytes(create_message(2))) - 9
+
+
+def test_message_log_compaction(tmp_path):
+    record_size = 9 + len(bytes(create_message(1)))
+    options = {"segment_size": record_size * 2, "max_messages": 2}
+
+    with MessageLog.open(tmp_path, **options) as wal:
+        for i in range(1, 10):
+            wal.append_message(create_message(i))
+
+    # Segments with at least two newer messages should have been removed
+    with MessageLog.open(tmp_path, **options) as wal:
+        assert [m.id for m in wal.recover()] == [7, 8, 9]
+
+        # Quiet channels keep their segments
+        wal.append_message(create_message(10, "memes"))
+        for i in range(11, 16):
+            wal.append_message(create_message(i))
+
+    with MessageLog.open(tmp_path, **options) as wal:
+        assert [m.id for m in wal.recover()][0] == 10
+
+
+def test_message_log_compaction_by_bytes(tmp_path):
+    record_size = 9 + len(bytes(create_message(1)))
+    options = {"segment_size": record_size * 2, "max_bytes": record_size * 2}
+
+    with MessageLog.open(tmp_path, **options) as wal:
+        for i in range(1, 10):
+            wal.append_message(create_message(i))
+
+    # Two newer messages fall just short of max_bytes, so 5 and 6 are kept
+    with MessageLog.open(tmp_path, **options) as wal:
+        assert [m.id for m in wal.recover()] == [5, 6, 7, 8, 9]
+
+
+@pytest.mark.parametrize("fsync_policy", list(FsyncPolicy))
+def test_message_log_append_async(tmp_path, monkeypatch, fsync_policy):
+    async def append(wal: MessageLog):
+        await wal.append_messages([create_message(1), create_message(2)])
+        await wal.append_deletes("general", [1])
+
+    # Rolling over a segment syncs it, which must happen off the event loop
+    fsync_threads = set()
+
+    def fsync(fd: int) -> None:
+        fsync_threads.add(threading.current_thread())
+        real_fsync(fd)
+
+    real_fsync = os.fsync
+    monkeypatch.setattr(os, "fsync", fsync)
+
+    with MessageLog.open(tmp_path, fsync_policy=fsync_policy, segment_size=1) as wal:
+        asyncio.run(append(wal))
+    monkeypatch.undo()
+
+    assert threading.main_thread() not in fsync_threads
+
+    with MessageLog.open(tmp_path) as wal:
+        assert list(wal.recover()) == [
+            create_message(1),
+            create_message(2),
+            DeletedMessage("general", 1),
+        ]